@@ -1,11 +1,17 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware #To prevent Network Error 
-from app.routers import auth,dashboard,PAT_auth,contribution_flow,repos,ask_nova, repo, progress
+from app.routers import auth,dashboard,PAT_auth,contribution_flow,repos,ask_nova, repo, progress, stats
 #TO import Local Modules 
 import models
+from app.utils.github_client import start_github_client, close_github_client
+from app.services.llm_gateway import close_llm_gateway
+from app.services.analysis_scheduler import analysis_scheduler
+from app.services.evaluation_queue import evaluation_queue
+from app.utils.workspace_quota import quota_sweeper
 
 
 from database import engine
@@ -14,7 +20,21 @@ try:
 except Exception:
     pass  # Already handled in database.py
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled GitHub client for the whole worker, shared by every router
+    await start_github_client()
+    evaluation_queue.start()
+    analysis_scheduler.start()
+    quota_sweeper.start()
+    yield
+    await quota_sweeper.stop()
+    await analysis_scheduler.stop()
+    await evaluation_queue.stop()
+    await close_github_client()
+    await close_llm_gateway()
+
+app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -34,6 +54,7 @@ app.include_router(repos.routes)
 app.include_router(ask_nova.routes)
 app.include_router(repo.router)
 app.include_router(progress.routes)
+app.include_router(stats.routes)
 
 # API ROUTES
 @app.get('/')
@@ -1,63 +1,269 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
 import app.schemas as schemas
 import models
-from database import get_db
+from database import SessionLocal
 from sqlalchemy.orm import Session
-from app.utils.repo_analyzer import analyze_and_cache_repo, evaluate_local_commits
-import boto3
+from app.utils.code_index import format_relevant_files, relevant_files
+from app.services.analysis_scheduler import analysis_scheduler, pending_analysis
+from app.services.evaluation_queue import evaluation_queue, latest_evaluation, stored_evaluation
 import json
 import os
 import asyncio
 from typing import List
 import re
-import requests as req
-from app.utils.encryption import decrypt_pat
+from app.services.llm_gateway import cancel_on_disconnect
+from app.services.llm_provider import LLMMessage, LLMRequest, get_llm_provider, user_message
+from app.utils.github_client import get_github_client
+from app.services.github_login import github_credentials
 import time
 
 nova_testing_steps_locks = {}
 
 routes = APIRouter(prefix="/nova", tags=["Bedrock AI Chat"])
 
-# Initialize AWS Bedrock Runtime Client
-def get_bedrock_client():
+def _try_parse_json(text_block: str):
+    """Try to parse a JSON block, handling common issues."""
+    text_block = text_block.strip()
+    # Strip markdown code fences if present
+    if text_block.startswith("```"):
+        # Remove opening fence (```json or ```)
+        first_newline = text_block.find("\n")
+        if first_newline != -1:
+            text_block = text_block[first_newline+1:]
+        # Remove closing fence
+        if text_block.rstrip().endswith("```"):
+            text_block = text_block.rstrip()[:-3].rstrip()
     try:
-        # Relies on the host environment having AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY
-        # or having an IAM role assigned to the EC2 instance reading from .env
-        client_kwargs = {
-            "service_name": "bedrock-runtime",
-            "region_name": os.getenv("AWS_REGION", "us-east-1").strip().strip('"').strip("'")
-        }
-        
-        access_key = os.getenv("AWS_ACCESS_KEY_ID")
-        secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-        
-        if access_key and secret_key:
-            client_kwargs["aws_access_key_id"] = access_key.strip().strip('"').strip("'")
-            client_kwargs["aws_secret_access_key"] = secret_key.strip().strip('"').strip("'")
-            
-        endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        if endpoint_url:
-            client_kwargs["endpoint_url"] = endpoint_url.strip().strip('"').strip("'")
-            
-        client = boto3.client(**client_kwargs)
-        return client
-    except Exception as e:
-        print(f"Error initializing Bedrock client: {e}")
+        return json.loads(text_block)
+    except Exception:
         return None
 
-@routes.post("/ask", response_model=schemas.AskNovaResponse)
-async def ask_nova(request: schemas.AskNovaRequest, db: Session = Depends(get_db)):
+def _extract_json_from_text(text: str):
+    """Extract JSON object from text using multiple strategies."""
+    # Strategy 1: Find ```json ... ``` blocks (handle nested backticks by finding last ```)
+    json_block_pattern = re.search(r'```json\s*\n?(.*?)```', text, re.DOTALL)
+    if json_block_pattern:
+        raw = json_block_pattern.group(1).strip()
+        parsed = _try_parse_json(raw)
+        if parsed and isinstance(parsed, dict):
+            return parsed, json_block_pattern.start(), json_block_pattern.end()
+
+    # Strategy 2: Find ``` ... ``` blocks that contain JSON-like content  
+    code_block_pattern = re.search(r'```\s*\n?(.*?)```', text, re.DOTALL)
+    if code_block_pattern:
+        raw = code_block_pattern.group(1).strip()
+        if raw.startswith("{"):
+            parsed = _try_parse_json(raw)
+            if parsed and isinstance(parsed, dict):
+                return parsed, code_block_pattern.start(), code_block_pattern.end()
+
+    # Strategy 3: Find raw JSON with pr_title or pr_body keys
+    # Look for { ... } that contains "pr_title" or "pr_body"
+    for match in re.finditer(r'\{', text):
+        start = match.start()
+        # Find the matching closing brace by counting
+        depth = 0
+        for i in range(start, len(text)):
+            if text[i] == '{':
+                depth += 1
+            elif text[i] == '}':
+                depth -= 1
+                if depth == 0:
+                    candidate = text[start:i+1]
+                    if '"pr_title"' in candidate or '"pr_body"' in candidate or '"finalized_approach"' in candidate:
+                        parsed = _try_parse_json(candidate)
+                        if parsed and isinstance(parsed, dict):
+                            return parsed, start, i+1
+                    break
+
+    return None, -1, -1
+
+def _progress_row(db: Session, user_email: str, repo_name: str, issue_number: int):
+    return db.query(models.ContributionProgress).filter(
+        models.ContributionProgress.user_email == user_email,
+        models.ContributionProgress.repo_name == repo_name,
+        models.ContributionProgress.issue_number == issue_number
+    ).first()
+
+
+def _load_progress(user_email: str, repo_name: str, issue_number: int):
+    """The issue's progress row, detached from its (closed) session. Blocking: run it in a thread."""
+    db = SessionLocal()
+    try:
+        return _progress_row(db, user_email, repo_name, issue_number)
+    finally:
+        db.close()
+
+
+def _save_progress(user_email: str, repo_name: str, issue_number: int, create: bool = False, **fields) -> bool:
     """
-    Given a repository context, a list of open issues, and chat history,
-    requests Amazon Nova to help the user select an issue and understand how to tackle it.
+    Sets fields on the issue's progress row, creating the row if create is set. Returns
+    False if there was no row to update. Blocking: run it in a thread.
     """
-    client = get_bedrock_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="Failed to initialize AWS Bedrock Client. Check AWS credentials.")
-        
-    if os.getenv("USE_NOVA", "True").lower() == "false":
-        return schemas.AskNovaResponse(reply="Amazon Nova AI features are currently disabled in the backend configuration.")
-        
+    db = SessionLocal()
+    try:
+        progress = _progress_row(db, user_email, repo_name, issue_number)
+        if progress is None:
+            if not create:
+                return False
+            progress = models.ContributionProgress(user_email=user_email, repo_name=repo_name, issue_number=issue_number)
+            db.add(progress)
+        for name, value in fields.items():
+            setattr(progress, name, value)
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _stored_analysis(repo_name: str):
+    """The stored repository analysis text, if any. Blocking: run it in a thread."""
+    db = SessionLocal()
+    try:
+        cached = db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == repo_name).first()
+        return cached.system_prompt_context if cached else None
+    finally:
+        db.close()
+
+
+async def _apply_reply(text: str, request: schemas.AskNovaRequest):
+    """Strips the JSON side-channel from a reply and saves any approach / PR updates it carries."""
+    updated_appr = None
+    updated_pr_data = None
+
+    data, start_idx, end_idx = _extract_json_from_text(text)
+
+    if data:
+        try:
+            fields = {}
+            if "finalized_approach" in data:
+                updated_appr = data["finalized_approach"]
+                text = text[:start_idx] + text[end_idx:]
+                fields["final_approach"] = updated_appr
+            elif "pr_title" in data or "pr_body" in data:
+                updated_pr_data = {}
+                if "pr_title" in data:
+                    updated_pr_data["pr_title"] = data["pr_title"]
+                if "pr_body" in data:
+                    updated_pr_data["pr_body"] = data["pr_body"]
+                text = text[:start_idx] + text[end_idx:]
+                fields.update(updated_pr_data)
+
+            # Save to DB
+            if fields and request.user_email and request.active_issue_number:
+                await asyncio.to_thread(
+                    _save_progress, request.user_email, request.repo_name, request.active_issue_number, **fields
+                )
+        except Exception as e:
+            print(f"process_reply error: {e}")
+    return text.strip(), updated_appr, updated_pr_data
+
+
+def _is_side_channel_block(block: str) -> bool:
+    """True for a fenced block that carries the JSON side-channel rather than prose or code."""
+    inner = block[3:-3] if block.endswith("```") else block[3:]
+    first_newline = inner.find("\n")
+    info = inner[:first_newline].strip().lower() if first_newline != -1 else inner.strip().lower()
+    content = inner[first_newline+1:] if first_newline != -1 else ""
+    return info == "json" or info.startswith("{") or content.lstrip().startswith("{")
+
+
+def _object_end(text: str) -> int:
+    """Index just past the brace that closes the object text starts with, or -1 if it's still open."""
+    depth = 0
+    for i, c in enumerate(text):
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def _is_side_channel_object(text: str) -> bool:
+    """True for a bare (unfenced) JSON object carrying the side-channel keys."""
+    return '"pr_title"' in text or '"pr_body"' in text or '"finalized_approach"' in text
+
+
+class _ReplyStreamFilter:
+    """
+    Forwards streamed reply text as it arrives, holding back fenced code blocks and bare
+    JSON objects until they close so the JSON side-channel (finalized_approach / pr_title /
+    pr_body) never reaches the chat, fenced or not. The authoritative cleaned reply is still
+    sent in the final event.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_block = False
+        self._in_object = False
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta
+        out = []
+        while self._buffer:
+            if self._in_block:
+                end = self._buffer.find("```", 3)
+                if end == -1:
+                    break
+                block = self._buffer[:end+3]
+                self._buffer = self._buffer[end+3:]
+                self._in_block = False
+                if not _is_side_channel_block(block):
+                    out.append(block)
+                continue
+            if self._in_object:
+                end = _object_end(self._buffer)
+                if end == -1:
+                    break
+                obj = self._buffer[:end]
+                self._buffer = self._buffer[end:]
+                self._in_object = False
+                if not _is_side_channel_object(obj):
+                    out.append(obj)
+                continue
+
+            starts = [i for i in (self._buffer.find("```"), self._buffer.find("{")) if i != -1]
+            if not starts:
+                # Hold back trailing backticks in case they start a fence
+                cut = len(self._buffer.rstrip("`"))
+                out.append(self._buffer[:cut])
+                self._buffer = self._buffer[cut:]
+                break
+            start = min(starts)
+            out.append(self._buffer[:start])
+            self._buffer = self._buffer[start:]
+            if self._buffer.startswith("```"):
+                self._in_block = True
+                continue
+            # Only `{` followed by a quoted key can open the side-channel object
+            rest = self._buffer[1:].lstrip()
+            if not rest:
+                break
+            if rest.startswith('"'):
+                self._in_object = True
+            else:
+                out.append("{")
+                self._buffer = self._buffer[1:]
+        return "".join(out)
+
+    def flush(self) -> str:
+        remaining = self._buffer
+        self._buffer = ""
+        if self._in_block and _is_side_channel_block(remaining):
+            return ""
+        if self._in_object and _is_side_channel_object(remaining):
+            return ""
+        return remaining
+
+
+async def _build_ask_prompt(request: schemas.AskNovaRequest) -> str:
+    """Builds the Nova system prompt for /nova/ask from repo, issue, local commit and PR context."""
     # Format the issues for the system prompt
     issues_text = ""
     for issue in request.issues_context:
@@ -68,21 +274,31 @@ async def ask_nova(request: schemas.AskNovaRequest, db: Session = Depends(get_db
         
     # Get cached repo analysis context
     repo_analysis = ""
-    cached = db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == request.repo_name).first()
-    if cached:
-        repo_analysis = f"\n\n--- REPOSITORY CONTEXT ---\n{cached.system_prompt_context}\n"
+    context = await asyncio.to_thread(_stored_analysis, request.repo_name) or await pending_analysis(request.repo_name)
+    if context:
+        repo_analysis = f"\n\n--- REPOSITORY CONTEXT ---\n{context}\n"
 
     # Evaluate local commits and testing if an issue is actively selected
     local_evaluation = ""
     issue_details = ""
+    relevant = ""
     if request.active_issue_number:
-        local_evaluation = await evaluate_local_commits(request.repo_name, request.active_issue_number, request.user_email, db)
+        # Files matching the issue, from the repo's search index (empty until it's built)
+        active = next((i for i in request.issues_context if i.number == request.active_issue_number), None)
+        if active:
+            matches = await relevant_files(request.repo_name, f"{active.title}\n{active.issue_body or ''}")
+            if matches:
+                relevant = (
+                    f"\n\n--- LIKELY RELEVANT FILES (search index of the default branch) ---\n"
+                    f"{format_relevant_files(matches)}\n"
+                )
+
+        # Tests run on the evaluation queue; chat only waits briefly for them
+        local_evaluation = await latest_evaluation(request.repo_name, request.active_issue_number, request.user_email)
         if request.user_email:
-            progress = db.query(models.ContributionProgress).filter(
-                models.ContributionProgress.user_email == request.user_email,
-                models.ContributionProgress.repo_name == request.repo_name,
-                models.ContributionProgress.issue_number == request.active_issue_number
-            ).first()
+            progress = await asyncio.to_thread(
+                _load_progress, request.user_email, request.repo_name, request.active_issue_number
+            )
             if progress:
                 issue_details = f"\n\n--- ISSUE CONTEXT ---\n"
                 if progress.issue_summary:
@@ -142,6 +358,7 @@ async def ask_nova(request: schemas.AskNovaRequest, db: Session = Depends(get_db
             f"The user is actively working on Issue #{request.active_issue_number} in the repository '{request.repo_name}'.\n\n"
             f"{repo_analysis}"
             f"{issue_details}"
+            f"{relevant}"
             f"{local_evaluation}"
             f"Your goals:\n"
             f"1. Help the user refine their approach to solving the issue.\n"
@@ -161,190 +378,111 @@ async def ask_nova(request: schemas.AskNovaRequest, db: Session = Depends(get_db
             f"2. Once an issue is selected, briefly explain what it entails and suggest the first files they should check to get started.\n"
             f"3. Be concise, friendly, and highly technical in your answers. Do not explain git commands unless asked; focus on the code and logic."
         )
-    
-    # Format messages for Amazon Nova models
-    formatted_messages = []
-    for msg in request.messages:
-        formatted_messages.append({
-            "role": msg.role,
-            "content": [{"text": msg.content}]
-        })
-        
-    # Bedrock Nova request body format
-    # Reference: https://docs.aws.amazon.com/bedrock/latest/userguide/model-parameters-nova.html
-    max_tokens = 4000 if request.pr_context else 1000
-    body = {
-        "system": [{"text": system_prompt}],
-        "messages": formatted_messages,
-        "inferenceConfig": {
-            "maxTokens": max_tokens,
-            "temperature": 0.5,
-            "topP": 0.9,
-        }
-    }
-    
-    def _try_parse_json(text_block: str):
-        """Try to parse a JSON block, handling common issues."""
-        text_block = text_block.strip()
-        # Strip markdown code fences if present
-        if text_block.startswith("```"):
-            # Remove opening fence (```json or ```)
-            first_newline = text_block.find("\n")
-            if first_newline != -1:
-                text_block = text_block[first_newline+1:]
-            # Remove closing fence
-            if text_block.rstrip().endswith("```"):
-                text_block = text_block.rstrip()[:-3].rstrip()
-        try:
-            return json.loads(text_block)
-        except Exception:
-            return None
-
-    def _extract_json_from_text(text: str):
-        """Extract JSON object from text using multiple strategies."""
-        # Strategy 1: Find ```json ... ``` blocks (handle nested backticks by finding last ```)
-        json_block_pattern = re.search(r'```json\s*\n?(.*?)```', text, re.DOTALL)
-        if json_block_pattern:
-            raw = json_block_pattern.group(1).strip()
-            parsed = _try_parse_json(raw)
-            if parsed and isinstance(parsed, dict):
-                return parsed, json_block_pattern.start(), json_block_pattern.end()
-        
-        # Strategy 2: Find ``` ... ``` blocks that contain JSON-like content  
-        code_block_pattern = re.search(r'```\s*\n?(.*?)```', text, re.DOTALL)
-        if code_block_pattern:
-            raw = code_block_pattern.group(1).strip()
-            if raw.startswith("{"):
-                parsed = _try_parse_json(raw)
-                if parsed and isinstance(parsed, dict):
-                    return parsed, code_block_pattern.start(), code_block_pattern.end()
-        
-        # Strategy 3: Find raw JSON with pr_title or pr_body keys
-        # Look for { ... } that contains "pr_title" or "pr_body"
-        for match in re.finditer(r'\{', text):
-            start = match.start()
-            # Find the matching closing brace by counting
-            depth = 0
-            for i in range(start, len(text)):
-                if text[i] == '{':
-                    depth += 1
-                elif text[i] == '}':
-                    depth -= 1
-                    if depth == 0:
-                        candidate = text[start:i+1]
-                        if '"pr_title"' in candidate or '"pr_body"' in candidate or '"finalized_approach"' in candidate:
-                            parsed = _try_parse_json(candidate)
-                            if parsed and isinstance(parsed, dict):
-                                return parsed, start, i+1
-                        break
-        
-        return None, -1, -1
 
-    def process_reply(text: str):
-        updated_appr = None
-        updated_pr_data = None
-        
-        data, start_idx, end_idx = _extract_json_from_text(text)
+    return system_prompt
+
+
+def _ask_llm_request(system_prompt: str, request: schemas.AskNovaRequest) -> LLMRequest:
+    return LLMRequest(
+        system=system_prompt,
+        messages=[LLMMessage(role=msg.role, content=msg.content) for msg in request.messages],
+        # PR drafts need room for a full title + markdown body
+        max_tokens=4000 if request.pr_context else 1000,
+        temperature=0.5,
+        top_p=0.9,
+        label="ask",
+    )
+
+
+@routes.post("/ask", response_model=schemas.AskNovaResponse)
+async def ask_nova(request: schemas.AskNovaRequest, http_request: Request):
+    """
+    Given a repository context, a list of open issues, and chat history,
+    requests Amazon Nova to help the user select an issue and understand how to tackle it.
+    """
+    provider = get_llm_provider()
+    if not provider.ready():
+        raise HTTPException(status_code=500, detail="Failed to initialize AWS Bedrock Client. Check AWS credentials.")
         
-        if data:
-            try:
-                if "finalized_approach" in data:
-                    updated_appr = data["finalized_approach"]
-                    text = text[:start_idx] + text[end_idx:]
-                    
-                    if request.user_email and request.active_issue_number:
-                        prog = db.query(models.ContributionProgress).filter(
-                            models.ContributionProgress.user_email == request.user_email,
-                            models.ContributionProgress.repo_name == request.repo_name,
-                            models.ContributionProgress.issue_number == request.active_issue_number
-                        ).first()
-                        if prog:
-                            prog.final_approach = updated_appr
-                            db.commit()
-                elif "pr_title" in data or "pr_body" in data:
-                    updated_pr_data = {}
-                    if "pr_title" in data:
-                        updated_pr_data["pr_title"] = data["pr_title"]
-                    if "pr_body" in data:
-                        updated_pr_data["pr_body"] = data["pr_body"]
-                    text = text[:start_idx] + text[end_idx:]
-                    
-                    # Save to DB
-                    if request.user_email and request.active_issue_number:
-                        prog = db.query(models.ContributionProgress).filter(
-                            models.ContributionProgress.user_email == request.user_email,
-                            models.ContributionProgress.repo_name == request.repo_name,
-                            models.ContributionProgress.issue_number == request.active_issue_number
-                        ).first()
-                        if prog:
-                            if "pr_title" in updated_pr_data:
-                                prog.pr_title = updated_pr_data["pr_title"]
-                            if "pr_body" in updated_pr_data:
-                                prog.pr_body = updated_pr_data["pr_body"]
-                            db.commit()
-            except Exception as e:
-                print(f"process_reply error: {e}")
-        return text.strip(), updated_appr, updated_pr_data
+    if os.getenv("USE_NOVA", "True").lower() == "false":
+        return schemas.AskNovaResponse(reply="Amazon Nova AI features are currently disabled in the backend configuration.")
+
+    system_prompt = await _build_ask_prompt(request)
 
     try:
-        endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        if endpoint_url and ("localhost" in endpoint_url or "127.0.0.1" in endpoint_url):
-            # INTERCEPT: Instead of using AWS/Bedrock, forward directly to local Ollama via standard HTTP
-            ollama_url = "http://127.0.0.1:11434/api/chat"
-            ollama_messages = [{"role": "system", "content": system_prompt}]
-            for msg in request.messages:
-                ollama_messages.append({"role": msg.role, "content": msg.content})
-                
-            payload = {
-                "model": "amazon.nova-2-lite:v1.0",  # Optional: Fallback model based on Ollama tags
-                "messages": ollama_messages,
-                "stream": False,
-                "options": {
-                    "temperature": 0.5,
-                    "top_p": 0.9,
-                }
-            }
-            res = req.post(ollama_url, json=payload)
-            res.raise_for_status()
-            reply_text = res.json().get('message', {}).get('content', "Ollama couldn't generate a response.")
-            reply_text, updated_approach, updated_pr_result = process_reply(reply_text)
-            return schemas.AskNovaResponse(
-                reply=reply_text, 
-                updated_approach=updated_approach,
-                updated_pr=schemas.UpdatedPR(**updated_pr_result) if updated_pr_result else None
-            )
-            
-        else:
-            body = {
-                "system": [{"text": system_prompt}],
-                "messages": formatted_messages,
-                "inferenceConfig": {"maxTokens": 1000, "temperature": 0.5, "topP": 0.9}
-            }
-            response = client.invoke_model(
-                modelId=os.getenv("NOVA_MODEL_ID", "amazon.nova-lite-v1:0"),
-                body=json.dumps(body),
-                accept="application/json",
-                contentType="application/json"
-            )
-            response_body = json.loads(response.get('body').read())
-            reply_text = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', "")
-            reply_text, updated_approach, updated_pr_result = process_reply(reply_text)
-            return schemas.AskNovaResponse(
-                reply=reply_text, 
-                updated_approach=updated_approach,
-                updated_pr=schemas.UpdatedPR(**updated_pr_result) if updated_pr_result else None
-            )
+        response = await cancel_on_disconnect(http_request, provider.complete(_ask_llm_request(system_prompt, request)))
+        reply_text, updated_approach, updated_pr_result = await _apply_reply(response.text, request)
+        return schemas.AskNovaResponse(
+            reply=reply_text, 
+            updated_approach=updated_approach,
+            updated_pr=schemas.UpdatedPR(**updated_pr_result) if updated_pr_result else None
+        )
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI invocation error: {str(e)}")
 
 
+@routes.post("/ask/stream")
+async def ask_nova_stream(request: schemas.AskNovaRequest):
+    """
+    Streaming variant of /nova/ask. Responds with NDJSON events:
+    {"type": "delta", "text": ...} while Nova generates, then a single
+    {"type": "final", "reply", "updated_approach", "updated_pr"} event carrying the
+    cleaned reply and any side-channel updates, or {"type": "error", "detail": ...}.
+    """
+    provider = get_llm_provider()
+    if not provider.ready():
+        raise HTTPException(status_code=500, detail="Failed to initialize AWS Bedrock Client. Check AWS credentials.")
+
+    def event(payload: dict) -> str:
+        return json.dumps(payload) + "\n"
+
+    if os.getenv("USE_NOVA", "True").lower() == "false":
+        disabled = "Amazon Nova AI features are currently disabled in the backend configuration."
+        async def disabled_stream():
+            yield event({"type": "final", "reply": disabled, "updated_approach": None, "updated_pr": None})
+        return StreamingResponse(disabled_stream(), media_type="application/x-ndjson")
+
+    system_prompt = await _build_ask_prompt(request)
+
+    async def generate():
+        reply_filter = _ReplyStreamFilter()
+        chunks = []
+        try:
+            async for delta in provider.stream(_ask_llm_request(system_prompt, request)):
+                chunks.append(delta)
+                visible = reply_filter.feed(delta)
+                if visible:
+                    yield event({"type": "delta", "text": visible})
+
+            tail = reply_filter.flush()
+            if tail:
+                yield event({"type": "delta", "text": tail})
+
+            # Saved on a session of its own: the request's may be released once streaming starts
+            reply_text, updated_approach, updated_pr_result = await _apply_reply("".join(chunks), request)
+            yield event({
+                "type": "final",
+                "reply": reply_text,
+                "updated_approach": updated_approach,
+                "updated_pr": updated_pr_result,
+            })
+        except Exception as e:
+            yield event({"type": "error", "detail": f"AI invocation error: {str(e)}"})
+
+    # Starlette stops iterating (and closes the model stream) when the client disconnects
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+
 
 #Summarizer Route
 @routes.post("/summarize", response_model=schemas.SummarizeIssueResponse)
-async def summarize_issue(request: schemas.SummarizeIssueRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    client = get_bedrock_client()
-    if not client:
+async def summarize_issue(request: schemas.SummarizeIssueRequest, http_request: Request):
+    provider = get_llm_provider()
+    if not provider.ready():
         raise HTTPException(status_code=500, detail="Failed to initialize AWS Bedrock Client.")
 
     repo_short_name = request.repo_name.split('/')[-1] if '/' in request.repo_name else request.repo_name
@@ -352,12 +490,7 @@ async def summarize_issue(request: schemas.SummarizeIssueRequest, background_tas
     # Securely retrieve PAT and GitHub Username
     github_username = "your-username" 
     try:
-        user_record = db.query(models.User).filter(models.User.email == request.user_email).first()
-        if user_record and user_record.github_pat:
-            decrypted_pat = decrypt_pat(user_record.github_pat)
-            res = req.get("https://api.github.com/user", headers={"Authorization": f"Bearer {decrypted_pat}"})
-            if res.status_code == 200:
-                github_username = res.json().get("login", "your-username")
+        github_username = (await github_credentials(request.user_email))[0] or "your-username"
     except Exception as e:
         print(f"Error fetching github username for fork instructions: {e}")
 
@@ -393,30 +526,11 @@ async def summarize_issue(request: schemas.SummarizeIssueRequest, background_tas
             commands=programmatic_commands
         )
 
-    # We use a background task to safely clone and analyze the repo without timing out the initial chat response
-    def run_analysis_in_background(repo_name: str):
-        # Create a fresh db session for the background thread
-        try:
-            from database import SessionLocal
-            db_bg = SessionLocal()
-        except ImportError:
-            # Fallback for circular imports depending on how main.py manages it
-            pass
-        
-        try:
-            # We need to run the async function in a new or existing event loop
-            client_bg = get_bedrock_client()
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(analyze_and_cache_repo(repo_name, db_bg, client_bg))
-            loop.close()
-        except Exception as e:
-            print(f"Failed to analyze repo in background summarize step: {str(e)}")
-        finally:
-            db_bg.close()
-
+    # Repo analysis and indexing run on the app's event loop after the response; concurrent
+    # summaries of the same repo share one job and a recently analyzed repo is skipped.
+    # The result is shared by every user, so it's built without this user's PAT
     try:
-        background_tasks.add_task(run_analysis_in_background, request.repo_name)
+        analysis_scheduler.submit(request.repo_name)
     except Exception as e:
         print(f"Failed to queue background repo analysis: {str(e)}")
 
@@ -444,44 +558,18 @@ async def summarize_issue(request: schemas.SummarizeIssueRequest, background_tas
     """
 
     # 3. Request structure for Amazon Nova
-    body = {
-        "system": [{"text": system_prompt}],
-        "messages": [{"role": "user", "content": [{"text": "Please provide the summary JSON."}]}],
-        "inferenceConfig": {
-            "temperature": 0.2, # Keeps the model highly factual and strict
-            "topP": 0.9,
-            "maxTokens": 1000
-        }
-    }
+    llm_request = LLMRequest(
+        system=system_prompt,
+        messages=user_message("Please provide the summary JSON."),
+        temperature=0.2,  # Keeps the model highly factual and strict
+        top_p=0.9,
+        max_tokens=1000,
+        label="summarize",
+    )
 
     try:
-        endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        if endpoint_url and ("localhost" in endpoint_url or "127.0.0.1" in endpoint_url):
-            ollama_url = "http://127.0.0.1:11434/api/chat"
-            payload = {
-                "model": "amazon.nova-2-lite:v1.0",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Please provide the summary JSON."}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                }
-            }
-            res = req.post(ollama_url, json=payload)
-            res.raise_for_status()
-            reply_text = res.json().get('message', {}).get('content', "")
-        else:
-            response = client.invoke_model(
-                modelId=os.getenv("NOVA_MODEL_ID", "amazon.nova-lite-v1:0"),
-                body=json.dumps(body),
-                accept="application/json",
-                contentType="application/json"
-            )
-            response_body = json.loads(response.get('body').read())
-            reply_text = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', "")
+        response = await cancel_on_disconnect(http_request, provider.complete(llm_request))
+        reply_text = response.text
 
         # 4. Clean and Parse the JSON from AI's text response
         reply_text = reply_text.strip()
@@ -495,22 +583,10 @@ async def summarize_issue(request: schemas.SummarizeIssueRequest, background_tas
         # 5. Save testing_steps to DB
         testing_steps_text = parsed_json.get("testing_steps", "Testing steps not generated.")
         try:
-            progress = db.query(models.ContributionProgress).filter(
-                models.ContributionProgress.user_email == request.user_email,
-                models.ContributionProgress.repo_name == request.repo_name,
-                models.ContributionProgress.issue_number == request.issue_number
-            ).first()
-            if progress:
-                progress.test_results = testing_steps_text
-            else:
-                progress = models.ContributionProgress(
-                    user_email=request.user_email,
-                    repo_name=request.repo_name,
-                    issue_number=request.issue_number,
-                    test_results=testing_steps_text
-                )
-                db.add(progress)
-            db.commit()
+            await asyncio.to_thread(
+                _save_progress, request.user_email, request.repo_name, request.issue_number,
+                create=True, test_results=testing_steps_text
+            )
         except Exception as save_err:
             print(f"Failed to save testing_steps from summarize: {save_err}")
 
@@ -523,13 +599,16 @@ async def summarize_issue(request: schemas.SummarizeIssueRequest, background_tas
         )
 
     except json.JSONDecodeError:
+         await provider.evict(llm_request)
          raise HTTPException(status_code=500, detail="Nova failed to format the response as JSON.")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Bedrock invocation error: {str(e)}")
 
 
 @routes.post("/testing-steps", response_model=schemas.FetchTestingStepsResponse)
-async def fetch_testing_steps(request: schemas.FetchTestingStepsRequest, db: Session = Depends(get_db)):
+async def fetch_testing_steps(request: schemas.FetchTestingStepsRequest, http_request: Request):
     key = f"{request.user_email}_{request.repo_name}_{request.issue_number}"
     now = time.time()
     last_req = nova_testing_steps_locks.get(key, 0)
@@ -537,22 +616,14 @@ async def fetch_testing_steps(request: schemas.FetchTestingStepsRequest, db: Ses
     if now - last_req < 15:
         # Ignore request to prevent Nova charges, but wait so the frontend displays "fetching testing steps, please wait"
         await asyncio.sleep(5)
-        progress = db.query(models.ContributionProgress).filter(
-            models.ContributionProgress.user_email == request.user_email,
-            models.ContributionProgress.repo_name == request.repo_name,
-            models.ContributionProgress.issue_number == request.issue_number
-        ).first()
+        progress = await asyncio.to_thread(_load_progress, request.user_email, request.repo_name, request.issue_number)
         return schemas.FetchTestingStepsResponse(
             testing_steps=progress.test_results if (progress and progress.test_results) else "Nova is busy, check after a moment."
         )
 
     nova_testing_steps_locks[key] = now
     
-    progress = db.query(models.ContributionProgress).filter(
-        models.ContributionProgress.user_email == request.user_email,
-        models.ContributionProgress.repo_name == request.repo_name,
-        models.ContributionProgress.issue_number == request.issue_number
-    ).first()
+    progress = await asyncio.to_thread(_load_progress, request.user_email, request.repo_name, request.issue_number)
     
     valid_test_results = progress and progress.test_results and "Nova is busy" not in progress.test_results and "Manually test" not in progress.test_results and "No testing steps provided" not in progress.test_results
     if valid_test_results:
@@ -562,12 +633,13 @@ async def fetch_testing_steps(request: schemas.FetchTestingStepsRequest, db: Ses
     if os.getenv("USE_NOVA", "True").lower() == "false":
         st = "Manually test your changes locally before submitting a PR."
         if progress:
-            progress.test_results = st
-            db.commit()
+            await asyncio.to_thread(
+                _save_progress, request.user_email, request.repo_name, request.issue_number, test_results=st
+            )
         return schemas.FetchTestingStepsResponse(testing_steps=st)
         
-    client = get_bedrock_client()
-    if not client:
+    provider = get_llm_provider()
+    if not provider.ready():
         raise HTTPException(status_code=500, detail="Failed to initialize AWS Bedrock Client.")
 
     discussion = "\n".join(request.comments) if request.comments else "No comments on this issue yet."
@@ -587,41 +659,18 @@ async def fetch_testing_steps(request: schemas.FetchTestingStepsRequest, db: Ses
     }}
     """
     
-    body = {
-        "system": [{"text": system_prompt}],
-        "messages": [{"role": "user", "content": [{"text": "Please provide the testing steps JSON."}]}],
-        "inferenceConfig": {
-            "temperature": 0.2, 
-            "topP": 0.9,
-            "maxTokens": 1000
-        }
-    }
+    llm_request = LLMRequest(
+        system=system_prompt,
+        messages=user_message("Please provide the testing steps JSON."),
+        temperature=0.2,
+        top_p=0.9,
+        max_tokens=1000,
+        label="testing_steps",
+    )
     
     try:
-        endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        if endpoint_url and ("localhost" in endpoint_url or "127.0.0.1" in endpoint_url):
-            ollama_url = "http://127.0.0.1:11434/api/chat"
-            payload = {
-                "model": "amazon.nova-2-lite:v1.0",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Please provide the testing steps JSON."}
-                ],
-                "stream": False,
-                "options": {"temperature": 0.2, "top_p": 0.9}
-            }
-            res = req.post(ollama_url, json=payload)
-            res.raise_for_status()
-            reply_text = res.json().get('message', {}).get('content', "")
-        else:
-            response = client.invoke_model(
-                modelId=os.getenv("NOVA_MODEL_ID", "amazon.nova-lite-v1:0"),
-                body=json.dumps(body),
-                accept="application/json",
-                contentType="application/json"
-            )
-            response_body = json.loads(response.get('body').read())
-            reply_text = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', "")
+        response = await cancel_on_disconnect(http_request, provider.complete(llm_request))
+        reply_text = response.text
 
         reply_text = reply_text.strip()
         if reply_text.startswith("```json"): reply_text = reply_text[7:-3].strip()
@@ -630,48 +679,69 @@ async def fetch_testing_steps(request: schemas.FetchTestingStepsRequest, db: Ses
         parsed_json = json.loads(reply_text)
         testing_steps = parsed_json.get("testing_steps", "Testing steps not generated.")
         
-        if progress:
-            progress.test_results = testing_steps
-            db.commit()
-        else:
-            new_progress = models.ContributionProgress(
-                user_email=request.user_email,
-                repo_name=request.repo_name,
-                issue_number=request.issue_number,
-                test_results=testing_steps
-            )
-            db.add(new_progress)
-            db.commit()
+        await asyncio.to_thread(
+            _save_progress, request.user_email, request.repo_name, request.issue_number,
+            create=True, test_results=testing_steps
+        )
             
         return schemas.FetchTestingStepsResponse(testing_steps=testing_steps)
         
+    except HTTPException:
+        nova_testing_steps_locks[key] = 0
+        raise
     except Exception as e:
         print(f"Nova error: {str(e)}")
         nova_testing_steps_locks[key] = 0
+        if isinstance(e, json.JSONDecodeError):
+            await provider.evict(llm_request)
         raise HTTPException(status_code=500, detail=f"Bedrock invocation error: {str(e)}")
 
+async def _evaluation_status(job, repo_name: str, issue_number: int, user_email: str) -> schemas.EvaluationStatusResponse:
+    if job is None:
+        return schemas.EvaluationStatusResponse(
+            status="none",
+            result=await asyncio.to_thread(stored_evaluation, repo_name, issue_number, user_email)
+        )
+    if job.status == "done":
+        result = job.result
+    else:
+        result = await asyncio.to_thread(stored_evaluation, repo_name, issue_number, user_email)
+    return schemas.EvaluationStatusResponse(**job.as_dict(), result=result)
+
+
+@routes.post("/evaluation", response_model=schemas.EvaluationStatusResponse)
+async def queue_evaluation(request: schemas.EvaluationRequest):
+    """Queues a local commit evaluation (git sync, tests, diff summary) for the issue branch."""
+    job = evaluation_queue.submit(request.repo_name, request.issue_number, request.user_email)
+    return await _evaluation_status(job, request.repo_name, request.issue_number, request.user_email)
+
+
+@routes.get("/evaluation", response_model=schemas.EvaluationStatusResponse)
+async def get_evaluation_status(
+    user_email: str = Query(...),
+    repo_name: str = Query(...),
+    issue_number: int = Query(...)
+):
+    """Reports the latest evaluation job for the issue and the last completed result."""
+    job = evaluation_queue.latest(repo_name, issue_number, user_email)
+    return await _evaluation_status(job, repo_name, issue_number, user_email)
+
+
 # Commits Route
 @routes.post("/commits", response_model=schemas.FetchCommitsResponse)
-async def fetch_commits(request: schemas.FetchCommitsRequest, db: Session = Depends(get_db)):
+async def fetch_commits(request: schemas.FetchCommitsRequest):
     """
     Checks the local workspace for the issue branch and returns the commit log messages.
     """
-    from app.utils.repo_analyzer import WORKSPACES_DIR, run_cmd_async
+    from app.utils import git_read
+    from app.utils.workspaces import ensure_fork_clone, fetch_remote, workspace_lock
     
     # Securely retrieve PAT and GitHub Username
     github_username = None
     pat = None
     try:
-        user_record = db.query(models.User).filter(models.User.email == request.user_email).first()
-        print(f"[COMMITS DEBUG] user_email={request.user_email}, user_found={user_record is not None}, has_pat={bool(user_record and user_record.github_pat)}")
-        if user_record and user_record.github_pat:
-            pat = decrypt_pat(user_record.github_pat)
-            print(f"[COMMITS DEBUG] PAT decrypted, first 8: {pat[:8]}...")
-            res = req.get("https://api.github.com/user", headers={"Authorization": f"Bearer {pat}"})
-            print(f"[COMMITS DEBUG] GitHub /user status: {res.status_code}")
-            if res.status_code == 200:
-                github_username = res.json().get("login")
-                print(f"[COMMITS DEBUG] GitHub username: {github_username}")
+        github_username, pat = await github_credentials(request.user_email)
+        print(f"[COMMITS DEBUG] user_email={request.user_email}, has_pat={bool(pat)}, GitHub username: {github_username}")
     except Exception as e:
         print(f"[COMMITS DEBUG] Error fetching github username for commits route: {e}")
         import traceback
@@ -684,11 +754,9 @@ async def fetch_commits(request: schemas.FetchCommitsRequest, db: Session = Depe
     fork_vscode_url = f"https://vscode.dev/github/{github_username}/{repo_short_name}"
 
     # --- DB-first fork status check ---
-    progress = db.query(models.ContributionProgress).filter(
-        models.ContributionProgress.user_email == request.user_email,
-        models.ContributionProgress.repo_name == request.repo_name,
-        models.ContributionProgress.issue_number == request.active_issue_number
-    ).first()
+    progress = await asyncio.to_thread(
+        _load_progress, request.user_email, request.repo_name, request.active_issue_number
+    )
 
     cached_fork_status = progress.fork_status if progress else None
 
@@ -698,30 +766,20 @@ async def fetch_commits(request: schemas.FetchCommitsRequest, db: Session = Depe
     else:
         # Check GitHub API to see if fork exists
         try:
-            fork_check = req.get(
-                f"https://api.github.com/repos/{github_username}/{repo_short_name}",
+            fork_check = await get_github_client().get(
+                f"/repos/{github_username}/{repo_short_name}",
                 headers={"Authorization": f"Bearer {pat}"}
             )
             fork_exists = fork_check.status_code == 200
         except Exception:
             fork_exists = False
 
-        # Persist fork status in DB when found
-        if fork_exists and progress:
-            progress.fork_status = "available"
-            progress.fork_vscode_url = fork_vscode_url
-            db.commit()
-        elif fork_exists and not progress:
-            # Create a progress entry to cache the fork status
-            new_progress = models.ContributionProgress(
-                user_email=request.user_email,
-                repo_name=request.repo_name,
-                issue_number=request.active_issue_number,
-                fork_status="available",
-                fork_vscode_url=fork_vscode_url
+        # Persist fork status in DB when found (creating a progress entry to cache it if needed)
+        if fork_exists:
+            await asyncio.to_thread(
+                _save_progress, request.user_email, request.repo_name, request.active_issue_number,
+                create=True, fork_status="available", fork_vscode_url=fork_vscode_url
             )
-            db.add(new_progress)
-            db.commit()
 
     if not fork_exists:
         return schemas.FetchCommitsResponse(
@@ -731,56 +789,36 @@ async def fetch_commits(request: schemas.FetchCommitsRequest, db: Session = Depe
         )
 
 
-    # We track the user's specific fork clone
-    repo_dir = os.path.join(WORKSPACES_DIR, f"{github_username}_{repo_short_name}")
-    
-    if not os.path.exists(repo_dir):
-        # Fork exists, but we haven't cloned it locally yet
-        if not os.path.exists(WORKSPACES_DIR):
-            os.makedirs(WORKSPACES_DIR)
-        clone_url = f"https://{pat}@github.com/{github_username}/{repo_short_name}.git"
-        code, out, err = await run_cmd_async(f"git clone {clone_url} {os.path.basename(repo_dir)}", cwd=WORKSPACES_DIR)
-        print(f"User Fork Clone result: code={code}")
-        if code != 0:
-            return schemas.FetchCommitsResponse(
-                commits=[],
-                fork_detected=True,
-                fork_vscode_url=fork_vscode_url
-            )
-        
-    branch_name = f"fix/issue-{request.active_issue_number}"
-    
-    # Always fetch latest from remote
-    await run_cmd_async("git fetch --all --prune", cwd=repo_dir)
-    
-    # Check if remote branch exists
-    code, remote_branches, _ = await run_cmd_async("git branch -r", cwd=repo_dir)
-    remote_branch_ref = f"origin/{branch_name}"
-    if remote_branch_ref not in remote_branches:
-        # Branch doesn't exist on remote yet — user hasn't pushed
+    # We track the user's specific fork clone, borrowing objects from the upstream mirror
+    repo_dir = await ensure_fork_clone(request.repo_name, github_username, repo_short_name, pat)
+    if not repo_dir:
         return schemas.FetchCommitsResponse(
             commits=[],
             fork_detected=True,
             fork_vscode_url=fork_vscode_url
         )
+        
+    branch_name = f"fix/issue-{request.active_issue_number}"
 
-    # Find default branch
-    code, def_branch_out, err = await run_cmd_async("git symbolic-ref refs/remotes/origin/HEAD", cwd=repo_dir)
-    if code != 0:
-        default_branch = "main"
-    else:
-        default_branch = def_branch_out.strip().split('/')[-1]
+    # Always fetch latest from remote; concurrent polls for the same fork share one fetch
+    await fetch_remote(repo_dir, ("--all", "--prune"))
+
+    async with workspace_lock(repo_dir):
+        # Check if remote branch exists
+        if not await git_read.ref_exists(repo_dir, f"refs/remotes/origin/{branch_name}"):
+            # Branch doesn't exist on remote yet — user hasn't pushed
+            return schemas.FetchCommitsResponse(
+                commits=[],
+                fork_detected=True,
+                fork_vscode_url=fork_vscode_url
+            )
+
+        # Find default branch
+        default_branch = await git_read.remote_head(repo_dir) or "main"
+
+        # Get commit messages: compare remote default branch to remote issue branch
+        commits = await git_read.log_oneline(repo_dir, f"origin/{default_branch}", f"origin/{branch_name}") or []
 
-    # Get commit messages: compare remote default branch to remote issue branch
-    code, log_out, err = await run_cmd_async(
-        f"git log origin/{default_branch}..origin/{branch_name} --oneline",
-        cwd=repo_dir
-    )
-    
-    commits = []
-    if log_out.strip():
-        commits = [line.strip() for line in log_out.strip().split('\n') if line.strip()]
-        
     return schemas.FetchCommitsResponse(
         commits=commits,
         fork_detected=True,
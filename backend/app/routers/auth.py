@@ -6,6 +6,7 @@ import models as models
 import app.schemas as schemas
 from database import get_db
 from app.utils.encryption import encrypt_pat
+from app.services.github_login import set_github_login
 
 routes = APIRouter(prefix="/user",tags=["Authentication"])
 
@@ -113,6 +114,7 @@ def save_pat(pat_data: schemas.PATUpdate, db: Session = Depends(get_db)):
         
     # 2. Save the PAT they just submitted
     user.github_pat = encrypt_pat(pat_data.pat)
+    set_github_login(user, pat_data.pat)
     db.commit()
     
     return {"message": "GitHub PAT securely linked to your account!"}
\ No newline at end of file
@@ -3,8 +3,11 @@ from sqlalchemy.orm import Session
 import models as models
 import app.schemas as schemas
 from database import get_db
-import requests as rq
+import asyncio
+import httpx
 from app.utils.encryption import decrypt_pat
+from app.utils.github_client import get_github_client
+from app.services.github_login import resolve_github_login
 from typing import Optional
 
 routes = APIRouter(prefix="/contribution", tags=["Contribution Flow"])
@@ -13,14 +16,14 @@ routes = APIRouter(prefix="/contribution", tags=["Contribution Flow"])
 POPULAR_ORGS = ["facebook", "vercel", "microsoft", "google", "freeCodeCamp"]
 
 @routes.get("/start", response_model=schemas.StartContributionResponse)
-def start_contribution(
+async def start_contribution(
     email: str, 
     language: Optional[str] = Query(None, description="Optional. If provided, filters orgs by this language."),
     search_query: Optional[str] = Query(None, description="Optional. Seach for specific Github Orgs"),
     db: Session = Depends(get_db)):
     
     # 1. Fetch User 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await asyncio.to_thread(lambda: db.query(models.User).filter(models.User.email == email).first())
     if not user:
         raise HTTPException(status_code=404, detail="User Not Found")
         
@@ -46,16 +49,17 @@ def start_contribution(
     }
 
     organizations = []
+    client = get_github_client()
     
     try:
         if search_query:
             # SEARCH ORGS: https://docs.github.com/en/rest/search/search?apiVersion=2022-11-28#search-users
-            search_url = "https://api.github.com/search/users"
+            search_url = "/search/users"
             params = {
                 "q": f"{search_query} type:org",
                 "per_page": 10
             }
-            res = rq.get(search_url, headers=headers, params=params)
+            res = await client.get(search_url, headers=headers, params=params)
             res.raise_for_status()
             
             items = res.json().get("items", [])
@@ -72,14 +76,14 @@ def start_contribution(
         elif language:
             # FIND ORGS BY LANGUAGE (Query Github Repos by Language, then extract orgs)
             search_language = "HTML" if language == "HTML/CSS" else language
-            search_url = "https://api.github.com/search/repositories"
+            search_url = "/search/repositories"
             params = {
                 "q": f"language:{search_language}",
                 "sort": "stars",
                 "order": "desc",
                 "per_page": 100
             }
-            res = rq.get(search_url, headers=headers, params=params)
+            res = await client.get(search_url, headers=headers, params=params)
             res.raise_for_status()
             
             items = res.json().get("items", [])
@@ -102,7 +106,7 @@ def start_contribution(
         else:
             # DEFAULT: Return Popular Orgs
             for org_name in POPULAR_ORGS:
-                res = rq.get(f"https://api.github.com/users/{org_name}", headers=headers)
+                res = await client.get(f"/users/{org_name}", headers=headers)
                 if res.status_code == 200:
                     data = res.json()
                     organizations.append(
@@ -120,7 +124,7 @@ def start_contribution(
             organizations=organizations
         )
             
-    except rq.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="Invalid GitHub PAT token.")
         raise HTTPException(status_code=e.response.status_code, detail="Failed to fetch data from GitHub.")
@@ -138,37 +142,39 @@ async def submit_pr(req: schemas.SubmitPRRequest, db: Session = Depends(get_db))
     decrypted_pat = decrypt_pat(user.github_pat)
 
     # 2. Get GitHub username
-    import requests as req_http
-    res = req_http.get("https://api.github.com/user", headers={"Authorization": f"Bearer {decrypted_pat}", "Accept": "application/vnd.github.v3+json"})
-    if res.status_code != 200:
+    client = get_github_client()
+    github_username = await resolve_github_login(user, db)
+    if not github_username:
         raise HTTPException(status_code=401, detail="Invalid GitHub PAT token.")
-    github_username = res.json().get("login")
 
     # 3. Locate workspace
     import os
-    from app.utils.repo_analyzer import run_cmd_async, WORKSPACES_DIR
+    from app.utils import git_read
+    from app.utils.workspaces import run_cmd_async, ensure_fork_clone, workspace_lock
     repo_short_name = req.repo_name.split('/')[-1] if '/' in req.repo_name else req.repo_name
-    repo_dir = os.path.join(WORKSPACES_DIR, f"{github_username}_{repo_short_name}")
-    if not os.path.exists(repo_dir):
+    # Re-clones the fork if its workspace was evicted
+    repo_dir = await ensure_fork_clone(req.repo_name, github_username, repo_short_name, decrypted_pat)
+    if not repo_dir:
         raise HTTPException(status_code=404, detail="Local repository workspace not found")
 
     branch_name = f"fix/issue-{req.issue_number}"
 
-    # 4. Push local branch to user's fork (origin)
-    code, out, err = await run_cmd_async(f"git push origin {branch_name}", cwd=repo_dir)
-    if code != 0:
-        raise HTTPException(status_code=500, detail=f"Failed to push branch to GitHub: {err}")
+    # Pushing updates remote-tracking refs, so it excludes concurrent fetches
+    async with workspace_lock(repo_dir, write=True):
+        # 4. Push local branch to user's fork (origin). A re-cloned workspace has no local
+        # branch; the commits are already on the fork in that case.
+        if await git_read.ref_exists(repo_dir, f"refs/heads/{branch_name}"):
+            code, out, err = await run_cmd_async(["git", "push", "origin", branch_name], cwd=repo_dir)
+            if code != 0:
+                raise HTTPException(status_code=500, detail=f"Failed to push branch to GitHub: {err}")
 
-    # 5. Get default branch of upstream repo to know where to open the PR against
-    code, def_branch_out, err = await run_cmd_async("git symbolic-ref refs/remotes/upstream/HEAD", cwd=repo_dir)
-    default_branch = "main"
-    if code == 0:
-         default_branch = def_branch_out.strip().split('/')[-1]
-    else:
+        # 5. Get default branch of upstream repo to know where to open the PR against
         # Fallback to checking origin if upstream remote isn't set
-        code, def_branch_out, err = await run_cmd_async("git symbolic-ref refs/remotes/origin/HEAD", cwd=repo_dir)
-        if code == 0:
-             default_branch = def_branch_out.strip().split('/')[-1]
+        default_branch = (
+            await git_read.remote_head(repo_dir, "upstream")
+            or await git_read.remote_head(repo_dir, "origin")
+            or "main"
+        )
 
     # 6. Create PR via GitHub API
     pr_payload = {
@@ -183,7 +189,7 @@ async def submit_pr(req: schemas.SubmitPRRequest, db: Session = Depends(get_db))
         "Accept": "application/vnd.github.v3+json"
     }
     
-    pr_res = req_http.post(f"https://api.github.com/repos/{req.repo_name}/pulls", headers=headers, json=pr_payload)
+    pr_res = await client.post(f"/repos/{req.repo_name}/pulls", headers=headers, json=pr_payload)
     
     if pr_res.status_code not in (201, 422): # 422 means PR might already exist
         raise HTTPException(status_code=pr_res.status_code, detail=f"Failed to create PR: {pr_res.text}")
@@ -227,11 +233,10 @@ async def submit_pr(req: schemas.SubmitPRRequest, db: Session = Depends(get_db))
 async def get_draft_pr_diff(
     user_email: str = Query(...),
     repo_name: str = Query(...),
-    issue_number: int = Query(...),
-    db: Session = Depends(get_db)
+    issue_number: int = Query(...)
 ):
     from app.utils.repo_analyzer import get_local_diff_stat, get_local_diff_patch
-    diff_stat = await get_local_diff_stat(repo_name, issue_number, user_email, db)
-    diff_patch = await get_local_diff_patch(repo_name, issue_number, user_email, db)
+    diff_stat = await get_local_diff_stat(repo_name, issue_number, user_email)
+    diff_patch = await get_local_diff_patch(repo_name, issue_number, user_email)
     return {"diff_stat": diff_stat, "diff_patch": diff_patch}
 
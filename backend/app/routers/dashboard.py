@@ -3,23 +3,25 @@ from sqlalchemy.orm import Session
 import models as models
 import app.schemas as schemas
 from database import get_db
-import requests as rq
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 import models as models
 import app.schemas as schemas
 from database import get_db
-import requests as rq
+import asyncio
+import httpx
 from app.utils.encryption import decrypt_pat
+from app.utils.github_client import get_github_client
+from app.services.github_login import resolve_github_login
 from datetime import datetime, timedelta
 
 routes = APIRouter(prefix="/user", tags=["Dashboard"])
 
 @routes.get("/dashboard", response_model=schemas.MainDashboardResponse)
-def user_dashboard(email: str, db: Session = Depends(get_db)):
-    # 1. Fetch User from DB
-    user = db.query(models.User).filter(models.User.email == email).first()
+async def user_dashboard(email: str, db: Session = Depends(get_db)):
+    # 1. Fetch User from DB (blocking queries run off the event loop)
+    user = await asyncio.to_thread(lambda: db.query(models.User).filter(models.User.email == email).first())
     if not user:
         raise HTTPException(status_code=404, detail="User Not Found")
     if not user.github_pat:
@@ -34,14 +36,16 @@ def user_dashboard(email: str, db: Session = Depends(get_db)):
         "Accept": "application/vnd.github.v3+json"
     }
     
+    client = get_github_client()
+
     try:
-        # 3. Get User Profile from GitHub (to get standard Github Username)
-        profile_res = rq.get("https://api.github.com/user", headers=headers)
-        profile_res.raise_for_status()
-        github_username = profile_res.json().get("login", "Unknown")
+        # 3. Resolve the standard Github Username (cached per PAT)
+        github_username = await resolve_github_login(user, db)
+        if not github_username:
+            raise HTTPException(status_code=401, detail="Invalid GitHub PAT token. Please update it.")
         
         # 4. Fetch actual GitHub Commit Map using GraphQL API
-        graphql_url = "https://api.github.com/graphql"
+        graphql_url = "/graphql"
         query = """
         query($login: String!) {
           user(login: $login) {
@@ -58,7 +62,7 @@ def user_dashboard(email: str, db: Session = Depends(get_db)):
           }
         }
         """
-        graphql_res = rq.post(
+        graphql_res = await client.post(
             graphql_url,
             json={"query": query, "variables": {"login": github_username}},
             headers=headers
@@ -95,11 +99,15 @@ def user_dashboard(email: str, db: Session = Depends(get_db)):
 
         # 5. Fetch "My Contributions", "Working Issues", "Pull Requests" 
         # Query the DB for actual contributions
-        db_contributions = db.query(models.Contributions).filter(models.Contributions.user_email == email).all()
+        db_contributions = await asyncio.to_thread(
+            lambda: db.query(models.Contributions).filter(models.Contributions.user_email == email).all()
+        )
         
         my_contributions = []
         working_issues = []
         pull_requests = []
+        # PR status updates are committed once, after the loop
+        status_changed = False
 
         for contrib in db_contributions:
             # Map DB entries to ContributionItem
@@ -125,25 +133,23 @@ def user_dashboard(email: str, db: Session = Depends(get_db)):
             if contrib.pr_sent and contrib.status and contrib.status.lower() in ["waiting", "submitted", "in review", "done"]:
                 try:
                     pr_head = f"{github_username}:fix/issue-{contrib.issue_number}"
-                    pr_check_url = f"https://api.github.com/repos/{contrib.repo_name}/pulls?head={pr_head}&state=all"
-                    pr_res = rq.get(pr_check_url, headers=headers)
+                    pr_check_url = f"/repos/{contrib.repo_name}/pulls"
+                    pr_res = await client.get(pr_check_url, headers=headers, params={"head": pr_head, "state": "all"})
                     if pr_res.status_code == 200:
                         prs = pr_res.json()
                         if prs and len(prs) > 0:
                             pr_data = prs[0]
                             if pr_data.get("merged_at"):
                                 contrib.status = "Accepted"
-                                db.commit()
                             elif pr_data.get("state") == "closed":
                                 contrib.status = "Rejected"
-                                db.commit()
                             else:
                                 contrib.status = "Waiting" # standardize ongoing PRs
-                                db.commit()
+                            status_changed = True
                         elif contrib.status.lower() == "done":
                             # Auto-heal "Done" if no PR exists
                             contrib.status = "Submitted"
-                            db.commit()
+                            status_changed = True
                 except Exception as e:
                     print(f"Error checking PR status for {contrib.repo_name} #{contrib.issue_number}: {e}")
 
@@ -160,6 +166,9 @@ def user_dashboard(email: str, db: Session = Depends(get_db)):
                      )
                  )
 
+        if status_changed:
+            await asyncio.to_thread(db.commit)
+
         # 6. Assemble Final Response
         return schemas.MainDashboardResponse(
             user_name=github_username,
@@ -170,7 +179,9 @@ def user_dashboard(email: str, db: Session = Depends(get_db)):
             pull_requests=pull_requests
         )
 
-    except rq.exceptions.HTTPError as e:
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="Invalid GitHub PAT token. Please update it.")
         raise HTTPException(status_code=e.response.status_code, detail="Failed to fetch data from GitHub.")
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 
 # Import the services we just made
-from app.services.github_service import fetch_org_catalog, fetch_repo_summary
+from app.services.github_service import get_cached_org_catalog, fetch_repo_summary
 from app.services.ai_service import ask_nova_about_issues
+from app.services.llm_gateway import cancel_on_disconnect
 
 router = APIRouter(
     prefix="/api/repo",
@@ -20,15 +21,15 @@ class ChatRequest(BaseModel):
     chat_history: Optional[List[Dict]] = None # Previous messages so Nova Remembers
 
 @router.post("/chat")
-async def chat_with_nova(request: ChatRequest):
+async def chat_with_nova(request: ChatRequest, http_request: Request):
     """
     The main endpoint. 
     It fetches the Github catalog, feeds it to Nova Lite, and returns the response.
     """
     try:
         # 1. Fetch the entire catalog for the chosen org
-        # (Bonus points: In a real app, cache this for 10 mins so you don't hit rate limits every message!)
-        catalog = fetch_org_catalog(
+        # (cached for 10 mins so follow-up messages don't hit GitHub every time)
+        catalog = await get_cached_org_catalog(
             org_name=request.org_name,
             repo_name=request.repo_name,
             label=request.label
@@ -38,11 +39,11 @@ async def chat_with_nova(request: ChatRequest):
             return {"reply": f"Hmm, I couldn't find any open issues for '{request.org_name}'. Are you sure they have public repos with open issues?"}
 
         # 2. Ask Nova the question
-        nova_reply = ask_nova_about_issues(
+        nova_reply = await cancel_on_disconnect(http_request, ask_nova_about_issues(
             catalog=catalog,
             user_message=request.message,
             chat_history=request.chat_history
-        )
+        ))
 
         # 3. Check if Nova selected an issue 
         # Remember our system prompt: "SELECTED_ISSUE: RepoName/#123"
@@ -59,6 +60,8 @@ async def chat_with_nova(request: ChatRequest):
             "is_selected": False
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -70,7 +73,7 @@ async def get_repo_summary(org_name: str, repo_name: str):
     tens of thousands of LLM tokens on reading the codebase!
     """
     try:
-        summary = fetch_repo_summary(org_name, repo_name)
+        summary = await fetch_repo_summary(org_name, repo_name)
         if "Repository data unavailable" in summary:
             raise HTTPException(status_code=404, detail="Repository not found or data unavailable")
         
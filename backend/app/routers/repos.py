@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 import models as models
 import app.schemas as schemas
 from database import get_db
-import requests as rq
+import asyncio
+import httpx
 from app.utils.encryption import decrypt_pat
+from app.utils.github_client import paginate, list_budget, GITHUB_LIST_MAX_ITEMS
 from typing import Optional
 
 routes = APIRouter(prefix="/repos", tags=["Repository & Issues"])
@@ -20,32 +22,19 @@ def get_github_headers(email: str, db: Session):
     }
 
 @routes.get("/{org_name}", response_model=schemas.RepoListResponse)
-def get_org_repos(
+async def get_org_repos(
     org_name: str, 
     email: str,
     language: Optional[str] = Query(None, description="Filter repos by language"),
     db: Session = Depends(get_db)):
     """Fetch repositories for a selected Organization"""
     
-    headers = get_github_headers(email, db)
-    
-    try:
-        # Fetch repos for the org
-        # https://docs.github.com/en/rest/repos/repos?apiVersion=2022-11-28#list-organization-repositories
-        repos_url = f"https://api.github.com/orgs/{org_name}/repos?sort=updated&per_page=30"
-        res = rq.get(repos_url, headers=headers)
-        
-        # If it's a user instead of an org (GitHub API returns 404 for users on /orgs/ route)
-        if res.status_code == 404:
-             repos_url = f"https://api.github.com/users/{org_name}/repos?sort=updated&per_page=30"
-             res = rq.get(repos_url, headers=headers)
-             
-        res.raise_for_status()
-        
-        raw_repos = res.json()
+    headers = await asyncio.to_thread(get_github_headers, email, db)
+    max_items = list_budget(GITHUB_LIST_MAX_ITEMS)
+
+    async def collect_repos(repos_url: str):
         repos = []
-        
-        for repo in raw_repos:
+        async for repo in paginate(repos_url, headers=headers, max_items=max_items):
             # Optionally filter by language if the user is a beginner and selected one
             if language:
                 search_language = "HTML" if language == "HTML/CSS" else language
@@ -63,38 +52,46 @@ def get_org_repos(
                     stars=repo.get("stargazers_count", 0)
                 )
             )
+        return repos
+    
+    try:
+        # Fetch repos for the org, following pagination up to the list budget
+        # https://docs.github.com/en/rest/repos/repos?apiVersion=2022-11-28#list-organization-repositories
+        try:
+            repos = await collect_repos(f"/orgs/{org_name}/repos?sort=updated&per_page=100")
+        except httpx.HTTPStatusError as e:
+            # If it's a user instead of an org (GitHub API returns 404 for users on /orgs/ route)
+            if e.response.status_code != 404:
+                raise
+            repos = await collect_repos(f"/users/{org_name}/repos?sort=updated&per_page=100")
             
         return schemas.RepoListResponse(
             org_name=org_name,
             repos=repos
         )
         
-    except rq.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="Invalid GitHub PAT token.")
         raise HTTPException(status_code=e.response.status_code, detail=f"Failed to fetch repos: {str(e)}")
 
 @routes.get("/{org_name}/{repo_name}/issues", response_model=schemas.IssueListResponse)
-def get_repo_issues(
+async def get_repo_issues(
     org_name: str, 
     repo_name: str, 
     email: str,
     db: Session = Depends(get_db)):
     """Fetch open issues for a selected Repository"""
     
-    headers = get_github_headers(email, db)
+    headers = await asyncio.to_thread(get_github_headers, email, db)
     
     try:
-        # Fetch open issues
+        # Fetch open issues, following pagination up to the list budget
         # https://docs.github.com/en/rest/issues/issues?apiVersion=2022-11-28#list-repository-issues
-        issues_url = f"https://api.github.com/repos/{org_name}/{repo_name}/issues?state=open&per_page=30&sort=updated"
-        res = rq.get(issues_url, headers=headers)
-        res.raise_for_status()
-        
-        raw_issues = res.json()
+        issues_url = f"/repos/{org_name}/{repo_name}/issues?state=open&per_page=100&sort=updated"
         issues = []
         
-        for issue in raw_issues:
+        async for issue in paginate(issues_url, headers=headers, max_items=list_budget(GITHUB_LIST_MAX_ITEMS)):
             # GitHub API returns pull requests as issues too; filter them out
             if "pull_request" in issue:
                 continue
@@ -117,7 +114,7 @@ def get_repo_issues(
             issues=issues
         )
         
-    except rq.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(status_code=401, detail="Invalid GitHub PAT token.")
         raise HTTPException(status_code=e.response.status_code, detail=f"Failed to fetch issues: {str(e)}")
@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+
+from app.services.analysis_scheduler import analysis_scheduler
+from app.services.evaluation_queue import evaluation_queue
+from app.services.llm_provider import llm_stats
+from app.utils.git_read import git_read_stats
+from app.utils.github_client import github_cache_stats
+from app.utils.process_runner import process_stats
+from app.utils.workspace_quota import quota_sweeper, workspace_usage
+
+routes = APIRouter(prefix="/stats", tags=["Operational Stats"])
+
+@routes.get("/workspaces")
+async def get_workspace_stats():
+    """Disk usage and in-use counts per workspace kind under WORKSPACES_DIR, against the quota."""
+    usage = await workspace_usage()
+    usage["last_sweep"] = quota_sweeper.last_run
+    return usage
+
+@routes.get("/runtime")
+async def get_runtime_stats():
+    """Cache hit rates, LLM call metrics, evaluation and analysis queues, and subprocess timings for this worker."""
+    return {
+        "github_cache": github_cache_stats(),
+        "llm": llm_stats(),
+        "evaluations": evaluation_queue.stats(),
+        "analyses": analysis_scheduler.stats(),
+        "processes": process_stats(),
+        "git_read": git_read_stats(),
+    }
@@ -184,6 +184,20 @@ class FetchCommitsResponse(BaseModel):
     fork_detected: bool = False
     fork_vscode_url: Optional[str] = None
 
+class EvaluationRequest(BaseModel):
+    repo_name: str
+    issue_number: int
+    user_email: str
+
+class EvaluationStatusResponse(BaseModel):
+    job_id: Optional[str] = None
+    status: str  # none | queued | running | done | failed | timeout
+    queued_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[str] = None  # Latest completed evaluation
+
 # Tier 6 - Contribution Progress Save State
 
 class SaveProgressRequest(BaseModel):
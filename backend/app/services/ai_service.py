@@ -1,17 +1,11 @@
 import json
-import boto3
 from typing import List, Dict
-
-# Set up the Bedrock client (Make sure your AWS Credentials are in the .env or environment)
-bedrock_client = boto3.client(
-    service_name='bedrock-runtime',
-    region_name='us-east-1' # Change this if your AWS region is different
-)
+from app.services.llm_provider import LLMMessage, LLMRequest, get_llm_provider, to_llm_messages
 
 # Amazon Nova Lite model ID
 MODEL_ID = "amazon.nova-lite-v1:0"
 
-def ask_nova_about_issues(catalog: List[Dict], user_message: str, chat_history: List[Dict] = None) -> str:
+async def ask_nova_about_issues(catalog: List[Dict], user_message: str, chat_history: List[Dict] = None) -> str:
     """
     Sends the GitHub Catalog as a System Prompt to Nova Lite and processes the chat.
     chat_history should be a list of dicts like [{"role": "user", "content": "..."}]
@@ -34,28 +28,21 @@ def ask_nova_about_issues(catalog: List[Dict], user_message: str, chat_history:
        "SELECTED_ISSUE: RepoName/#123" so the system knows they chose it. Do not use this string otherwise.
     """
 
-    # Format the message for the Bedrock Converse API
-    system = [{"text": system_prompt}]
-    
     # Append the newest user message to the history
-    messages = chat_history + [
-        {"role": "user", "content": [{"text": user_message}]}
-    ]
+    messages = to_llm_messages(chat_history) + [LLMMessage(role="user", content=user_message)]
 
     try:
-        # Call the Nova Lite model via the Converse API
-        response = bedrock_client.converse(
-            modelId=MODEL_ID,
+        response = await get_llm_provider().complete(LLMRequest(
+            system=system_prompt,
             messages=messages,
-            system=system,
-            inferenceConfig={
-                "temperature": 0.5,
-                "topP": 0.9
-            }
-        )
+            model_id=MODEL_ID,
+            temperature=0.5,
+            top_p=0.9,
+            label="catalog_chat",
+        ))
         
         # Extract and return what Nova says
-        return response['output']['message']['content'][0]['text']
+        return response.text
 
     except Exception as e:
         print(f"Error calling AWS Bedrock: {e}")
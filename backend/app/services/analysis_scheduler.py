@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Set
+
+import models
+from database import SessionLocal
+from app.utils.code_index import ensure_code_index, index_is_fresh
+from app.utils.repo_analyzer import ANALYSIS_STALE_CHECK_INTERVAL, analyze_and_cache_repo
+
+# Repository analyses (layout, Nova call and code index) that may run at once on this host
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+# Hard limit for one repository's analysis, indexing included
+ANALYSIS_JOB_TIMEOUT = float(os.getenv("ANALYSIS_JOB_TIMEOUT", "900"))
+# How long /nova/ask waits for a repository's first analysis if one is already running
+ANALYSIS_ASK_WAIT = float(os.getenv("ANALYSIS_ASK_WAIT", "5"))
+
+
+class AnalysisJob:
+    __slots__ = ("repo_name", "status", "result", "error", "queued_at", "started_at", "finished_at", "_done")
+
+    def __init__(self, repo_name: str):
+        self.repo_name = repo_name
+        self.status = "queued"  # queued | running | done | failed | timeout | fresh
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    async def wait(self) -> Optional[str]:
+        """Waits for the analysis and returns its context (None if it failed)."""
+        await self._done.wait()
+        return self.result
+
+    def _finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        self._done.set()
+
+
+class AnalysisScheduler:
+    """
+    Runs repository analyses on the application's event loop. Concurrent requests for the
+    same repository share one job, repositories analyzed recently are skipped, and a
+    semaphore caps how many analyses run at once. Database work runs in threads on
+    sessions of the scheduler's own, never on the loop or on a request's session.
+    """
+
+    def __init__(self, workers: int = ANALYSIS_WORKERS):
+        self.workers = workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, AnalysisJob] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._counts = {"submitted": 0, "deduplicated": 0, "skipped_fresh": 0, "done": 0, "failed": 0}
+
+    def start(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._pending.clear()
+        self._semaphore = None
+
+    def submit(self, repo_name: str) -> AnalysisJob:
+        """
+        Schedules an analysis of repo_name, or returns the one already pending for it.
+        A repository whose stored analysis and code index are both fresh resolves without
+        taking a worker. Private repositories fail without being analyzed.
+        """
+        self.start()
+        job = self._pending.get(repo_name)
+        if job is not None:
+            self._counts["deduplicated"] += 1
+            return job
+
+        job = AnalysisJob(repo_name)
+        self._counts["submitted"] += 1
+        self._pending[repo_name] = job
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def pending(self, repo_name: str) -> Optional[AnalysisJob]:
+        return self._pending.get(repo_name)
+
+    @staticmethod
+    def _fresh_analysis(repo_name: str) -> Optional[str]:
+        """The stored analysis if it was checked recently. Blocking: run it in a thread."""
+        db = SessionLocal()
+        try:
+            cached = db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == repo_name).first()
+            if cached is None or time.time() - (cached.checked_at or 0) >= ANALYSIS_STALE_CHECK_INTERVAL:
+                return None
+            return cached.system_prompt_context
+        finally:
+            db.close()
+
+    async def _analyze(self, repo_name: str) -> str:
+        context = await analyze_and_cache_repo(repo_name)
+        # File search index for /nova/ask, so Nova can point at specific files
+        try:
+            await ensure_code_index(repo_name)
+        except Exception as e:
+            print(f"Failed to index {repo_name}: {e}")
+        return context
+
+    async def _run(self, job: AnalysisJob):
+        try:
+            cached = await asyncio.to_thread(self._fresh_analysis, job.repo_name) if await index_is_fresh(job.repo_name) else None
+            if cached is not None:
+                self._counts["skipped_fresh"] += 1
+                job.result = cached
+                job._finish("fresh")
+                return
+            async with self._semaphore:
+                job.status = "running"
+                job.started_at = time.time()
+                job.result = await asyncio.wait_for(self._analyze(job.repo_name), ANALYSIS_JOB_TIMEOUT)
+            self._counts["done"] += 1
+            job._finish("done")
+        except asyncio.TimeoutError:
+            self._counts["failed"] += 1
+            job.error = f"Analysis exceeded {int(ANALYSIS_JOB_TIMEOUT)}s"
+            job._finish("timeout")
+        except asyncio.CancelledError:
+            job.error = "Cancelled at shutdown"
+            job._finish("failed")
+            raise
+        except Exception as e:
+            self._counts["failed"] += 1
+            job.error = str(e)
+            job._finish("failed")
+            print(f"Repo analysis failed for {job.repo_name}: {e}")
+        finally:
+            if self._pending.get(job.repo_name) is job:
+                del self._pending[job.repo_name]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": len(self._pending),
+            "running": sum(1 for job in self._pending.values() if job.status == "running"),
+            **self._counts,
+        }
+
+
+analysis_scheduler = AnalysisScheduler()
+
+
+async def pending_analysis(repo_name: str, wait: float = ANALYSIS_ASK_WAIT) -> Optional[str]:
+    """Waits briefly for an analysis already scheduled for repo_name; None if none finishes in time."""
+    job = analysis_scheduler.pending(repo_name)
+    if job is None:
+        return None
+    try:
+        # shield() so giving up on the wait doesn't cancel the shared job
+        return await asyncio.wait_for(asyncio.shield(job.wait()), wait)
+    except asyncio.TimeoutError:
+        return None
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import models
+from database import SessionLocal
+from app.utils.repo_analyzer import evaluate_local_commits
+
+# Evaluations that may run at once on this host (each can clone, fetch and run a test suite)
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "4"))
+# Evaluations that may run at once against forks of the same upstream repository
+EVAL_MAX_PER_REPO = int(os.getenv("EVAL_MAX_PER_REPO", "2"))
+# Hard limit for a whole evaluation (git sync, tests and diff summary)
+EVAL_JOB_TIMEOUT = float(os.getenv("EVAL_JOB_TIMEOUT", "900"))
+# How long /nova/ask waits for a fresh evaluation before using the last completed one
+EVAL_ASK_WAIT = float(os.getenv("EVAL_ASK_WAIT", "3"))
+# Finished jobs kept in memory for the status endpoint
+EVAL_MAX_FINISHED_JOBS = 1024
+
+JobKey = Tuple[str, str, int]
+
+
+class EvaluationJob:
+    __slots__ = ("id", "key", "status", "result", "error", "queued_at", "started_at", "finished_at", "_done")
+
+    def __init__(self, key: JobKey):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"  # queued | running | done | failed | timeout
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    async def wait(self):
+        await self._done.wait()
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class EvaluationQueue:
+    """
+    In-process queue of local commit evaluations served by a fixed pool of asyncio workers.
+    Test suites and git already run as subprocesses, so workers only orchestrate them; the
+    pool size caps concurrent evaluations per host. Jobs wait in one queue per repository
+    and workers take from the repositories round robin, skipping any already running
+    max_per_repo jobs, so a burst for one repository never holds up the others.
+    """
+
+    def __init__(self, workers: int = EVAL_WORKERS, max_per_repo: int = EVAL_MAX_PER_REPO):
+        self.workers = workers
+        self.max_per_repo = max_per_repo
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, EvaluationJob]" = OrderedDict()
+        self._latest: Dict[JobKey, EvaluationJob] = {}
+        # Queued jobs per repository, in the order workers visit the repositories
+        self._waiting: "OrderedDict[str, Deque[EvaluationJob]]" = OrderedDict()
+        self._running: Dict[str, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, repo_name: str, issue_number: int, user_email: str) -> EvaluationJob:
+        """
+        Queues an evaluation, or returns the one already waiting for the same issue.
+        A job that is already running may be looking at an older push, so it isn't reused.
+        """
+        self.start()
+        key = (user_email, repo_name, issue_number)
+        job = self._latest.get(key)
+        if job is not None and job.status == "queued":
+            return job
+
+        job = EvaluationJob(key)
+        self._jobs[job.id] = job
+        self._latest[key] = job
+        self._waiting.setdefault(repo_name, deque()).append(job)
+        self._wakeup.set()
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[EvaluationJob]:
+        return self._jobs.get(job_id)
+
+    def latest(self, repo_name: str, issue_number: int, user_email: str) -> Optional[EvaluationJob]:
+        return self._latest.get((user_email, repo_name, issue_number))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - EVAL_MAX_FINISHED_JOBS)]:
+            job = self._jobs.pop(job_id)
+            if self._latest.get(job.key) is job:
+                del self._latest[job.key]
+
+    def _take(self) -> Optional[EvaluationJob]:
+        """The next job of the first repository below its limit; that repository moves to the back."""
+        for repo_name, waiting in self._waiting.items():
+            if self._running.get(repo_name, 0) >= self.max_per_repo:
+                continue
+            job = waiting.popleft()
+            if waiting:
+                self._waiting.move_to_end(repo_name)
+            else:
+                del self._waiting[repo_name]
+            self._running[repo_name] = self._running.get(repo_name, 0) + 1
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._take()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            repo_name = job.key[1]
+            try:
+                await self._run(job)
+            finally:
+                self._running[repo_name] -= 1
+                if not self._running[repo_name]:
+                    del self._running[repo_name]
+                # A slot for this repository is free again
+                self._wakeup.set()
+
+    async def _run(self, job: EvaluationJob):
+        user_email, repo_name, issue_number = job.key
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            # Opens its own sessions and keeps their queries off the loop
+            job.result = await asyncio.wait_for(
+                evaluate_local_commits(repo_name, issue_number, user_email), EVAL_JOB_TIMEOUT
+            )
+            job.status = "done"
+        except asyncio.TimeoutError:
+            job.status = "timeout"
+            job.error = f"Evaluation exceeded {int(EVAL_JOB_TIMEOUT)}s"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"Evaluation failed for {repo_name}#{issue_number}: {e}")
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued": sum(len(waiting) for waiting in self._waiting.values()),
+            "running": sum(1 for job in self._jobs.values() if job.status == "running"),
+            "tracked_jobs": len(self._jobs),
+        }
+
+
+evaluation_queue = EvaluationQueue()
+
+
+def stored_evaluation(repo_name: str, issue_number: int, user_email: str) -> Optional[str]:
+    """The last completed evaluation persisted on the progress row, if any. Blocking: run it in a thread."""
+    db = SessionLocal()
+    try:
+        progress = db.query(models.ContributionProgress).filter(
+            models.ContributionProgress.user_email == user_email,
+            models.ContributionProgress.repo_name == repo_name,
+            models.ContributionProgress.issue_number == issue_number
+        ).first()
+        return progress.eval_result if progress else None
+    finally:
+        db.close()
+
+
+async def latest_evaluation(repo_name: str, issue_number: int, user_email: str,
+                            wait: float = EVAL_ASK_WAIT) -> str:
+    """
+    Queues a fresh evaluation and waits briefly for it. Unchanged branches resolve from the
+    memo almost immediately; otherwise the last completed evaluation is used while the
+    new one keeps running in the background.
+    """
+    if not user_email:
+        return ""
+
+    job = evaluation_queue.submit(repo_name, issue_number, user_email)
+    try:
+        # shield() so giving up on the wait doesn't cancel the job
+        await asyncio.wait_for(asyncio.shield(job.wait()), wait)
+    except asyncio.TimeoutError:
+        pass
+
+    if job.status == "done":
+        return job.result or ""
+
+    previous = await asyncio.to_thread(stored_evaluation, repo_name, issue_number, user_email)
+    if not previous:
+        return ""
+    if not job.finished:
+        previous += (
+            "\n\nNote: the user's latest push is still being evaluated; "
+            "these results may not reflect their newest commits."
+        )
+    return previous
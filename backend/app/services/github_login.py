@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from app.utils.encryption import decrypt_pat
+from app.utils.github_client import get_github_client, github_auth_headers
+
+# How long a resolved login is trusted in memory before we look at the DB row again
+GITHUB_LOGIN_TTL = int(os.getenv("GITHUB_LOGIN_TTL", "3600"))
+
+# (user email, PAT fingerprint) -> (github login, expires_at)
+_login_cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+
+def pat_fingerprint(pat: str) -> str:
+    """Short, non-reversible identifier for a PAT so the raw token is never used as a cache key."""
+    return hashlib.sha256(pat.encode()).hexdigest()[:16]
+
+
+def _prune_expired(now: float):
+    expired = [key for key, (_, expires_at) in _login_cache.items() if expires_at <= now]
+    for key in expired:
+        _login_cache.pop(key, None)
+
+
+async def resolve_github_login(user: Optional[models.User], db: Session) -> Optional[str]:
+    """
+    Returns the GitHub login behind the user's stored PAT.
+    Checks the in-memory cache first, then the login stored on the User row,
+    and only calls GitHub's /user endpoint when neither knows the answer.
+    """
+    if not user or not user.github_pat:
+        return None
+
+    pat = decrypt_pat(user.github_pat)
+    key = (user.email, pat_fingerprint(pat))
+    now = time.time()
+
+    cached = _login_cache.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    login = user.github_login
+    if not login:
+        res = await get_github_client().get("/user", headers=github_auth_headers(pat))
+        if res.status_code != 200:
+            return None
+        login = res.json().get("login")
+        if not login:
+            return None
+        user.github_login = login
+        await asyncio.to_thread(db.commit)
+
+    _prune_expired(now)
+    _login_cache[key] = (login, now + GITHUB_LOGIN_TTL)
+    return login
+
+
+async def github_credentials(user_email: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (GitHub login, decrypted PAT) of the user; (None, None) without a usable PAT. Queries run
+    in threads on a session of its own, for callers that have none or are off the request.
+    """
+    db = SessionLocal()
+    try:
+        user = await asyncio.to_thread(lambda: db.query(models.User).filter(models.User.email == user_email).first())
+        if not user or not user.github_pat:
+            return None, None
+        pat = decrypt_pat(user.github_pat)
+        return await resolve_github_login(user, db), pat
+    finally:
+        await asyncio.to_thread(db.close)
+
+
+def set_github_login(user: models.User, pat: Optional[str], login: Optional[str] = None):
+    """
+    Drops every cached login for this user and records the login for their new PAT.
+    Call whenever the PAT changes; pass login=None when it hasn't been verified yet.
+    The caller is responsible for committing the session.
+    """
+    for key in [key for key in _login_cache if key[0] == user.email]:
+        _login_cache.pop(key, None)
+
+    user.github_login = login
+    if pat and login:
+        _login_cache[(user.email, pat_fingerprint(pat))] = (login, time.time() + GITHUB_LOGIN_TTL)
@@ -1,9 +1,35 @@
 import os
-import requests
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Tuple
+import httpx
+from app.utils.github_client import get_github_client, paginate, list_budget
+from app.utils.cache import AsyncTTLCache
 
 # Fetching the PAT from the environment variables (Make sure this is set in your .env!)
 GITHUB_PAT = os.getenv("GITHUB_TOKEN")
+# Max per-repo issue requests in flight while building an org catalog
+GITHUB_CATALOG_CONCURRENCY = int(os.getenv("GITHUB_CATALOG_CONCURRENCY", "10"))
+# Item budgets for walking large orgs (0 = no limit)
+GITHUB_CATALOG_MAX_REPOS = int(os.getenv("GITHUB_CATALOG_MAX_REPOS", "500"))
+GITHUB_CATALOG_ISSUES_PER_REPO = int(os.getenv("GITHUB_CATALOG_ISSUES_PER_REPO", "100"))
+# Org catalogs are served from memory for CATALOG_CACHE_TTL seconds, then served stale
+# for up to CATALOG_CACHE_STALE_TTL more seconds while a background refresh runs
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "600"))
+CATALOG_CACHE_STALE_TTL = float(os.getenv("CATALOG_CACHE_STALE_TTL", "3600"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "128"))
+CATALOG_CACHE_MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Catalogs missing repos whose fetch failed are only reused for this long (0 = never cached)
+CATALOG_CACHE_FAILED_TTL = float(os.getenv("CATALOG_CACHE_FAILED_TTL", "30"))
+
+_catalog_cache = AsyncTTLCache(
+    ttl=CATALOG_CACHE_TTL,
+    stale_ttl=CATALOG_CACHE_STALE_TTL,
+    max_entries=CATALOG_CACHE_MAX_ENTRIES,
+    max_bytes=CATALOG_CACHE_MAX_BYTES,
+    # Entries are (catalog, complete)
+    negative_ttl=CATALOG_CACHE_FAILED_TTL,
+    is_negative=lambda entry: not entry[1],
+)
 
 def get_github_headers() -> dict:
     headers = {
@@ -13,84 +39,109 @@ def get_github_headers() -> dict:
         headers["Authorization"] = f"token {GITHUB_PAT}"
     return headers
 
-def fetch_org_catalog(org_name: str, repo_name: str = None, label: str = None) -> List[Dict]:
+async def _fetch_repo_issues(headers: dict, org_name: str, repo: str, label: str, semaphore: asyncio.Semaphore) -> Dict:
+    """Fetches the compact issue list for one repo, or None if it has no open issues."""
+    # Build the issue URL with optional label filtering
+    issues_url = f"/repos/{org_name}/{repo}/issues?state=open&per_page=100"
+    if label:
+        issues_url += f"&labels={label}"
+
+    clean_issues = []
+    async with semaphore:
+        async for issue in paginate(issues_url, headers=headers, max_items=list_budget(GITHUB_CATALOG_ISSUES_PER_REPO)):
+            # Filter out Pull Requests (GitHub returns them in the Issues API)
+            if "pull_request" in issue:
+                continue
+
+            # Create a compact summary of the issue
+            clean_issues.append({
+                "number": issue["number"],
+                "title": issue["title"],
+                "labels": [label["name"] for label in issue.get("labels", [])]
+            })
+
+    if not clean_issues:
+        return None
+    return {"repo": repo, "issues": clean_issues}
+
+async def fetch_org_catalog(org_name: str, repo_name: str = None, label: str = None) -> List[Dict]:
     """
     Fetches issues. If repo_name is provided, it only fetches issues for that repo.
     If label is provided, it filters issues by that label directly via the GitHub API.
     Returns a clean, compact catalog for Nova Lite.
     """
+    catalog, _ = await _fetch_org_catalog(org_name, repo_name, label)
+    return catalog
+
+async def _fetch_org_catalog(org_name: str, repo_name: str = None, label: str = None) -> Tuple[List[Dict], bool]:
+    """fetch_org_catalog, plus whether every request succeeded (False if repos are missing)."""
     headers = get_github_headers()
-    catalog = []
+    semaphore = asyncio.Semaphore(GITHUB_CATALOG_CONCURRENCY)
+    repo_names = []
+    tasks = []
+    complete = True
+
+    def queue_repo(name: str):
+        repo_names.append(name)
+        tasks.append(asyncio.ensure_future(_fetch_repo_issues(headers, org_name, name, label, semaphore)))
 
     # If the user selected a specific repo, we don't need to fetch the whole org
     if repo_name:
-        repos = [{"name": repo_name, "open_issues_count": 1}] # Fake count to bypass the skip logic
+        queue_repo(repo_name)
     else:
-        # 1. Fetch repositories for the organization
-        repos_url = f"https://api.github.com/orgs/{org_name}/repos?per_page=100"
-        repos_response = requests.get(repos_url, headers=headers)
-        
-        if repos_response.status_code != 200:
-            print(f"Failed to fetch repos for {org_name}: {repos_response.text}")
-            return []
-        
-        repos = repos_response.json()
-
-
+        # 1. Walk the organization's repositories page by page, starting each repo's
+        # issue fetch as soon as it streams in rather than after the full listing
+        repos_url = f"/orgs/{org_name}/repos?per_page=100"
+        try:
+            async for repo in paginate(repos_url, headers=headers, max_items=list_budget(GITHUB_CATALOG_MAX_REPOS)):
+                # Skip repos with no issues to save API calls and tokens
+                if repo.get("open_issues_count", 0) > 0:
+                    queue_repo(repo["name"])
+        except httpx.HTTPError as e:
+            print(f"Failed to fetch repos for {org_name}: {e}")
+            complete = False
+            if not tasks:
+                return [], False
 
-    # 2. Loop through repos and fetch issues
-    for repo in repos:
-        current_repo = repo["name"]
-        open_issues_count = repo.get("open_issues_count", 0)
+    # 2. Wait for every repo's issues; gather keeps the repo order
+    results = await asyncio.gather(*tasks, return_exceptions=True)
 
-        # Skip repos with no issues to save API calls and tokens
-        if open_issues_count == 0 and not repo_name:
+    catalog = []
+    for name, result in zip(repo_names, results):
+        # One failing repo shouldn't sink the whole catalog
+        if isinstance(result, Exception):
+            print(f"Failed to fetch issues for {org_name}/{name}: {result}")
+            complete = False
             continue
+        if result:
+            catalog.append(result)
 
-        # Build the issue URL with optional label filtering
-        issues_url = f"https://api.github.com/repos/{org_name}/{current_repo}/issues?state=open&per_page=50"
-        if label:
-            issues_url += f"&labels={label}"
-            
-        issues_response = requests.get(issues_url, headers=headers)
-        
-        if issues_response.status_code == 200:
-            issues_data = issues_response.json()
-            clean_issues = []
-            
-            for issue in issues_data:
-                # Filter out Pull Requests (GitHub returns them in the Issues API)
-                if "pull_request" in issue:
-                    continue
-                    
-                # Create a compact summary of the issue
-                clean_issues.append({
-                    "number": issue["number"],
-                    "title": issue["title"],
-                    "labels": [label["name"] for label in issue.get("labels", [])]
-                })
-
-            if clean_issues:
-                catalog.append({
-                    "repo": current_repo,
-                    "issues": clean_issues
-                })
+    return catalog, complete
 
+async def get_cached_org_catalog(org_name: str, repo_name: str = None, label: str = None) -> List[Dict]:
+    """
+    fetch_org_catalog behind a short-TTL cache. Concurrent callers for the same
+    (org, repo, label) share one fetch, and stale catalogs are returned immediately
+    while a background refresh brings them up to date. A catalog missing repos that
+    failed to load is only reused for CATALOG_CACHE_FAILED_TTL seconds.
+    """
+    key = (org_name.lower(), (repo_name or "").lower(), label or "")
+    catalog, _ = await _catalog_cache.get_or_load(key, lambda: _fetch_org_catalog(org_name, repo_name, label))
     return catalog
 
 # Example usage (You can test this directly if you put a test string below)
 # if __name__ == "__main__":
-#     print(fetch_org_catalog("facebook")) # Replace with your org
+#     print(asyncio.run(fetch_org_catalog("facebook"))) # Replace with your org
 
-def fetch_repo_summary(org_name: str, repo_name: str) -> str:
+async def fetch_repo_summary(org_name: str, repo_name: str) -> str:
     """
     Fetches the native high-level summary of a repository directly from GitHub 
     to save on LLM token costs.
     """
     headers = get_github_headers()
-    url = f"https://api.github.com/repos/{org_name}/{repo_name}"
+    url = f"/repos/{org_name}/{repo_name}"
     
-    response = requests.get(url, headers=headers)
+    response = await get_github_client().get(url, headers=headers)
     if response.status_code == 200:
         data = response.json()
         
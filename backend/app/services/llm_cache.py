@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import models
+from database import SessionLocal
+
+# "memory", "sql" (memory in front of the LLMResponseCache table) or "none"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").strip().lower()
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Seconds to keep a response, per call label. Labels not listed here are never cached:
+# free-form chat runs at a higher temperature and its prompts rarely repeat.
+_DEFAULT_TTLS = {
+    "summarize": 24 * 3600,
+    "testing_steps": 24 * 3600,
+    "diff_summary": 7 * 24 * 3600,
+    "repo_analysis": 24 * 3600,
+}
+
+
+def _parse_ttls(value: str) -> Dict[str, int]:
+    # LLM_CACHE_TTLS="summarize=3600,diff_summary=0"; 0 disables caching for a label
+    ttls = dict(_DEFAULT_TTLS)
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        label, seconds = item.split("=", 1)
+        try:
+            ttls[label.strip()] = int(seconds)
+        except ValueError:
+            print(f"Ignoring invalid LLM_CACHE_TTLS entry: {item}")
+    return ttls
+
+
+LLM_CACHE_TTLS = _parse_ttls(os.getenv("LLM_CACHE_TTLS", ""))
+
+
+def cache_key(provider: str, request) -> str:
+    """Content address of an LLM call: provider, model, prompts and inference config."""
+    material = {
+        "provider": provider,
+        "model_id": request.model_id,
+        "system": request.system,
+        "messages": [[m.role, m.content] for m in request.messages],
+        "max_tokens": request.max_tokens,
+        "temperature": request.temperature,
+        "top_p": request.top_p,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+class MemoryBackend:
+    """Process-local LRU bounded by entry count and encoded size."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, encoded)
+        self._bytes = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, encoded = entry
+        if expires_at <= time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return encoded
+
+    async def set(self, key: str, encoded: str, ttl: float, label: str):
+        self._drop(key)
+        if len(encoded) > self.max_bytes:
+            return
+        self._entries[key] = (time.time() + ttl, encoded)
+        self._bytes += len(encoded)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= len(entry[1])
+
+    async def delete(self, key: str):
+        self._drop(key)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLBackend:
+    """LLMResponseCache table, shared across workers and restarts. Queries run off the event loop."""
+
+    # Expired rows are swept every this many writes
+    PURGE_EVERY = 200
+
+    def __init__(self):
+        self._writes = 0
+
+    def _get(self, key: str) -> Optional[tuple]:
+        db = SessionLocal()
+        try:
+            row = db.query(models.LLMResponseCache).filter(
+                models.LLMResponseCache.key == key,
+                models.LLMResponseCache.expires_at > time.time(),
+            ).first()
+            return (row.response, row.expires_at) if row else None
+        finally:
+            db.close()
+
+    def _set(self, key: str, encoded: str, ttl: int, label: str, purge: bool):
+        db = SessionLocal()
+        try:
+            db.merge(models.LLMResponseCache(key=key, label=label, response=encoded, expires_at=time.time() + ttl))
+            if purge:
+                db.query(models.LLMResponseCache).filter(
+                    models.LLMResponseCache.expires_at <= time.time()
+                ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _delete(self, key: str):
+        db = SessionLocal()
+        try:
+            db.query(models.LLMResponseCache).filter(models.LLMResponseCache.key == key).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def get(self, key: str) -> Optional[tuple]:
+        """Returns (encoded response, expires_at) or None."""
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, encoded: str, ttl: int, label: str):
+        self._writes += 1
+        await asyncio.to_thread(self._set, key, encoded, ttl, label, self._writes % self.PURGE_EVERY == 0)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    def stats(self) -> dict:
+        return {"writes": self._writes}
+
+
+class LLMResponseCache:
+    """
+    Looks up LLM responses by content address. The memory tier always sits in front;
+    the SQL tier, when enabled, backfills it. Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, backend: str = LLM_CACHE_BACKEND, ttls: Optional[Dict[str, int]] = None):
+        self.enabled = backend != "none"
+        self.ttls = LLM_CACHE_TTLS if ttls is None else ttls
+        self.memory = MemoryBackend()
+        self.sql = SQLBackend() if backend == "sql" else None
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def ttl_for(self, label: str) -> int:
+        return self.ttls.get(label, 0) if self.enabled else 0
+
+    def _count(self, label: str, outcome: str):
+        counters = self._counters.setdefault(label, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+    async def get(self, key: str, label: str) -> Optional[dict]:
+        encoded = await self.memory.get(key)
+        if encoded is None and self.sql is not None:
+            try:
+                row = await self.sql.get(key)
+            except Exception as e:
+                print(f"LLM cache read failed: {e}")
+                row = None
+            if row is not None:
+                encoded, expires_at = row
+                await self.memory.set(key, encoded, expires_at - time.time(), label)
+        self._count(label, "hits" if encoded is not None else "misses")
+        return json.loads(encoded) if encoded is not None else None
+
+    async def set(self, key: str, label: str, value: dict):
+        ttl = self.ttl_for(label)
+        if ttl <= 0:
+            return
+        encoded = json.dumps(value)
+        await self.memory.set(key, encoded, ttl, label)
+        if self.sql is not None:
+            try:
+                await self.sql.set(key, encoded, ttl, label)
+            except Exception as e:
+                print(f"LLM cache write failed: {e}")
+
+    async def invalidate(self, key: str):
+        await self.memory.delete(key)
+        if self.sql is not None:
+            try:
+                await self.sql.delete(key)
+            except Exception as e:
+                print(f"LLM cache delete failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sql" if self.sql is not None else ("memory" if self.enabled else "none"),
+            "labels": self._counters,
+            "memory": self.memory.stats(),
+            "sql": self.sql.stats() if self.sql is not None else None,
+        }
+
+
+llm_cache = LLMResponseCache()
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException, Request
+
+from app.utils.aws_client import get_bedrock_client
+
+NOVA_MODEL_ID = os.getenv("NOVA_MODEL_ID", "amazon.nova-lite-v1:0")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+# boto3 is synchronous, so Bedrock calls run on a dedicated, bounded thread pool
+LLM_THREAD_POOL_SIZE = int(os.getenv("LLM_THREAD_POOL_SIZE", "32"))
+# Max in-flight calls per model id, across both Bedrock and Ollama
+LLM_MAX_CONCURRENCY_PER_MODEL = int(os.getenv("LLM_MAX_CONCURRENCY_PER_MODEL", "16"))
+# Non-standard "client closed request" status (nginx) for calls abandoned by a disconnect
+CLIENT_CLOSED_REQUEST = 499
+
+_executor: Optional[ThreadPoolExecutor] = None
+_model_semaphores: Dict[str, asyncio.Semaphore] = {}
+_ollama_client: Optional[httpx.AsyncClient] = None
+
+
+def _model_semaphore(model_id: str) -> asyncio.Semaphore:
+    semaphore = _model_semaphores.get(model_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY_PER_MODEL)
+        _model_semaphores[model_id] = semaphore
+    return semaphore
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=LLM_THREAD_POOL_SIZE, thread_name_prefix="bedrock")
+    return _executor
+
+
+def _get_ollama_client() -> httpx.AsyncClient:
+    global _ollama_client
+    if _ollama_client is None or _ollama_client.is_closed:
+        _ollama_client = httpx.AsyncClient(base_url=OLLAMA_URL, timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=5.0))
+    return _ollama_client
+
+
+async def _submit_holding_slot(model_id: str, fn: Callable[[], object]) -> "asyncio.Future":
+    """
+    Submits fn to the LLM thread pool once model_id has a free slot. The slot is held until
+    fn returns in its thread, not until the caller stops waiting: a Bedrock call abandoned by
+    a cancelled request keeps running, so it keeps counting against the limit.
+    """
+    semaphore = _model_semaphore(model_id)
+    await semaphore.acquire()
+    loop = asyncio.get_running_loop()
+
+    def release(_: Future):
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass  # The loop is already closed (shutdown)
+
+    try:
+        future = _get_executor().submit(fn)
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(release)
+    return asyncio.wrap_future(future, loop=loop)
+
+
+async def invoke_bedrock_model(body: dict, model_id: str = NOVA_MODEL_ID) -> dict:
+    """Calls Bedrock invoke_model off the event loop and returns the decoded response body."""
+    client = get_bedrock_client()
+    if not client:
+        raise RuntimeError("Failed to initialize AWS Bedrock Client.")
+
+    def call():
+        response = client.invoke_model(
+            modelId=model_id,
+            body=json.dumps(body),
+            accept="application/json",
+            contentType="application/json"
+        )
+        return json.loads(response.get('body').read())
+
+    return await (await _submit_holding_slot(model_id, call))
+
+
+async def ollama_chat(payload: dict) -> dict:
+    """Posts a chat request to the local Ollama server with a native async client."""
+    async with _model_semaphore(payload.get("model", "")):
+        res = await _get_ollama_client().post("/api/chat", json=payload)
+        res.raise_for_status()
+        return res.json()
+
+
+async def stream_bedrock_model(body: dict, model_id: str = NOVA_MODEL_ID) -> AsyncIterator[str]:
+    """
+    Yields text deltas from Bedrock invoke_model_with_response_stream.
+    The blocking event stream is drained on the LLM thread pool and handed to the
+    event loop through a queue; closing the generator stops the drain early.
+    """
+    client = get_bedrock_client()
+    if not client:
+        raise RuntimeError("Failed to initialize AWS Bedrock Client.")
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    stop = threading.Event()
+
+    def pump():
+        try:
+            response = client.invoke_model_with_response_stream(
+                modelId=model_id,
+                body=json.dumps(body),
+                accept="application/json",
+                contentType="application/json"
+            )
+            for event in response.get("body"):
+                if stop.is_set():
+                    break
+                chunk = event.get("chunk")
+                if not chunk:
+                    continue
+                data = json.loads(chunk.get("bytes"))
+                text = data.get("contentBlockDelta", {}).get("delta", {}).get("text")
+                if text:
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+    # The slot is released when pump returns, which may be after this generator is closed
+    await _submit_holding_slot(model_id, pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is finished:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+async def stream_ollama_chat(payload: dict) -> AsyncIterator[str]:
+    """Yields text deltas from Ollama's streaming chat API (newline-delimited JSON)."""
+    payload = dict(payload, stream=True)
+    async with _model_semaphore(payload.get("model", "")):
+        async with _get_ollama_client().stream("POST", "/api/chat", json=payload) as res:
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                text = data.get("message", {}).get("content")
+                if text:
+                    yield text
+                if data.get("done"):
+                    break
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable, poll_interval: float = 1.0):
+    """
+    Awaits an LLM call, cancelling it if the HTTP client goes away first, in which case
+    it raises HTTPException(499). Ollama requests are aborted outright; a Bedrock call
+    already running on the thread pool finishes in the background but its result is dropped.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected during LLM call")
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+async def close_llm_gateway():
+    """Releases the Ollama connection pool and the Bedrock thread pool. Called on shutdown."""
+    global _ollama_client, _executor
+    if _ollama_client is not None:
+        await _ollama_client.aclose()
+        _ollama_client = None
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+    # Semaphores belong to this loop; a restarted app gets fresh ones
+    _model_semaphores.clear()
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.services.llm_gateway import (
+    NOVA_MODEL_ID,
+    invoke_bedrock_model,
+    ollama_chat,
+    stream_bedrock_model,
+    stream_ollama_chat,
+)
+from app.services.llm_cache import cache_key, llm_cache
+from app.utils.aws_client import get_bedrock_client
+
+# "bedrock", "ollama" or "fake". Unset keeps the old behaviour: Ollama when
+# AWS_ENDPOINT_URL points at localhost, Bedrock otherwise.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "").strip().lower()
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "amazon.nova-2-lite:v1.0")
+# Fake backend knobs, for local development and load tests
+LLM_FAKE_REPLY = os.getenv("LLM_FAKE_REPLY", "")
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "0"))
+
+
+class LLMMessage(BaseModel):
+    role: str
+    content: str
+
+
+class LLMRequest(BaseModel):
+    system: str = ""
+    messages: List[LLMMessage]
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    model_id: str = NOVA_MODEL_ID
+    # Call type (e.g. "ask", "summarize"), used to group metrics
+    label: str = "default"
+
+
+class LLMResponse(BaseModel):
+    text: str
+    provider: str
+    model_id: str
+    latency_ms: float
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached: bool = False
+
+
+def user_message(content: str) -> List[LLMMessage]:
+    return [LLMMessage(role="user", content=content)]
+
+
+def to_llm_messages(messages: List[dict]) -> List[LLMMessage]:
+    """Accepts plain {"role", "content": str} dicts or Bedrock-style content block lists."""
+    result = []
+    for msg in messages:
+        content = msg.get("content", "")
+        if isinstance(content, list):
+            content = "".join(block.get("text", "") for block in content if isinstance(block, dict))
+        result.append(LLMMessage(role=msg.get("role", "user"), content=content))
+    return result
+
+
+class _CallStats:
+    __slots__ = ("calls", "errors", "latency_ms", "max_latency_ms", "input_tokens", "output_tokens")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.latency_ms / self.calls, 1) if self.calls else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 1),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+_stats: Dict[str, _CallStats] = {}
+
+
+def _record(provider: str, label: str, latency_ms: float, response: Optional[LLMResponse] = None):
+    stats = _stats.setdefault(f"{provider}:{label}", _CallStats())
+    if response is None:
+        stats.errors += 1
+        return
+    stats.calls += 1
+    stats.latency_ms += latency_ms
+    stats.max_latency_ms = max(stats.max_latency_ms, latency_ms)
+    stats.input_tokens += response.input_tokens or 0
+    stats.output_tokens += response.output_tokens or 0
+
+
+def llm_stats() -> dict:
+    return {
+        "calls": {key: stats.as_dict() for key, stats in _stats.items()},
+        "cache": llm_cache.stats(),
+    }
+
+
+class LLMProvider:
+    """
+    Base class for LLM backends. Subclasses implement _complete() and _stream();
+    the public methods add timing and token accounting around them, and complete()
+    serves repeat requests for cacheable call labels from the response cache.
+    """
+    name = "base"
+
+    def ready(self) -> bool:
+        return True
+
+    async def _complete(self, request: LLMRequest) -> LLMResponse:
+        raise NotImplementedError
+
+    def _stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        start = time.perf_counter()
+        key = cache_key(self.name, request) if llm_cache.ttl_for(request.label) else None
+        if key:
+            cached = await llm_cache.get(key, request.label)
+            if cached is not None:
+                return LLMResponse(**dict(cached, latency_ms=(time.perf_counter() - start) * 1000, cached=True))
+
+        try:
+            response = await self._complete(request)
+        except Exception:
+            _record(self.name, request.label, (time.perf_counter() - start) * 1000)
+            raise
+        response.latency_ms = (time.perf_counter() - start) * 1000
+        _record(self.name, request.label, response.latency_ms, response)
+        if key and response.text.strip():
+            await llm_cache.set(key, request.label, response.model_dump())
+        return response
+
+    async def evict(self, request: LLMRequest):
+        """Drops a cached response, e.g. one the caller couldn't parse."""
+        await llm_cache.invalidate(cache_key(self.name, request))
+
+    async def stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        chunks = []
+        try:
+            async for delta in self._stream(request):
+                chunks.append(delta)
+                yield delta
+        except Exception:
+            _record(self.name, request.label, (time.perf_counter() - start) * 1000)
+            raise
+        latency_ms = (time.perf_counter() - start) * 1000
+        # Streaming APIs don't report usage uniformly, so only latency is recorded
+        _record(self.name, request.label, latency_ms, LLMResponse(
+            text="".join(chunks), provider=self.name, model_id=request.model_id, latency_ms=latency_ms
+        ))
+
+
+class BedrockProvider(LLMProvider):
+    name = "bedrock"
+
+    def ready(self) -> bool:
+        return get_bedrock_client() is not None
+
+    @staticmethod
+    def _body(request: LLMRequest) -> dict:
+        # Reference: https://docs.aws.amazon.com/bedrock/latest/userguide/model-parameters-nova.html
+        inference_config = {}
+        if request.max_tokens is not None:
+            inference_config["maxTokens"] = request.max_tokens
+        if request.temperature is not None:
+            inference_config["temperature"] = request.temperature
+        if request.top_p is not None:
+            inference_config["topP"] = request.top_p
+
+        body = {
+            "messages": [{"role": m.role, "content": [{"text": m.content}]} for m in request.messages],
+            "inferenceConfig": inference_config,
+        }
+        if request.system:
+            body["system"] = [{"text": request.system}]
+        return body
+
+    async def _complete(self, request: LLMRequest) -> LLMResponse:
+        response_body = await invoke_bedrock_model(self._body(request), model_id=request.model_id)
+        usage = response_body.get("usage", {})
+        return LLMResponse(
+            text=response_body.get("output", {}).get("message", {}).get("content", [{}])[0].get("text", ""),
+            provider=self.name,
+            model_id=request.model_id,
+            latency_ms=0,
+            input_tokens=usage.get("inputTokens"),
+            output_tokens=usage.get("outputTokens"),
+        )
+
+    def _stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        return stream_bedrock_model(self._body(request), model_id=request.model_id)
+
+
+class OllamaProvider(LLMProvider):
+    name = "ollama"
+
+    @staticmethod
+    def _payload(request: LLMRequest) -> dict:
+        messages = []
+        if request.system:
+            messages.append({"role": "system", "content": request.system})
+        messages.extend({"role": m.role, "content": m.content} for m in request.messages)
+
+        options = {}
+        if request.max_tokens is not None:
+            options["num_predict"] = request.max_tokens
+        if request.temperature is not None:
+            options["temperature"] = request.temperature
+        if request.top_p is not None:
+            options["top_p"] = request.top_p
+
+        return {"model": OLLAMA_MODEL, "messages": messages, "stream": False, "options": options}
+
+    async def _complete(self, request: LLMRequest) -> LLMResponse:
+        res_json = await ollama_chat(self._payload(request))
+        return LLMResponse(
+            text=res_json.get("message", {}).get("content", ""),
+            provider=self.name,
+            model_id=OLLAMA_MODEL,
+            latency_ms=0,
+            input_tokens=res_json.get("prompt_eval_count"),
+            output_tokens=res_json.get("eval_count"),
+        )
+
+    def _stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        return stream_ollama_chat(self._payload(request))
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic in-process backend. Replies with `reply` (or LLM_FAKE_REPLY) if set,
+    otherwise echoes the last message, after an optional simulated latency.
+    """
+    name = "fake"
+
+    def __init__(self, reply: Optional[str] = None, latency_ms: Optional[float] = None):
+        self.reply = reply if reply is not None else LLM_FAKE_REPLY
+        self.latency_ms = LLM_FAKE_LATENCY_MS if latency_ms is None else latency_ms
+
+    def _text(self, request: LLMRequest) -> str:
+        if self.reply:
+            return self.reply
+        last = request.messages[-1].content if request.messages else ""
+        return f"[fake:{request.label}] {last[:200]}"
+
+    async def _complete(self, request: LLMRequest) -> LLMResponse:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        text = self._text(request)
+        prompt = request.system + "".join(m.content for m in request.messages)
+        return LLMResponse(
+            text=text,
+            provider=self.name,
+            model_id=request.model_id,
+            latency_ms=0,
+            # Rough whitespace token counts keep the metrics meaningful in load tests
+            input_tokens=len(prompt.split()),
+            output_tokens=len(text.split()),
+        )
+
+    async def _stream(self, request: LLMRequest) -> AsyncIterator[str]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        for i, word in enumerate(self._text(request).split(" ")):
+            yield word if i == 0 else " " + word
+
+
+_PROVIDERS = {
+    "bedrock": BedrockProvider,
+    "ollama": OllamaProvider,
+    "fake": FakeProvider,
+}
+_provider: Optional[LLMProvider] = None
+
+
+def _default_provider_name() -> str:
+    if LLM_PROVIDER:
+        return LLM_PROVIDER
+    endpoint_url = os.getenv("AWS_ENDPOINT_URL")
+    if endpoint_url and ("localhost" in endpoint_url or "127.0.0.1" in endpoint_url):
+        return "ollama"
+    return "bedrock"
+
+
+def get_llm_provider() -> LLMProvider:
+    """Returns the configured LLM provider (see LLM_PROVIDER)."""
+    global _provider
+    if _provider is None:
+        name = _default_provider_name()
+        if name not in _PROVIDERS:
+            raise RuntimeError(f"Unknown LLM_PROVIDER '{name}'. Expected one of: {', '.join(_PROVIDERS)}")
+        _provider = _PROVIDERS[name]()
+    return _provider
+
+
+def set_llm_provider(provider: Optional[LLMProvider]):
+    """Overrides the active provider (e.g. a FakeProvider in tests). None restores the configured one."""
+    global _provider
+    _provider = provider
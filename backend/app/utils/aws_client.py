@@ -0,0 +1,72 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Tuning for the shared Bedrock runtime client
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "3"))
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5"))
+BEDROCK_READ_TIMEOUT = float(os.getenv("BEDROCK_READ_TIMEOUT", "120"))
+
+_client_lock = threading.Lock()
+_client = None
+_client_settings = None
+
+
+def _clean(value):
+    # .env values are sometimes quoted; boto3 wants them bare
+    return value.strip().strip('"').strip("'") if value else value
+
+
+def _current_settings() -> dict:
+    # Relies on the host environment having AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY
+    # or having an IAM role assigned to the EC2 instance reading from .env
+    settings = {"region_name": _clean(os.getenv("AWS_REGION", "us-east-1"))}
+
+    access_key = os.getenv("AWS_ACCESS_KEY_ID")
+    secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+    if access_key and secret_key:
+        settings["aws_access_key_id"] = _clean(access_key)
+        settings["aws_secret_access_key"] = _clean(secret_key)
+
+    endpoint_url = os.getenv("AWS_ENDPOINT_URL")
+    if endpoint_url:
+        settings["endpoint_url"] = _clean(endpoint_url)
+
+    return settings
+
+
+def _build_client(settings: dict):
+    config = Config(
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": BEDROCK_MAX_ATTEMPTS, "mode": "adaptive"},
+        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+        read_timeout=BEDROCK_READ_TIMEOUT,
+    )
+    return boto3.client(service_name="bedrock-runtime", config=config, **settings)
+
+
+def get_bedrock_client():
+    """
+    Returns the process-wide Bedrock runtime client, creating it on first use.
+    The client is rebuilt only when the region, credentials or endpoint in the
+    environment change. Returns None if the client can't be created.
+    """
+    global _client, _client_settings
+    settings = _current_settings()
+    client = _client
+    if client is not None and _client_settings == settings:
+        return client
+
+    # boto3's default session isn't safe for concurrent client creation
+    with _client_lock:
+        if _client is None or _client_settings != settings:
+            try:
+                _client = _build_client(settings)
+                _client_settings = settings
+            except Exception as e:
+                print(f"Error initializing Bedrock client: {e}")
+                return None
+        return _client
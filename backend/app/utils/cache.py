@@ -0,0 +1,137 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def _json_size(value: Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except Exception:
+        return 0
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at", "size", "ttl", "stale_ttl")
+
+    def __init__(self, value: Any, size: int, ttl: float, stale_ttl: float):
+        self.value = value
+        self.stored_at = time.monotonic()
+        self.size = size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def live(self) -> bool:
+        return time.monotonic() - self.stored_at < self.ttl + self.stale_ttl
+
+
+class AsyncTTLCache:
+    """
+    In-memory LRU for results of async loaders.
+
+    - Entries younger than `ttl` are served as-is.
+    - Entries older than `ttl` but within `stale_ttl` more seconds are served
+      immediately while a background task refreshes them (stale-while-revalidate).
+    - Concurrent misses or refreshes for the same key share a single loader call.
+    - Results that `is_negative` flags (e.g. built from a failed fetch) are kept only
+      `negative_ttl` seconds (0 = not at all), are never served stale and never replace
+      a good entry.
+    - Eviction is least-recently-used, bounded by entry count and approximate bytes.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0, max_entries: int = 256,
+                 max_bytes: int = 0, sizeof: Callable[[Any], int] = _json_size,
+                 negative_ttl: float = 0, is_negative: Optional[Callable[[Any], bool]] = None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _store(self, key: Hashable, value: Any):
+        ttl, stale_ttl = self.ttl, self.stale_ttl
+        if self.is_negative is not None and self.is_negative(value):
+            ttl, stale_ttl = self.negative_ttl, 0
+            old = self._entries.get(key)
+            # A good entry still being served (fresh or stale) wins; an expired one is replaced
+            if ttl <= 0 or (old is not None and not self.is_negative(old.value) and old.live()):
+                return
+        old = self._entries.pop(key, None)
+        if old:
+            self._bytes -= old.size
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        self._entries[key] = _Entry(value, size, ttl, stale_ttl)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes)):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+
+        async def run():
+            value = await loader()
+            self._store(key, value)
+            return value
+
+        future = asyncio.ensure_future(run())
+        self._inflight[key] = future
+
+        def done(f: asyncio.Future):
+            self._inflight.pop(key, None)
+            # Background refreshes have no awaiter; consume their errors here
+            if not f.cancelled() and f.exception() is not None:
+                print(f"Cache refresh failed for {key}: {f.exception()}")
+
+        future.add_done_callback(done)
+        return future
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age < entry.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if age < entry.ttl + entry.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._start_load(key, loader)
+                return entry.value
+
+        self.misses += 1
+        # shield() so one cancelled waiter doesn't cancel the load the others share
+        return await asyncio.shield(self._start_load(key, loader))
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+            self._bytes = 0
+            return
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,442 @@
+import asyncio
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.utils import git_read
+from app.utils.file_tree import TREE_IGNORE
+from app.utils.workspaces import INDEX_DIR, ensure_mirror, ensure_snapshot, mirror_dir, single_flight, workspace_lock
+
+# One index per upstream repository under INDEX_DIR: meta.json (files, symbols, lengths),
+# terms.json (term -> postings offset and document frequency) and postings.bin (memory-mapped)
+INDEX_VERSION = 1
+# Files larger than this are left out (generated code, fixtures, vendored bundles)
+INDEX_MAX_FILE_BYTES = int(os.getenv("INDEX_MAX_FILE_BYTES", str(256 * 1024)))
+INDEX_MAX_FILES = int(os.getenv("INDEX_MAX_FILES", "20000"))
+INDEX_MAX_TOTAL_BYTES = int(os.getenv("INDEX_MAX_TOTAL_BYTES", str(128 * 1024 * 1024)))
+# How often a repository's index is checked against the upstream default branch
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "3600"))
+# Past this many changed paths between the indexed and current commit, rebuild from scratch
+INDEX_INCREMENTAL_MAX_CHANGES = int(os.getenv("INDEX_INCREMENTAL_MAX_CHANGES", "2000"))
+# Files suggested to Nova per question
+INDEX_TOP_K = int(os.getenv("INDEX_TOP_K", "8"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Path and symbol terms say more about what a file is for than its body does
+PATH_WEIGHT = 3
+SYMBOL_WEIGHT = 2
+
+_POSTING = struct.Struct("<IH")  # doc id, term frequency (capped)
+
+LANGUAGES = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+    ".go": "go", ".rs": "rust", ".java": "java", ".kt": "kotlin", ".kts": "kotlin", ".scala": "scala",
+    ".rb": "ruby", ".php": "php", ".cs": "csharp", ".swift": "swift",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".cxx": "cpp", ".hpp": "cpp", ".hh": "cpp",
+    ".m": "objc", ".dart": "dart", ".lua": "lua", ".ex": "elixir", ".exs": "elixir",
+    ".vue": "vue", ".svelte": "svelte", ".sh": "shell", ".bash": "shell",
+    ".sql": "sql", ".graphql": "graphql", ".proto": "protobuf",
+    ".html": "html", ".css": "css", ".scss": "css",
+    ".md": "markdown", ".rst": "rst", ".toml": "toml", ".yaml": "yaml", ".yml": "yaml", ".json": "json",
+}
+SPECIAL_FILES = {"Dockerfile": "docker", "Makefile": "make", "CMakeLists.txt": "cmake", "Gemfile": "ruby"}
+SKIP_SUFFIXES = (".min.js", ".min.css", ".map", ".lock", "-lock.json", ".snap")
+
+_C_LIKE_TYPES = r"^\s*(?:public\s+|private\s+|protected\s+|internal\s+|abstract\s+|final\s+|static\s+|sealed\s+|data\s+|open\s+)*(?:class|interface|enum|struct|record|object|trait)\s+(\w+)"
+SYMBOL_PATTERNS = {
+    "python": [r"^\s*(?:async\s+)?def\s+(\w+)", r"^\s*class\s+(\w+)"],
+    "javascript": [
+        r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)",
+        r"^\s*(?:export\s+)?(?:default\s+)?class\s+(\w+)",
+        r"^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:\([^)]*\)|\w+)\s*=>",
+    ],
+    "go": [r"^func\s+(?:\([^)]*\)\s*)?(\w+)", r"^type\s+(\w+)\s+(?:struct|interface)"],
+    "rust": [r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+(\w+)", r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait)\s+(\w+)"],
+    "java": [_C_LIKE_TYPES],
+    "ruby": [r"^\s*def\s+(?:self\.)?(\w+[?!]?)", r"^\s*(?:class|module)\s+(\w+)"],
+    "php": [r"^\s*(?:public\s+|private\s+|protected\s+|static\s+)*function\s+(\w+)", _C_LIKE_TYPES],
+    # Definitions only: a return type, the name and an opening paren with no trailing `;`
+    "c": [r"^[A-Za-z_][\w \t\*]*?\b(\w+)[ \t]*\([^;\n]*$", r"^\s*(?:typedef\s+)?struct\s+(\w+)"],
+}
+SYMBOL_PATTERNS["typescript"] = SYMBOL_PATTERNS["javascript"] + [r"^\s*(?:export\s+)?(?:interface|type|enum)\s+(\w+)"]
+SYMBOL_PATTERNS["vue"] = SYMBOL_PATTERNS["svelte"] = SYMBOL_PATTERNS["javascript"]
+SYMBOL_PATTERNS["kotlin"] = [r"^\s*(?:\w+\s+)*fun\s+(?:<[^>]*>\s*)?(?:\w+\.)?(\w+)", _C_LIKE_TYPES]
+SYMBOL_PATTERNS["scala"] = [r"^\s*(?:\w+\s+)*def\s+(\w+)", _C_LIKE_TYPES]
+SYMBOL_PATTERNS["csharp"] = SYMBOL_PATTERNS["swift"] = SYMBOL_PATTERNS["dart"] = [_C_LIKE_TYPES]
+SYMBOL_PATTERNS["cpp"] = SYMBOL_PATTERNS["objc"] = SYMBOL_PATTERNS["c"] + [_C_LIKE_TYPES]
+SYMBOL_PATTERNS["elixir"] = [r"^\s*defp?\s+(\w+[?!]?)", r"^\s*defmodule\s+([\w.]+)"]
+SYMBOL_PATTERNS["lua"] = [r"^\s*(?:local\s+)?function\s+([\w.:]+)"]
+_COMPILED = {lang: [re.compile(p, re.MULTILINE) for p in patterns] for lang, patterns in SYMBOL_PATTERNS.items()}
+MAX_SYMBOLS_PER_FILE = 200
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+STOPWORDS = frozenset(
+    "the and for with this that from are was were not but you your have has had can will would should "
+    "could into when then than there their them they what which while where who how why all any each "
+    "get set new use used using let var const def self return import export true false null none".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Identifier-aware terms: `parseHTTPResponse` and `parse_http_response` both give parse/http/response."""
+    terms = []
+    for word in _WORD.findall(text):
+        parts = _CAMEL.findall(word)
+        if len(parts) > 1:
+            terms.append(word.lower())
+        for part in parts:
+            part = part.lower()
+            if len(part) > 1 and part not in STOPWORDS:
+                terms.append(part)
+    return terms
+
+
+def language_for(path: str) -> Optional[str]:
+    name = path.rsplit("/", 1)[-1]
+    if name in SPECIAL_FILES:
+        return SPECIAL_FILES[name]
+    return LANGUAGES.get(os.path.splitext(name)[1].lower())
+
+
+def extract_symbols(language: str, text: str) -> List[str]:
+    seen = OrderedDict()
+    for pattern in _COMPILED.get(language, ()):
+        for match in pattern.finditer(text):
+            seen.setdefault(match.group(1), None)
+            if len(seen) >= MAX_SYMBOLS_PER_FILE:
+                return list(seen)
+    return list(seen)
+
+
+def _indexable(path: str, size: int) -> bool:
+    if size > INDEX_MAX_FILE_BYTES or path.endswith(SKIP_SUFFIXES):
+        return False
+    if any(part in TREE_IGNORE for part in path.split("/")[:-1]):
+        return False
+    return language_for(path) is not None
+
+
+def _index_path(repo_name: str) -> str:
+    return os.path.join(INDEX_DIR, repo_name.replace("/", "_"))
+
+
+def _index_file(path: str, data: bytes) -> Optional[Tuple[list, Counter]]:
+    """The file's meta entry [path, language, length, symbols] and term counts, or None if binary."""
+    if b"\0" in data[:8000]:
+        return None
+    text = data.decode("utf-8", errors="ignore")
+    language = language_for(path)
+    symbols = extract_symbols(language, text)
+
+    counts = Counter(tokenize(text))
+    for term in tokenize(path):
+        counts[term] += PATH_WEIGHT
+    for symbol in symbols:
+        for term in tokenize(symbol):
+            counts[term] += SYMBOL_WEIGHT
+    return [path, language, sum(counts.values()), symbols], counts
+
+
+def _add_files(docs: List[list], postings: Dict[str, List[Tuple[int, int]]], files: List[Tuple[str, bytes]]):
+    for path, data in files:
+        indexed = _index_file(path, data)
+        if indexed is None:
+            continue
+        doc, counts = indexed
+        doc_id = len(docs)
+        docs.append(doc)
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_id, min(tf, 0xFFFF)))
+
+
+def _write_index(repo_name: str, commit: str, docs: List[list], postings: Dict[str, List[Tuple[int, int]]], target: str):
+    terms = {}
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, "postings.bin"), "wb") as f:
+        offset = 0
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = [offset, len(entries)]
+            f.write(b"".join(_POSTING.pack(doc_id, tf) for doc_id, tf in entries))
+            offset += len(entries)
+    with open(os.path.join(target, "terms.json"), "w") as f:
+        json.dump(terms, f, separators=(",", ":"))
+    # Written last: a directory with meta.json is a complete index
+    total_length = sum(doc[2] for doc in docs)
+    with open(os.path.join(target, "meta.json"), "w") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "repo": repo_name,
+            "commit": commit,
+            "built_at": time.time(),
+            "avg_length": total_length / len(docs) if docs else 0.0,
+            "files": docs,
+        }, f, separators=(",", ":"))
+
+
+def build_index(repo_name: str, commit: str, files: List[Tuple[str, bytes]], target: str):
+    """Tokenizes files and writes meta.json, terms.json and postings.bin into target."""
+    docs: List[list] = []
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    _add_files(docs, postings, files)
+    _write_index(repo_name, commit, docs, postings, target)
+
+
+def update_index(repo_name: str, base: "CodeIndex", commit: str, stale: Set[str],
+                 files: List[Tuple[str, bytes]], target: str):
+    """
+    Writes base's index moved to commit into target: documents for the stale paths (changed
+    or deleted) are dropped, the rest keep their postings as stored, and only files is tokenized.
+    """
+    remap: Dict[int, int] = {}
+    docs: List[list] = []
+    for doc_id, doc in enumerate(base.files):
+        if doc[0] not in stale:
+            remap[doc_id] = len(docs)
+            docs.append(doc)
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for term, (offset, df) in base.terms.items():
+        entries = [(remap[doc_id], tf) for doc_id, tf in base.postings(offset, df) if doc_id in remap]
+        if entries:
+            postings[term] = entries
+    _add_files(docs, postings, files)
+    _write_index(repo_name, commit, docs, postings, target)
+
+
+class CodeIndex:
+    """A loaded index. Postings stay on disk and are read through mmap as queries need them."""
+
+    def __init__(self, path: str):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        self.stamp = os.path.getmtime(meta_path)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"index version {meta.get('version')} (expected {INDEX_VERSION})")
+        with open(os.path.join(path, "terms.json")) as f:
+            self.terms: Dict[str, List[int]] = json.load(f)
+        self.commit: str = meta["commit"]
+        self.files: List[list] = meta["files"]
+        self.avg_length: float = meta["avg_length"] or 1.0
+        # The mapping keeps its own descriptor, so the file itself needn't stay open
+        with open(os.path.join(path, "postings.bin"), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._postings = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self):
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+
+    def postings(self, offset: int, df: int):
+        """(doc id, term frequency) pairs of one term, straight from the mapped file."""
+        start = offset * _POSTING.size
+        return _POSTING.iter_unpack(self._postings[start:start + df * _POSTING.size])
+
+    def search(self, query: str, top_k: int = INDEX_TOP_K) -> List[dict]:
+        """BM25 over path, symbol and content terms. Returns the best files with matching symbols."""
+        query_terms = list(OrderedDict.fromkeys(tokenize(query)))[:64]
+        n_docs = len(self.files)
+        scores: Dict[int, float] = {}
+        for term in query_terms:
+            entry = self.terms.get(term)
+            if not entry:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in self.postings(offset, df):
+                length = self.files[doc_id][2]
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+        query_set = set(query_terms)
+        results = []
+        for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]:
+            path, language, _, symbols = self.files[doc_id]
+            matched = [s for s in symbols if query_set.intersection(tokenize(s))]
+            results.append({
+                "path": path,
+                "language": language,
+                "score": round(score, 3),
+                "symbols": (matched or symbols)[:8],
+            })
+        return results
+
+
+_loaded: "OrderedDict[str, CodeIndex]" = OrderedDict()
+_last_checked: Dict[str, float] = {}  # when each index was last confirmed current with upstream
+_refresh_scheduled: Dict[str, float] = {}
+_loaded_lock = threading.Lock()
+_LOADED_MAX = 32
+
+
+def load_index(repo_name: str) -> Optional[CodeIndex]:
+    """
+    The repository's index from disk (cached per worker), or None if it hasn't been built.
+    Blocking (a cold load parses the index and maps its postings): run it in a thread.
+    """
+    path = _index_path(repo_name)
+    try:
+        stamp = os.path.getmtime(os.path.join(path, "meta.json"))
+    except OSError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(repo_name)
+        if cached is not None and cached.stamp == stamp:
+            _loaded.move_to_end(repo_name)
+            return cached
+    try:
+        index = CodeIndex(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not load code index for {repo_name}: {e}")
+        return None
+    # Replaced and evicted indexes aren't closed here: another thread may still be searching
+    # one, and its mmap and file are released once the last reference goes
+    with _loaded_lock:
+        _loaded[repo_name] = index
+        _loaded.move_to_end(repo_name)
+        while len(_loaded) > _LOADED_MAX:
+            _loaded.popitem(last=False)
+    return index
+
+
+async def ensure_code_index(repo_name: str) -> Optional[str]:
+    """
+    Builds or refreshes the index from the upstream default branch: read from the mirror if
+    one was already cloned for forks, otherwise from a depth-1 snapshot. Returns the indexed
+    commit, or None if the repository couldn't be indexed (e.g. it's private).
+    """
+    async def run():
+        if os.path.exists(mirror_dir(repo_name)):
+            source = await ensure_mirror(repo_name, refresh=True)
+        else:
+            source = await ensure_snapshot(repo_name, refresh=True)
+        if not source:
+            return None
+        async with workspace_lock(source):
+            commit = await git_read.resolve(source, "HEAD")
+            if not commit:
+                return None
+            current = await asyncio.to_thread(load_index, repo_name)
+            if current is not None and current.commit == commit:
+                _last_checked[repo_name] = time.time()
+                return commit
+
+            # Moving an existing index forward only re-reads the files that changed in between
+            changes = None
+            if current is not None:
+                changes = await git_read.changed_paths(source, current.commit, commit)
+                if changes is not None and len(changes) > INDEX_INCREMENTAL_MAX_CHANGES:
+                    changes = None
+            wanted = {path for status, path in changes if status != "D"} if changes is not None else None
+            stale = {path for _, path in changes} if changes is not None else set()
+
+            budget = {"files": 0, "bytes": 0}
+            if current is not None and changes is not None:
+                budget["files"] = sum(1 for doc in current.files if doc[0] not in stale)
+
+            def accept(path: str, size: int) -> bool:
+                if wanted is not None and path not in wanted:
+                    return False
+                if not _indexable(path, size):
+                    return False
+                if budget["files"] >= INDEX_MAX_FILES or budget["bytes"] + size > INDEX_MAX_TOTAL_BYTES:
+                    return False
+                budget["files"] += 1
+                budget["bytes"] += size
+                return True
+
+            # Only the changed paths are looked up; a full build walks the whole tree
+            paths = sorted(wanted) if wanted is not None else None
+            files = await git_read.read_blobs(source, commit, accept, paths)
+        if files is None:
+            return None
+
+        target = _index_path(repo_name)
+        staging = f"{target}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        start = time.perf_counter()
+        if changes is not None:
+            await asyncio.to_thread(update_index, repo_name, current, commit, stale, files, staging)
+        else:
+            await asyncio.to_thread(build_index, repo_name, commit, files, staging)
+        # Swap in the new index; workers still reading the old one keep their mmap
+        retired = f"{target}.old-{os.getpid()}"
+        if os.path.exists(target):
+            os.rename(target, retired)
+        os.rename(staging, target)
+        shutil.rmtree(retired, ignore_errors=True)
+        _last_checked[repo_name] = time.time()
+        if changes is not None:
+            print(f"Updated index of {repo_name} to {commit[:7]} ({len(changes)} changed paths, "
+                  f"{len(files)} files re-read) in {time.perf_counter() - start:.1f}s")
+        else:
+            print(f"Indexed {len(files)} files of {repo_name}@{commit[:7]} in {time.perf_counter() - start:.1f}s")
+        return commit
+
+    return await single_flight(_index_path(repo_name), "index", run)
+
+
+async def index_is_fresh(repo_name: str) -> bool:
+    """True if the index exists and was checked against upstream within INDEX_REFRESH_INTERVAL."""
+    if time.time() - _last_checked.get(repo_name, 0) >= INDEX_REFRESH_INTERVAL:
+        return False
+    return await asyncio.to_thread(load_index, repo_name) is not None
+
+
+def _schedule_refresh(repo_name: str):
+    if time.time() - _last_checked.get(repo_name, 0) < INDEX_REFRESH_INTERVAL:
+        return
+    # At most one background attempt per interval, even while attempts keep failing
+    if time.time() - _refresh_scheduled.get(repo_name, 0) < INDEX_REFRESH_INTERVAL:
+        return
+    _refresh_scheduled[repo_name] = time.time()
+
+    async def refresh():
+        try:
+            await ensure_code_index(repo_name)
+        except Exception as e:
+            print(f"Code index refresh failed for {repo_name}: {e}")
+    asyncio.ensure_future(refresh())
+
+
+def _search(repo_name: str, query: str, top_k: int) -> List[dict]:
+    index = load_index(repo_name)
+    if index is None:
+        return []
+    return index.search(query, top_k)
+
+
+async def relevant_files(repo_name: str, query: str, top_k: int = INDEX_TOP_K) -> List[dict]:
+    """
+    Files most relevant to query from the repository's index. Never waits for indexing:
+    a missing or possibly stale index is (re)built in the background for later calls.
+    Loading and searching run in a thread, off the event loop.
+    """
+    _schedule_refresh(repo_name)
+    if not query.strip():
+        return []
+    return await asyncio.to_thread(_search, repo_name, query, top_k)
+
+
+def format_relevant_files(results: List[dict]) -> str:
+    lines = []
+    for result in results:
+        line = f"- {result['path']} ({result['language']})"
+        if result["symbols"]:
+            line += ": " + ", ".join(result["symbols"])
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,330 @@
+import heapq
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Directories never worth showing the model (dependencies, build output, VCS metadata)
+DEFAULT_IGNORE = frozenset({
+    ".git", "node_modules", "venv", ".venv", "__pycache__", "dist", "build", ".next",
+    ".tox", ".mypy_cache", ".pytest_cache", "target", "vendor", "coverage",
+})
+TREE_IGNORE = DEFAULT_IGNORE | frozenset(
+    name.strip() for name in os.getenv("TREE_IGNORE", "").split(",") if name.strip()
+)
+# Prompt budget for a rendered tree; the tighter of the two wins (~4 chars per token)
+TREE_MAX_CHARS = int(os.getenv("TREE_MAX_CHARS", "8000"))
+TREE_MAX_TOKENS = int(os.getenv("TREE_MAX_TOKENS", "2000"))
+TREE_MAX_DEPTH = int(os.getenv("TREE_MAX_DEPTH", "4"))
+# Entries listed per directory before the rest is summarized
+TREE_MAX_CHILDREN = int(os.getenv("TREE_MAX_CHILDREN", "40"))
+# Hard cap on filesystem entries visited by scan_directory()
+TREE_SCAN_MAX_ENTRIES = int(os.getenv("TREE_SCAN_MAX_ENTRIES", "200000"))
+# Structured trees kept in memory, keyed by commit or tree SHA
+TREE_CACHE_SIZE = 64
+
+
+class TreeNode:
+    """A directory (or file) with recursive file counts per extension, for summaries."""
+    __slots__ = ("name", "children", "files", "extensions")
+
+    def __init__(self, name: str, is_dir: bool = True):
+        self.name = name
+        self.children: Optional[Dict[str, "TreeNode"]] = {} if is_dir else None
+        self.files = 0 if is_dir else 1
+        self.extensions: Dict[str, int] = {}
+
+    @property
+    def is_dir(self) -> bool:
+        return self.children is not None
+
+    def add_path(self, parts: List[str], is_dir: bool = False):
+        node = self
+        for i, part in enumerate(parts):
+            leaf = i == len(parts) - 1
+            child = node.children.get(part)
+            if child is None or (not child.is_dir and not leaf):
+                # A path listed as a file earlier can turn out to be a directory
+                child = TreeNode(part, is_dir=is_dir or not leaf)
+                node.children[part] = child
+            node = child
+
+    def finalize(self) -> "TreeNode":
+        """Fills in the recursive file/extension counts. Call once after building."""
+        stack = [(self, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not node.is_dir:
+                continue
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+                continue
+            node.files = 0
+            node.extensions = {}
+            for child in node.children.values():
+                if child.is_dir:
+                    node.files += child.files
+                    for ext, count in child.extensions.items():
+                        node.extensions[ext] = node.extensions.get(ext, 0) + count
+                else:
+                    node.files += 1
+                    ext = _extension(child.name)
+                    node.extensions[ext] = node.extensions.get(ext, 0) + 1
+        return self
+
+    def sorted_children(self) -> List["TreeNode"]:
+        # Directories first, then files, each alphabetically
+        return sorted(self.children.values(), key=lambda c: (not c.is_dir, c.name.lower()))
+
+    def as_dict(self) -> dict:
+        """Compact JSON-friendly form: files are plain names, directories are {name: [...]}."""
+        def encode(node: "TreeNode"):
+            if not node.is_dir:
+                return node.name
+            return {node.name: [encode(child) for child in node.sorted_children()]}
+        return encode(self)
+
+    @classmethod
+    def from_dict(cls, data) -> "TreeNode":
+        def decode(item) -> "TreeNode":
+            if isinstance(item, str):
+                return cls(item, is_dir=False)
+            (name, items), = item.items()
+            node = cls(name)
+            for child in items:
+                child_node = decode(child)
+                node.children[child_node.name] = child_node
+            return node
+        return decode(data).finalize()
+
+
+def _extension(name: str) -> str:
+    _, ext = os.path.splitext(name)
+    return ext.lower() if ext else name if name.startswith(".") else "(none)"
+
+
+def summarize(node: TreeNode) -> str:
+    """e.g. "1,240 files, 87% .ts" for a collapsed directory."""
+    if not node.files:
+        return "empty"
+    label = f"{node.files:,} file" + ("s" if node.files != 1 else "")
+    if node.extensions:
+        ext, count = max(node.extensions.items(), key=lambda item: item[1])
+        if ext != "(none)" and node.files > 1:
+            label += f", {round(100 * count / node.files)}% {ext}"
+    return label
+
+
+def _line(depth: int, node: TreeNode, collapsed: bool) -> str:
+    if not node.is_dir:
+        return "  " * depth + f"- {node.name}\n"
+    if collapsed:
+        return "  " * depth + f"- {node.name}/ ({summarize(node)})\n"
+    return "  " * depth + f"- {node.name}/\n"
+
+
+def _listing(node: TreeNode, depth: int, max_children: int) -> Tuple[List[TreeNode], List[str]]:
+    """Children shown for an expanded directory, plus the overflow line if some are hidden."""
+    children = node.sorted_children()
+    if len(children) <= max_children:
+        return children, []
+    shown, hidden = children[:max_children], children[max_children:]
+    hidden_files = sum(child.files for child in hidden)
+    return shown, ["  " * depth + f"- ... {len(hidden)} more entries ({hidden_files:,} files)\n"]
+
+
+def render_tree(root: TreeNode, max_chars: Optional[int] = None, max_depth: int = TREE_MAX_DEPTH,
+                max_children: int = TREE_MAX_CHILDREN) -> str:
+    """
+    Renders the tree as indented "- name" lines within a character budget. Directories are
+    expanded breadth-first (shallowest, then largest first) while the budget allows; the rest
+    are collapsed into one summary line each.
+    """
+    if max_chars is None:
+        max_chars = min(TREE_MAX_CHARS, TREE_MAX_TOKENS * 4)
+
+    expanded = set()
+    # The root's own listing is always shown
+    shown, overflow = _listing(root, 0, max_children)
+    used = sum(len(_line(0, child, child.is_dir)) for child in shown) + sum(map(len, overflow))
+    expanded.add(id(root))
+
+    heap = []
+    for child in shown:
+        if child.is_dir and child.children:
+            heapq.heappush(heap, (1, -child.files, child.name, id(child), child))
+    while heap:
+        depth, _, _, _, node = heapq.heappop(heap)
+        if depth > max_depth:
+            continue
+        shown, overflow = _listing(node, depth, max_children)
+        # Expanding swaps the summary line for a bare header plus one line per child
+        cost = (len(_line(depth - 1, node, False)) - len(_line(depth - 1, node, True))
+                + sum(len(_line(depth, child, child.is_dir)) for child in shown) + sum(map(len, overflow)))
+        if used + cost > max_chars:
+            continue
+        used += cost
+        expanded.add(id(node))
+        for child in shown:
+            if child.is_dir and child.children:
+                heapq.heappush(heap, (depth + 1, -child.files, child.name, id(child), child))
+
+    # Depth-first emission; plain strings on the stack are overflow lines queued after a listing
+    parts: List[str] = []
+    shown, overflow = _listing(root, 0, max_children)
+    stack: list = overflow + [(child, 0) for child in reversed(shown)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+            continue
+        node, depth = item
+        is_open = node.is_dir and id(node) in expanded
+        parts.append(_line(depth, node, node.is_dir and not is_open))
+        if is_open:
+            shown, overflow = _listing(node, depth + 1, max_children)
+            stack.extend(overflow)
+            stack.extend((child, depth + 1) for child in reversed(shown))
+    return "".join(parts)
+
+
+def tree_from_paths(paths: Iterable[str], ignore: Iterable[str] = TREE_IGNORE) -> TreeNode:
+    """Structured tree from repo-relative file paths (a git tree listing)."""
+    ignore = frozenset(ignore)
+    root = TreeNode("")
+    for path in paths:
+        parts = path.strip("/").split("/")
+        if not parts[0] or any(part in ignore for part in parts):
+            continue
+        root.add_path(parts)
+    return root.finalize()
+
+
+class _GitIgnore:
+    """The common subset of .gitignore: globs, **, anchoring, dir-only and ! negation."""
+
+    def __init__(self):
+        self.rules: List[Tuple[str, "re.Pattern", bool, bool]] = []
+
+    def load(self, base: str, path: str):
+        try:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            # A leading or middle slash anchors the pattern to base; a trailing one doesn't
+            anchored = "/" in line
+            regex = _glob_to_regex(line.lstrip("/"))
+            prefix = re.escape(base + "/") if base else ""
+            pattern = f"^{prefix}{regex}$" if anchored else f"^{prefix}(?:.*/)?{regex}$"
+            self.rules.append((base, re.compile(pattern), negate, dir_only))
+
+    def ignored(self, rel_path: str, is_dir: bool) -> bool:
+        result = False
+        for base, pattern, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base and not rel_path.startswith(base + "/"):
+                continue
+            if pattern.match(rel_path):
+                result = not negate
+        return result
+
+
+def _glob_to_regex(glob: str) -> str:
+    out = []
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+            continue
+        if c == "*":
+            out.append(".*" if glob.startswith("**", i) else "[^/]*")
+            i += 2 if glob.startswith("**", i) else 1
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = glob.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                out.append(glob[i:end + 1].replace("[!", "[^"))
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def scan_directory(root_dir: str, ignore: Iterable[str] = TREE_IGNORE,
+                   max_entries: int = TREE_SCAN_MAX_ENTRIES) -> TreeNode:
+    """
+    Structured tree of a checkout, walked iteratively with os.scandir. Honors .gitignore
+    files at every level plus the ignore set, and stops after max_entries entries.
+    """
+    ignore = frozenset(ignore)
+    rules = _GitIgnore()
+    root = TreeNode("")
+    stack: List[Tuple[str, str, TreeNode]] = [(root_dir, "", root)]
+    visited = 0
+    while stack and visited < max_entries:
+        path, rel, node = stack.pop()
+        rules.load(rel, os.path.join(path, ".gitignore"))
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    visited += 1
+                    if visited > max_entries:
+                        break
+                    if entry.name in ignore:
+                        continue
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    child_rel = f"{rel}/{entry.name}" if rel else entry.name
+                    if rules.ignored(child_rel, is_dir):
+                        continue
+                    child = TreeNode(entry.name, is_dir=is_dir)
+                    node.children[entry.name] = child
+                    if is_dir:
+                        stack.append((entry.path, child_rel, child))
+        except OSError:
+            continue
+    return root.finalize()
+
+
+_cache: "OrderedDict[str, TreeNode]" = OrderedDict()
+
+
+def lookup_tree(key: Optional[str]) -> Optional[TreeNode]:
+    """Structured tree cached under key (a commit or tree SHA), if any."""
+    tree = _cache.get(key) if key else None
+    if tree is not None:
+        _cache.move_to_end(key)
+    return tree
+
+
+def remember_tree(key: Optional[str], tree: TreeNode) -> TreeNode:
+    if key:
+        _cache[key] = tree
+        while len(_cache) > TREE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return tree
@@ -0,0 +1,342 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from app.utils.process_runner import CMD_OUTPUT_CAP, run_cmd_async, run_process
+
+# pygit2 is optional: without it every query below runs through the git CLI
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+# "auto" reads through libgit2 (pygit2) when it's installed, "cli" always spawns git
+GIT_READ_BACKEND = os.getenv("GIT_READ_BACKEND", "auto").strip().lower()
+# Open repository handles kept per worker, least recently used first out
+GIT_REPO_CACHE_SIZE = int(os.getenv("GIT_REPO_CACHE_SIZE", "128"))
+
+
+class _Handle:
+    __slots__ = ("repo", "lock")
+
+    def __init__(self, repo):
+        self.repo = repo
+        # libgit2 objects are safe across threads, but a single repository handle isn't
+        self.lock = threading.Lock()
+
+
+_handles: "OrderedDict[str, _Handle]" = OrderedDict()
+_handles_lock = threading.Lock()
+_stats = {"native": 0, "cli": 0, "fallbacks": 0}
+
+
+def native_enabled() -> bool:
+    return pygit2 is not None and GIT_READ_BACKEND != "cli"
+
+
+def _const(name: str, default: int) -> int:
+    # pygit2 1.15 moved flags into enums; the module-level names aren't guaranteed everywhere
+    return getattr(pygit2, name, default)
+
+
+def _handle(path: str) -> _Handle:
+    path = os.path.abspath(path)
+    with _handles_lock:
+        handle = _handles.get(path)
+        if handle is not None:
+            _handles.move_to_end(path)
+            return handle
+    handle = _Handle(pygit2.Repository(path))
+    with _handles_lock:
+        _handles[path] = handle
+        while len(_handles) > GIT_REPO_CACHE_SIZE:
+            _handles.popitem(last=False)
+    return handle
+
+
+def drop_repo(path: str):
+    """Forgets the cached handle, e.g. after the workspace was deleted."""
+    with _handles_lock:
+        _handles.pop(os.path.abspath(path), None)
+
+
+def _run_native(path: str, fn: Callable):
+    handle = _handle(path)
+    with handle.lock:
+        return fn(handle.repo)
+
+
+async def _read(path: str, native: Callable, cli: Callable):
+    """
+    Runs native(repo) on a worker thread against the cached handle; falls back to the
+    CLI coroutine if pygit2 is missing or libgit2 can't handle the repository.
+    Unknown revisions yield None.
+    """
+    if native_enabled():
+        try:
+            result = await asyncio.to_thread(_run_native, path, native)
+            _stats["native"] += 1
+            return result
+        except (KeyError, ValueError):
+            # Unknown revision or no merge base: the CLI would fail the same way
+            _stats["native"] += 1
+            return None
+        except (pygit2.GitError, OSError) as e:
+            _stats["fallbacks"] += 1
+            drop_repo(path)
+            print(f"libgit2 read failed in {path}, using git CLI: {e}")
+    _stats["cli"] += 1
+    return await cli()
+
+
+def git_read_stats() -> dict:
+    return {
+        "backend": "pygit2" if native_enabled() else "cli",
+        "cached_repos": len(_handles),
+        **_stats,
+    }
+
+
+def _commit(repo, rev: str):
+    return repo.revparse_single(rev).peel(pygit2.Commit)
+
+
+def _three_dot_diff(repo, base: str, head: str):
+    # `git diff base...head`: changes on head since it forked from base
+    head_commit = _commit(repo, head)
+    merge_base = repo.merge_base(_commit(repo, base).id, head_commit.id)
+    if merge_base is None:
+        raise ValueError(f"No merge base between {base} and {head}")
+    diff = repo.diff(repo[merge_base], head_commit)
+    diff.find_similar()  # report renames like the CLI does
+    return diff
+
+
+async def resolve(repo_dir: str, rev: str = "HEAD") -> Optional[str]:
+    """Full commit SHA of rev, or None."""
+    def native(repo):
+        return str(_commit(repo, rev).id)
+
+    async def cli():
+        code, out, _ = await run_cmd_async(["git", "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}"], cwd=repo_dir)
+        return out.strip() if code == 0 and out.strip() else None
+
+    return await _read(repo_dir, native, cli)
+
+
+async def remote_head(repo_dir: str, remote: str = "origin") -> Optional[str]:
+    """Short name of the remote's default branch (refs/remotes/<remote>/HEAD), or None."""
+    ref_name = f"refs/remotes/{remote}/HEAD"
+
+    def native(repo):
+        ref = repo.references.get(ref_name)
+        if ref is None or not isinstance(ref.target, str):
+            return None
+        return ref.target.split('/')[-1]
+
+    async def cli():
+        code, out, _ = await run_cmd_async(["git", "symbolic-ref", ref_name], cwd=repo_dir)
+        return out.strip().split('/')[-1] if code == 0 and out.strip() else None
+
+    return await _read(repo_dir, native, cli)
+
+
+async def ref_exists(repo_dir: str, ref_name: str) -> bool:
+    """True if the fully qualified ref (e.g. refs/remotes/origin/main) exists."""
+    def native(repo):
+        return repo.references.get(ref_name) is not None
+
+    async def cli():
+        code, _, _ = await run_cmd_async(["git", "rev-parse", "--verify", "--quiet", ref_name], cwd=repo_dir)
+        return code == 0
+
+    return await _read(repo_dir, native, cli)
+
+
+async def log_oneline(repo_dir: str, exclude: str, include: str) -> Optional[List[str]]:
+    """`git log --oneline exclude..include`, newest first. None if either revision is unknown."""
+    def native(repo):
+        walker = repo.walk(_commit(repo, include).id, _const("GIT_SORT_TIME", 2))
+        walker.hide(_commit(repo, exclude).id)
+        return [f"{commit.short_id} {commit.message.splitlines()[0] if commit.message else ''}" for commit in walker]
+
+    async def cli():
+        code, out, _ = await run_cmd_async(["git", "log", f"{exclude}..{include}", "--oneline"], cwd=repo_dir)
+        if code != 0:
+            return None
+        return [line.strip() for line in out.splitlines() if line.strip()]
+
+    return await _read(repo_dir, native, cli)
+
+
+async def diff_stat(repo_dir: str, base: str, head: str) -> Optional[str]:
+    """`git diff --stat base...head`. None if the diff can't be computed."""
+    def native(repo):
+        diff = _three_dot_diff(repo, base, head)
+        return diff.stats.format(_const("GIT_DIFF_STATS_FULL", 1), 80)
+
+    async def cli():
+        code, out, _ = await run_cmd_async(["git", "diff", "--stat", f"{base}...{head}"], cwd=repo_dir)
+        return out if code == 0 else None
+
+    return await _read(repo_dir, native, cli)
+
+
+async def diff_patch(repo_dir: str, base: str, head: str, max_chars: Optional[int] = None) -> Optional[str]:
+    """
+    `git diff base...head`. With max_chars, stops rendering file patches once that much
+    text is collected, so a huge diff is never materialized. None if it can't be computed.
+    """
+    def native(repo):
+        parts = []
+        size = 0
+        for patch in _three_dot_diff(repo, base, head):
+            text = patch.text or ""
+            parts.append(text)
+            size += len(text)
+            if max_chars is not None and size > max_chars:
+                break
+        return "".join(parts)
+
+    async def cli():
+        # The runner keeps head and tail halves, so ask for twice what callers will read
+        cap = max_chars * 2 + 1024 if max_chars else CMD_OUTPUT_CAP
+        code, out, _ = await run_cmd_async(["git", "diff", f"{base}...{head}"], cwd=repo_dir, output_cap=cap)
+        return out if code == 0 else None
+
+    return await _read(repo_dir, native, cli)
+
+
+async def changed_paths(repo_dir: str, old: str, new: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    `git diff --name-status --no-renames old new` as (status, path) pairs, status being
+    A, M or D (a rename shows up as D plus A). None if either commit is unknown.
+    """
+    def native(repo):
+        diff = repo.diff(_commit(repo, old), _commit(repo, new))
+        changes = []
+        for delta in diff.deltas:
+            if delta.status_char() == "A":
+                changes.append(("A", delta.new_file.path))
+            elif delta.status_char() == "D":
+                changes.append(("D", delta.old_file.path))
+            else:
+                changes.append(("M", delta.new_file.path))
+        return changes
+
+    async def cli():
+        code, out, _ = await run_cmd_async(
+            ["git", "diff", "--name-status", "--no-renames", "-z", old, new], cwd=repo_dir, output_cap=1 << 26
+        )
+        if code != 0:
+            return None
+        fields = out.split("\0")
+        changes = []
+        for i in range(0, len(fields) - 1, 2):
+            status = fields[i][:1]
+            changes.append((status if status in ("A", "D") else "M", fields[i + 1]))
+        return changes
+
+    return await _read(repo_dir, native, cli)
+
+
+async def tree_paths(repo_dir: str, rev: str = "HEAD") -> Optional[List[str]]:
+    """`git ls-tree -r --name-only rev`: every file path, without reading any blob."""
+    def native(repo):
+        paths = []
+        stack = [("", _commit(repo, rev).tree)]
+        while stack:
+            prefix, tree = stack.pop()
+            for entry in tree:
+                path = prefix + entry.name
+                if entry.type_str == "tree":
+                    stack.append((path + "/", repo[entry.id]))
+                else:
+                    paths.append(path)  # blobs, plus submodule commits like ls-tree lists them
+        return sorted(paths)
+
+    async def cli():
+        code, out, _ = await run_cmd_async(["git", "ls-tree", "-r", "--name-only", rev], cwd=repo_dir)
+        return out.splitlines() if code == 0 else None
+
+    return await _read(repo_dir, native, cli)
+
+
+def _blob_size(repo, oid) -> int:
+    # Header only: the size without inflating the blob (older pygit2 has no read_header)
+    read_header = getattr(repo.odb, "read_header", None)
+    return read_header(oid)[1] if read_header else repo[oid].size
+
+
+async def read_blobs(repo_dir: str, rev: str, accept: Callable[[str, int], bool],
+                     paths: Optional[Sequence[str]] = None) -> Optional[List[Tuple[str, bytes]]]:
+    """
+    Contents of the files at rev for which accept(path, size) is true, in tree order. With
+    paths, only those files are looked at instead of the whole tree (missing ones are
+    skipped). A blob is only read once accept() took it. Works on bare repositories.
+    None if rev can't be read.
+    """
+    def native(repo):
+        root = _commit(repo, rev).tree
+        entries = []
+        if paths is not None:
+            for path in paths:
+                try:
+                    entries.append((path, root[path]))
+                except KeyError:
+                    continue
+        else:
+            stack = [("", root)]
+            while stack:
+                prefix, tree = stack.pop()
+                for entry in tree:
+                    path = prefix + entry.name
+                    if entry.type_str == "tree":
+                        stack.append((path + "/", repo[entry.id]))
+                    else:
+                        entries.append((path, entry))
+        files = []
+        for path, entry in entries:
+            if entry.type_str == "blob" and accept(path, _blob_size(repo, entry.id)):
+                files.append((path, repo[entry.id].data))
+        return files
+
+    async def cli():
+        listing = []
+        # Pathspecs go on the command line, so long lists are listed in chunks
+        chunks = [None] if paths is None else [list(paths[i:i + 500]) for i in range(0, len(paths), 500)]
+        for chunk in chunks:
+            argv = ["git", "ls-tree", "-r", "-l", "-z", rev] + (["--", *chunk] if chunk else [])
+            code, out, _ = await run_cmd_async(argv, cwd=repo_dir, output_cap=1 << 30)
+            if code != 0:
+                return None
+            listing.append(out)
+        wanted = []
+        for record in "".join(listing).split("\0"):
+            meta, _, path = record.partition("\t")
+            fields = meta.split()
+            if len(fields) == 4 and fields[1] == "blob" and fields[3].isdigit() and accept(path, int(fields[3])):
+                wanted.append((path, fields[2], int(fields[3])))
+
+        files = []
+        # One `cat-file --batch` per chunk instead of a process per file
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i:i + 500]
+            result = await run_process(
+                ["git", "cat-file", "--batch"], cwd=repo_dir, text=False,
+                input="".join(f"{oid}\n" for _, oid, _ in chunk).encode(),
+                output_cap=sum(size + 128 for _, _, size in chunk) * 2,
+            )
+            if result.returncode != 0 or result.truncated:
+                return None
+            data, pos = result.stdout, 0
+            for path, oid, size in chunk:
+                header_end = data.index(b"\n", pos)
+                start = header_end + 1
+                files.append((path, data[start:start + size]))
+                pos = start + size + 1
+        return files
+
+    return await _read(repo_dir, native, cli)
@@ -0,0 +1,234 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import httpx
+
+# In-memory tier bounds. Bodies are the bulk of the size, so both an entry count and
+# a byte budget are enforced.
+GITHUB_CACHE_MAX_ENTRIES = int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", "2048"))
+GITHUB_CACHE_MAX_BYTES = int(os.getenv("GITHUB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Optional on-disk tier; leave unset to keep the cache memory-only. Only responses to
+# unauthenticated requests are written there: PAT-scoped bodies stay in memory.
+GITHUB_CACHE_DIR = os.getenv("GITHUB_CACHE_DIR", "")
+# Disk budget for that tier; least recently used files are removed past it
+GITHUB_CACHE_DISK_MAX_BYTES = int(os.getenv("GITHUB_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Headers that describe the wire encoding of the original response, not the cached body
+_HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, headers: List[Tuple[str, str]], etag: Optional[str], last_modified: Optional[str]):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "body": base64.b64encode(self.body).decode(),
+            "headers": self.headers,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        })
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CachedResponse":
+        data = json.loads(raw)
+        return cls(
+            body=base64.b64decode(data["body"]),
+            headers=[tuple(h) for h in data["headers"]],
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+        )
+
+
+class GitHubResponseCache:
+    """Bounded LRU of GitHub GET responses with an optional, also bounded, on-disk tier."""
+
+    def __init__(self, max_entries: int = GITHUB_CACHE_MAX_ENTRIES, max_bytes: int = GITHUB_CACHE_MAX_BYTES,
+                 cache_dir: str = GITHUB_CACHE_DIR, disk_max_bytes: int = GITHUB_CACHE_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        # This worker's running estimate of the disk tier's size; None until first measured
+        self._disk_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(request: httpx.Request) -> str:
+        # The Authorization header is part of the key so one user's private data is
+        # never served to another token, even for the same URL.
+        scope = request.headers.get("Authorization", "")
+        accept = request.headers.get("Accept", "")
+        raw = f"{scope}\n{accept}\n{request.url}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[CachedResponse]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = CachedResponse.from_json(f.read())
+        except Exception:
+            return None
+        try:
+            # The mtime is the file's last use, for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def _disk_files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for f in it:
+                    if f.name.endswith(".json"):
+                        try:
+                            stat = f.stat()
+                        except OSError:
+                            continue
+                        files.append((stat.st_mtime, stat.st_size, f.path))
+        except OSError:
+            pass
+        return files
+
+    def _evict_disk(self):
+        """Removes least recently used files until the tier fits disk_max_bytes."""
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._disk_bytes = total
+
+    def _write_disk(self, key: str, entry: CachedResponse):
+        data = entry.to_json()
+        if self.disk_max_bytes and len(data) > self.disk_max_bytes:
+            return
+        tmp_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            print(f"GitHub cache disk write failed: {e}")
+            return
+        if not self.disk_max_bytes:
+            return
+        # Other workers write to the same directory, so a budget overrun is confirmed
+        # with a fresh scan before anything is evicted
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+        else:
+            self._disk_bytes += len(data)
+        if self._disk_bytes > self.disk_max_bytes:
+            self._evict_disk()
+
+    def _remember(self, key: str, entry: CachedResponse):
+        old = self._entries.pop(key, None)
+        if old:
+            self._bytes -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    async def get(self, key: str, persistent: bool = True) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+            return entry
+        if self.cache_dir and persistent:
+            entry = await asyncio.to_thread(self._read_disk, key)
+            if entry:
+                self._remember(key, entry)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse, persistent: bool = True):
+        """Caches entry in memory, and on disk too if persistent (never for authenticated responses)."""
+        self._remember(key, entry)
+        if self.cache_dir and persistent:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class ConditionalCacheTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the real transport and revalidates cached GET responses with
+    If-None-Match / If-Modified-Since. A 304 from GitHub is replayed from the
+    cache and does not count against the rate limit.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: GitHubResponseCache):
+        self._transport = transport
+        self.cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        key = self.cache.key_for(request)
+        # Responses fetched with a token may be private: they're never written to disk
+        persistent = "Authorization" not in request.headers
+        entry = await self.cache.get(key, persistent)
+        if entry:
+            if entry.etag:
+                request.headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                request.headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code == 304 and entry:
+            await response.aclose()
+            self.cache.hits += 1
+            return httpx.Response(200, headers=entry.headers, content=entry.body, request=request, extensions=response.extensions)
+
+        self.cache.misses += 1
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code != 200 or not (etag or last_modified):
+            return response
+
+        body = await response.aread()
+        await response.aclose()
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in _HOP_HEADERS]
+        await self.cache.set(key, CachedResponse(body, headers, etag, last_modified), persistent)
+        return httpx.Response(200, headers=headers, content=body, request=request, extensions=response.extensions)
+
+    async def aclose(self):
+        await self._transport.aclose()
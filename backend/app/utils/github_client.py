@@ -0,0 +1,160 @@
+import asyncio
+import os
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.utils.github_cache import ConditionalCacheTransport, GitHubResponseCache
+
+GITHUB_API_URL = "https://api.github.com"
+
+# Pool sizing for the shared client. Every request goes to api.github.com, so these
+# limits are effectively per-host limits.
+GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "200"))
+GITHUB_MAX_KEEPALIVE = int(os.getenv("GITHUB_MAX_KEEPALIVE", "50"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "20"))
+# Default item budget for list endpoints served to the UI (0 = walk every page)
+GITHUB_LIST_MAX_ITEMS = int(os.getenv("GITHUB_LIST_MAX_ITEMS", "300"))
+# Server token for calls made on no particular user's behalf (e.g. repo analysis)
+GITHUB_APP_TOKEN = os.getenv("GITHUB_TOKEN")
+# Speculative next-page requests paginate() may have in flight at once, across all callers;
+# past it, pages are fetched only once the consumer asks for them
+GITHUB_PREFETCH_MAX = int(os.getenv("GITHUB_PREFETCH_MAX", "16"))
+
+_client: Optional[httpx.AsyncClient] = None
+_prefetches_in_flight = 0
+# Shared by every client instance so a restarted client keeps its validators
+_response_cache = GitHubResponseCache()
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=GITHUB_MAX_CONNECTIONS,
+        max_keepalive_connections=GITHUB_MAX_KEEPALIVE,
+        keepalive_expiry=30.0,
+    )
+    timeout = httpx.Timeout(GITHUB_TIMEOUT, connect=5.0)
+    # Pool settings live on the inner transport; the cache layer sits on top of it
+    transport = ConditionalCacheTransport(
+        httpx.AsyncHTTPTransport(http2=_http2_available(), limits=limits),
+        _response_cache,
+    )
+    return httpx.AsyncClient(
+        base_url=GITHUB_API_URL,
+        transport=transport,
+        timeout=timeout,
+        headers={"Accept": "application/vnd.github.v3+json"},
+    )
+
+
+async def start_github_client():
+    """Creates the shared GitHub client. Called from the FastAPI lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+
+async def close_github_client():
+    """Closes the shared GitHub client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_github_client() -> httpx.AsyncClient:
+    """Returns the application-scoped GitHub client, creating it lazily if the lifespan hasn't run."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def github_cache_stats() -> dict:
+    return _response_cache.stats()
+
+
+def github_auth_headers(pat: Optional[str]) -> dict:
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if pat:
+        headers["Authorization"] = f"token {pat}"
+    return headers
+
+
+async def paginate(url: str, headers: Optional[dict] = None, params: Optional[dict] = None,
+                   max_items: Optional[int] = None, prefetch: bool = True) -> AsyncIterator[dict]:
+    """
+    Yields items from a GitHub list endpoint one at a time, following `Link: rel="next"`
+    until the last page or until `max_items` items have been yielded.
+    With prefetch on, the next page is requested while the current page is being consumed,
+    as long as fewer than GITHUB_PREFETCH_MAX prefetches are in flight process-wide.
+    Raises httpx.HTTPStatusError if any page fails.
+    """
+    client = get_github_client()
+
+    def fetch(page_url: str, page_params: Optional[dict] = None, speculative: bool = False) -> asyncio.Future:
+        global _prefetches_in_flight
+        future = asyncio.ensure_future(client.get(page_url, headers=headers, params=page_params))
+        if speculative:
+            _prefetches_in_flight += 1
+
+        def done(f: asyncio.Future):
+            global _prefetches_in_flight
+            if speculative:
+                _prefetches_in_flight -= 1
+            # A page nobody awaits (the consumer stopped early) must not log "never retrieved"
+            if not f.cancelled():
+                f.exception()
+
+        future.add_done_callback(done)
+        return future
+
+    pending = fetch(url, params)
+    yielded = 0
+    try:
+        while pending is not None:
+            response = await pending
+            pending = None
+            response.raise_for_status()
+
+            items = response.json()
+            # Search endpoints wrap their results
+            if isinstance(items, dict):
+                items = items.get("items", [])
+
+            next_url = response.links.get("next", {}).get("url")
+            wants_more = max_items is None or yielded + len(items) < max_items
+            prefetched = next_url and wants_more and prefetch and _prefetches_in_flight < GITHUB_PREFETCH_MAX
+            if prefetched:
+                pending = fetch(next_url, speculative=True)
+
+            for item in items:
+                if max_items is not None and yielded >= max_items:
+                    return
+                yield item
+                yielded += 1
+
+            if next_url and wants_more and not prefetched:
+                pending = fetch(next_url)
+    finally:
+        # Consumer stopped early (budget hit, error, or break): drop the in-flight page, or
+        # retrieve its outcome if it already finished so a failure isn't reported as unhandled
+        if pending is not None:
+            if not pending.done():
+                pending.cancel()
+            elif not pending.cancelled():
+                pending.exception()
+
+
+def list_budget(value: int) -> Optional[int]:
+    """Maps a configured item budget to paginate()'s max_items, where 0 means unlimited."""
+    return value if value > 0 else None
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import signal
+import subprocess
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+# Wall-clock limit for a command when the caller doesn't pass one (a hung clone must still return)
+PROCESS_TIMEOUT = float(os.getenv("PROCESS_TIMEOUT", "600"))
+# Bytes kept per stream; past it only the first and last halves are retained
+CMD_OUTPUT_CAP = int(os.getenv("EVAL_OUTPUT_CAP", str(256 * 1024)))
+
+
+class _Capture:
+    """Keeps the head and tail of a stream, so memory stays bounded however much it prints."""
+
+    def __init__(self, cap: int):
+        self.head_cap = cap // 2
+        self.tail_cap = cap - self.head_cap
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.head_cap - len(self.head)
+        if room > 0:
+            self.head.extend(chunk[:room])
+            chunk = chunk[room:]
+        if chunk:
+            self.tail.extend(chunk)
+            if len(self.tail) > self.tail_cap:
+                del self.tail[:len(self.tail) - self.tail_cap]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def data(self) -> bytes:
+        return bytes(self.head) + bytes(self.tail)
+
+    def text(self) -> str:
+        if not self.truncated:
+            return self.data().decode(errors="ignore")
+        dropped = self.total - len(self.head) - len(self.tail)
+        return (
+            bytes(self.head).decode(errors="ignore")
+            + f"\n... [{dropped} bytes truncated] ...\n"
+            + bytes(self.tail).decode(errors="ignore")
+        )
+
+
+async def _feed(stream, data: bytes):
+    try:
+        stream.write(data)
+        await stream.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # the process exited without reading everything
+    finally:
+        stream.close()
+
+
+async def _drain(stream, capture: _Capture):
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return
+        capture.feed(chunk)
+
+
+class ProcessResult:
+    __slots__ = ("argv", "returncode", "stdout", "stderr", "duration_ms", "timed_out", "truncated")
+
+    def __init__(self, argv: Sequence[str], returncode: int, stdout, stderr: str,
+                 duration_ms: float, timed_out: bool = False, truncated: bool = False):
+        self.argv = list(argv)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration_ms = duration_ms
+        self.timed_out = timed_out
+        self.truncated = truncated
+
+
+class _CommandStats:
+    __slots__ = ("calls", "failures", "timeouts", "duration_ms", "max_duration_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.duration_ms = 0.0
+        self.max_duration_ms = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.duration_ms / self.calls, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_duration_ms, 1),
+            "total_ms": round(self.duration_ms, 1),
+        }
+
+
+_stats: Dict[str, _CommandStats] = {}
+
+
+def _command_name(argv: Sequence[str]) -> str:
+    # "git fetch", "npm test", "pytest": the program plus its subcommand, never paths or URLs
+    name = os.path.basename(argv[0])
+    if len(argv) > 1 and name in ("git", "npm") and not argv[1].startswith("-"):
+        name += " " + argv[1]
+    return name
+
+
+def _record(result: ProcessResult):
+    stats = _stats.setdefault(_command_name(result.argv), _CommandStats())
+    stats.calls += 1
+    stats.duration_ms += result.duration_ms
+    stats.max_duration_ms = max(stats.max_duration_ms, result.duration_ms)
+    if result.timed_out:
+        stats.timeouts += 1
+    elif result.returncode != 0:
+        stats.failures += 1
+
+
+def process_stats() -> dict:
+    return {name: stats.as_dict() for name, stats in sorted(_stats.items())}
+
+
+async def run_process(argv: Sequence[str], cwd: Optional[str] = None, timeout: Optional[float] = PROCESS_TIMEOUT,
+                      output_cap: int = CMD_OUTPUT_CAP, env: Optional[Dict[str, str]] = None,
+                      input: Optional[bytes] = None, text: bool = True) -> ProcessResult:
+    """
+    Runs argv directly (no shell), streaming stdout/stderr into bounded head+tail buffers.
+    On timeout or cancellation the whole process group is killed. `input` is written to
+    stdin; with text=False, stdout is returned as bytes (only meaningful if not truncated).
+    """
+    start = time.perf_counter()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,  # own process group, so a timeout can kill the whole tree
+        )
+    except OSError as e:
+        # e.g. the program isn't installed
+        result = ProcessResult(argv, 127, "", str(e), (time.perf_counter() - start) * 1000)
+        _record(result)
+        return result
+
+    out, err = _Capture(output_cap), _Capture(output_cap)
+    timed_out = False
+    try:
+        tasks = [_drain(process.stdout, out), _drain(process.stderr, err), process.wait()]
+        if input is not None:
+            tasks.append(_feed(process.stdin, input))
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        timed_out = True
+
+    stderr = err.text()
+    if timed_out:
+        stderr += f"\nCommand timed out after {timeout:g}s: {_command_name(argv)}"
+    result = ProcessResult(
+        argv,
+        -1 if timed_out else process.returncode,
+        out.text() if text else out.data(),
+        stderr,
+        (time.perf_counter() - start) * 1000,
+        timed_out=timed_out,
+        truncated=out.truncated or err.truncated,
+    )
+    _record(result)
+    return result
+
+
+async def run_cmd_async(argv: Sequence[str], cwd: Optional[str] = None, timeout: Optional[float] = PROCESS_TIMEOUT,
+                        output_cap: int = CMD_OUTPUT_CAP) -> Tuple[int, str, str]:
+    """run_process() returning (returncode, stdout, stderr)."""
+    result = await run_process(argv, cwd=cwd, timeout=timeout, output_cap=output_cap)
+    return result.returncode, result.stdout, result.stderr
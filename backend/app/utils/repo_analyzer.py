@@ -1,46 +1,53 @@
 import os
 import json
 import asyncio
+import hashlib
+import time
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 import models
-import subprocess
+from database import SessionLocal
+from app.services.github_login import github_credentials
+from app.utils import file_tree, git_read
+from app.utils.github_client import GITHUB_APP_TOKEN, get_github_client, github_auth_headers
+from app.utils.workspaces import (
+    ensure_analysis_checkout,
+    ensure_fork_clone,
+    ensure_issue_worktree,
+    fetch_remote,
+    fork_dir,
+    issue_worktree_dir,
+    run_cmd_async,
+    single_flight,
+    workspace_lock,
+)
+from app.services.llm_provider import LLMRequest, get_llm_provider, user_message
 
-WORKSPACES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "workspaces")
+# "api" builds the analysis prompt from the GitHub tree/readme endpoints; "git" always
+# uses a shallow sparse clone (also the fallback when the API call fails)
+ANALYSIS_SOURCE = os.getenv("ANALYSIS_SOURCE", "api").strip().lower()
+# How often a stored analysis is compared with the upstream default branch head
+ANALYSIS_STALE_CHECK_INTERVAL = float(os.getenv("ANALYSIS_STALE_CHECK_INTERVAL", "900"))
+# Up to this many added/removed paths, Nova revises the stored analysis instead of starting over
+ANALYSIS_INCREMENTAL_MAX_PATHS = int(os.getenv("ANALYSIS_INCREMENTAL_MAX_PATHS", "150"))
+# Limit for running a fork's test suite during evaluation
+TEST_TIMEOUT = float(os.getenv("EVAL_TEST_TIMEOUT", "300"))
 
-async def run_cmd_async(cmd: str, cwd: str = None):
-    process = await asyncio.create_subprocess_shell(
-        cmd,
-        cwd=cwd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
-    return process.returncode, stdout.decode(errors="ignore"), stderr.decode(errors="ignore")
 
-def generate_tree(dir_path: str, max_depth: int = 3, current_depth: int = 0) -> str:
-    """Generate a simple file tree string."""
-    if current_depth > max_depth:
-        return "  " * current_depth + "...\n"
-    
-    ignore_dirs = {".git", "node_modules", "venv", ".venv", "__pycache__", "dist", "build", ".next"}
-    
-    tree_str = ""
-    try:
-        entries = sorted(os.listdir(dir_path))
-    except Exception:
-        return tree_str
-        
-    for entry in entries:
-        if entry in ignore_dirs:
-            continue
-        
-        full_path = os.path.join(dir_path, entry)
-        tree_str += "  " * current_depth + f"- {entry}\n"
-        
-        if os.path.isdir(full_path):
-            tree_str += generate_tree(full_path, max_depth, current_depth + 1)
-            
-    return tree_str
+class EvaluationFailed(Exception):
+    """The issue branch couldn't be evaluated (clone, worktree, diff or summary failed)."""
+
+
+class PrivateRepository(Exception):
+    """The repository is private: its layout must not go into the analysis every user shares."""
+
+def generate_tree(dir_path: str) -> str:
+    """File tree of a checkout, honoring .gitignore and bounded to the prompt budget."""
+    return file_tree.render_tree(file_tree.scan_directory(dir_path))
+
+def generate_tree_from_paths(paths: List[str]) -> str:
+    """Same output as generate_tree(), built from repo-relative paths (e.g. a git tree listing)."""
+    return file_tree.render_tree(file_tree.tree_from_paths(paths))
 
 def get_readme_content(repo_dir: str) -> str:
     for filename in ["README.md", "readme.md", "README.txt", "README"]:
@@ -53,61 +60,47 @@ def get_readme_content(repo_dir: str) -> str:
                 pass
     return "No README content found."
 
-async def _invoke_nova_for_analysis(client, repo_name: str, tree: str, readme: str) -> str:
+def _analysis_system_prompt(repo_name: str) -> str:
+    return (
+        f"You are a Senior Software Architect analyzing the repository '{repo_name}'.\n"
+        f"Based on the repository's file structure and README below, formulate a detailed but concise project context.\n"
+        f"Include:\n1. Tech stack and frameworks.\n2. Key directories and their assumed roles based on standard architecture.\n"
+        f"3. Any important entry points or configuration files.\n"
+        f"This summary will be injected into future AI chats to help a user contribute to this exact repository.\n"
+        f"Output purely the analysis, no conversational filler."
+    )
+
+async def _complete_analysis(repo_name: str, user_msg: str) -> str:
+    """One repo_analysis completion. Raises RuntimeError if Nova is unavailable or returns nothing."""
+    provider = get_llm_provider()
+    if not provider.ready():
+        raise RuntimeError("Failed to initialize Bedrock client.")
+    response = await provider.complete(LLMRequest(
+        system=_analysis_system_prompt(repo_name),
+        messages=user_message(user_msg),
+        max_tokens=1500,
+        temperature=0.3,
+        label="repo_analysis",
+    ))
+    if not response.text:
+        raise RuntimeError("Failed to generate context.")
+    return response.text
+
+def _layout_message(tree: str, readme: str) -> str:
+    return f"FILE TREE:\n{tree}\n\nREADME EXCERPT:\n{readme}\n\nPlease provide the structural analysis."
+
+async def _invoke_nova_for_analysis(repo_name: str, tree: str, readme: str) -> str:
     """Uses Bedrock Nova to generate a deep technical context string of the repo."""
     try:
-        import boto3
-        
-        system_prompt = (
-            f"You are a Senior Software Architect analyzing the repository '{repo_name}'.\n"
-            f"Based on the repository's file structure and README below, formulate a detailed but concise project context.\n"
-            f"Include:\n1. Tech stack and frameworks.\n2. Key directories and their assumed roles based on standard architecture.\n"
-            f"3. Any important entry points or configuration files.\n"
-            f"This summary will be injected into future AI chats to help a user contribute to this exact repository.\n"
-            f"Output purely the analysis, no conversational filler."
-        )
-        
-        user_msg = f"FILE TREE:\n{tree}\n\nREADME EXCERPT:\n{readme}\n\nPlease provide the structural analysis."
-        
-        endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        # Route to Ollama if locally mocked
-        if endpoint_url and ("localhost" in endpoint_url or "127.0.0.1" in endpoint_url):
-            import requests as req
-            ollama_url = "http://127.0.0.1:11434/api/chat"
-            payload = {
-                "model": "amazon.nova-2-lite:v1.0",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_msg}
-                ],
-                "stream": False,
-            }
-            res = req.post(ollama_url, json=payload)
-            res.raise_for_status()
-            return res.json().get('message', {}).get('content', "Failed to generate context.")
-        else:
-            if not client:
-                 return "Failed to initialize Bedrock client."
-            body = {
-                "system": [{"text": system_prompt}],
-                "messages": [{"role": "user", "content": [{"text": user_msg}]}],
-                "inferenceConfig": {"maxTokens": 1500, "temperature": 0.3}
-            }
-            response = client.invoke_model(
-                modelId=os.getenv("NOVA_MODEL_ID", "amazon.nova-lite-v1:0"),
-                body=json.dumps(body),
-                accept="application/json",
-                contentType="application/json"
-            )
-            response_body = json.loads(response.get('body').read())
-            return response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', "")
-            
+        return await _complete_analysis(repo_name, _layout_message(tree, readme))
+    except RuntimeError as e:
+        return str(e)
     except Exception as e:
         print(f"Error invoking Nova for static analysis: {e}")
         return "Could not generate deep structural analysis at this time."
 
-async def _invoke_nova_for_diff_summary(client, diff_str: str) -> str:
-    """Uses Bedrock Nova to generate a short 1-2 sentence summary of a git diff."""
+async def _invoke_nova_for_diff_summary(diff_str: str) -> str:
+    """Uses Bedrock Nova to generate a short 1-2 sentence summary of a git diff. Raises EvaluationFailed."""
     if not diff_str.strip():
         return "No significant code changes found."
         
@@ -118,142 +111,458 @@ async def _invoke_nova_for_diff_summary(client, diff_str: str) -> str:
             "Focus purely on what the code changes actually accomplish without conversational filler."
         )
         user_msg = f"GIT DIFF:\n```diff\n{diff_str}\n```\n\nPlease summarize these code changes."
-        
-        endpoint_url = os.getenv("AWS_ENDPOINT_URL")
-        if endpoint_url and ("localhost" in endpoint_url or "127.0.0.1" in endpoint_url):
-            import requests as req
-            ollama_url = "http://127.0.0.1:11434/api/chat"
-            payload = {
-                "model": "amazon.nova-2-lite:v1.0",
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_msg}
-                ],
-                "stream": False,
-            }
-            res = req.post(ollama_url, json=payload)
-            res.raise_for_status()
-            return res.json().get('message', {}).get('content', "Failed to generate diff summary.")
-        else:
-            if not client:
-                 return "Failed to initialize Bedrock client."
-            body = {
-                "system": [{"text": system_prompt}],
-                "messages": [{"role": "user", "content": [{"text": user_msg}]}],
-                "inferenceConfig": {"maxTokens": 300, "temperature": 0.2}
-            }
-            response = client.invoke_model(
-                modelId=os.getenv("NOVA_MODEL_ID", "amazon.nova-lite-v1:0"),
-                body=json.dumps(body),
-                accept="application/json",
-                contentType="application/json"
-            )
-            response_body = json.loads(response.get('body').read())
-            return response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', "").strip()
-            
+
+        provider = get_llm_provider()
+        if not provider.ready():
+            raise EvaluationFailed("Failed to initialize Bedrock client.")
+        response = await provider.complete(LLMRequest(
+            system=system_prompt,
+            messages=user_message(user_msg),
+            max_tokens=300,
+            temperature=0.2,
+            label="diff_summary",
+        ))
+        if not response.text.strip():
+            raise EvaluationFailed("Failed to generate diff summary.")
+        return response.text.strip()
+
+    except EvaluationFailed:
+        raise
     except Exception as e:
         print(f"Error invoking Nova for diff summary: {e}")
-        return "Could not summarize the recent commit diff."
+        raise EvaluationFailed(f"Could not summarize the recent commit diff: {e}") from e
 
-async def analyze_and_cache_repo(repo_name: str, db: Session, bedrock_client) -> str:
-    """Returns the cached analysis, or generates and stores one."""
-    cached = db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == repo_name).first()
-    if cached:
-        return cached.system_prompt_context
+def _api_headers() -> dict:
+    # Never a user's PAT: the analysis is shared by everyone who asks about the repository.
+    # The server token keeps these calls off GitHub's 60/hour unauthenticated limit
+    return github_auth_headers(GITHUB_APP_TOKEN)
 
-    if not os.path.exists(WORKSPACES_DIR):
-        os.makedirs(WORKSPACES_DIR)
 
-    repo_dir = os.path.join(WORKSPACES_DIR, repo_name.replace("/", "_"))
+def _check_public(repo_json: dict, repo_name: str):
+    # The server token may see private repositories too; their layout stays out of the shared row
+    if repo_json.get("private"):
+        raise PrivateRepository(f"{repo_name} is private and isn't analyzed")
 
-    # If repo directory exists but not cached (e.g. wiped db), just analyze it. Otherwise clone it.
-    if not os.path.exists(repo_dir):
-        clone_url = f"https://github.com/{repo_name}.git"
-        code, out, err = await run_cmd_async(f"git clone {clone_url} {os.path.basename(repo_dir)}", cwd=WORKSPACES_DIR)
-        print(f"Clone result: code={code}")
-        
-    tree = generate_tree(repo_dir)
-    readme = get_readme_content(repo_dir)
+async def _fetch_readme_from_api(repo_name: str, ref: Optional[str] = None) -> str:
+    headers = dict(_api_headers(), Accept="application/vnd.github.raw")
+    params = {"ref": ref} if ref else None
+    res = await get_github_client().get(f"/repos/{repo_name}/readme", headers=headers, params=params)
+    return res.text[:2000] if res.status_code == 200 else "No README content found."
 
-    analysis_str = await _invoke_nova_for_analysis(bedrock_client, repo_name, tree, readme)
-    
-    # Save to db
+async def _fetch_layout_from_api(repo_name: str, ref: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+    """
+    File tree and README via the GitHub API, without touching disk. Read at commit ref if
+    given, else at the default branch; the third item is ref (None if not pinned).
+    """
+    client = get_github_client()
+    headers = _api_headers()
+    if ref is None:
+        repo_res = await client.get(f"/repos/{repo_name}", headers=headers)
+        repo_res.raise_for_status()
+        _check_public(repo_res.json(), repo_name)
+        tree_ref = repo_res.json().get("default_branch", "main")
+    else:
+        tree_ref = ref
+
+    tree_res, readme = await asyncio.gather(
+        client.get(f"/repos/{repo_name}/git/trees/{tree_ref}", headers=headers, params={"recursive": "1"}),
+        _fetch_readme_from_api(repo_name, ref),
+    )
+    tree_res.raise_for_status()
+    tree_json = tree_res.json()
+    # Very large repos come back truncated; the top levels we render are still there
+    tree = file_tree.lookup_tree(tree_json.get("sha")) or file_tree.remember_tree(
+        tree_json.get("sha"),
+        file_tree.tree_from_paths(entry["path"] for entry in tree_json.get("tree", []) if entry.get("type") != "tree"),
+    )
+    return file_tree.render_tree(tree), readme, ref
+
+
+async def _fetch_layout_from_checkout(repo_name: str) -> Tuple[str, str, Optional[str]]:
+    """
+    File tree and README from a shallow, blobless, sparse checkout, updated to the default
+    branch tip first. The third item is the commit they were read at (None if unknown).
+    """
+    repo_dir = await ensure_analysis_checkout(repo_name, refresh=True)
+    if not repo_dir:
+        return "", "No README content found.", None
+    async with workspace_lock(repo_dir):
+        # Tree objects are present even though most blobs were never downloaded
+        head = await git_read.resolve(repo_dir)
+        tree = file_tree.lookup_tree(head)
+        if tree is None:
+            paths = await git_read.tree_paths(repo_dir) if head else None
+            if paths is not None:
+                tree = file_tree.remember_tree(head, file_tree.tree_from_paths(paths))
+            else:
+                tree = await asyncio.to_thread(file_tree.scan_directory, repo_dir)
+        return file_tree.render_tree(tree), get_readme_content(repo_dir), head
+
+
+async def _fetch_layout(repo_name: str, ref: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+    """(tree, README, commit they describe). The checkout fallback may lag ref slightly."""
+    if ANALYSIS_SOURCE == "api":
+        try:
+            return await _fetch_layout_from_api(repo_name, ref)
+        except PrivateRepository:
+            raise
+        except Exception as e:
+            print(f"Tree API unavailable for {repo_name}, falling back to a sparse clone: {e}")
+    return await _fetch_layout_from_checkout(repo_name)
+
+
+async def _upstream_head(repo_name: str) -> Optional[str]:
+    """
+    Head SHA of the upstream default branch, or None if GitHub can't tell. Both requests go
+    through the ETag cache, so an unchanged repository costs two 304s. Raises
+    PrivateRepository if the repository turns out to be private.
+    """
+    client = get_github_client()
+    headers = _api_headers()
+    try:
+        repo_res = await client.get(f"/repos/{repo_name}", headers=headers)
+        if repo_res.status_code != 200:
+            return None
+        _check_public(repo_res.json(), repo_name)
+        default_branch = repo_res.json().get("default_branch", "main")
+        res = await client.get(
+            f"/repos/{repo_name}/commits/{default_branch}", headers=dict(headers, Accept="application/vnd.github.sha")
+        )
+    except PrivateRepository:
+        raise
+    except Exception as e:
+        print(f"Could not check upstream head of {repo_name}: {e}")
+        return None
+    if res.status_code != 200:
+        return None
+    return res.text.strip() or None
+
+
+async def _upstream_changes(repo_name: str, base: str, head: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    (status, path) pairs between two upstream commits from the compare API, status being
+    A, M or D. None if head doesn't simply extend base (force push) or too much changed.
+    """
+    try:
+        res = await get_github_client().get(f"/repos/{repo_name}/compare/{base}...{head}", headers=_api_headers())
+    except Exception as e:
+        print(f"Could not compare {repo_name} {base[:7]}...{head[:7]}: {e}")
+        return None
+    if res.status_code != 200:
+        return None
+    data = res.json()
+    files = data.get("files") or []
+    # The compare API stops listing files at 300
+    if data.get("status") != "ahead" or len(files) >= 300:
+        return None
+
+    changes = []
+    for entry in files:
+        status, path = entry.get("status"), entry.get("filename", "")
+        if status == "removed":
+            changes.append(("D", path))
+        elif status in ("added", "copied"):
+            changes.append(("A", path))
+        elif status == "renamed":
+            changes.append(("D", entry.get("previous_filename", "")))
+            changes.append(("A", path))
+        else:
+            changes.append(("M", path))
+    return changes
+
+
+def _is_readme(path: str) -> bool:
+    return "/" not in path and path.lower().startswith("readme")
+
+
+async def _revise_analysis(repo_name: str, previous: str, base: Optional[str], head: str) -> Optional[Tuple[str, str]]:
+    """
+    The analysis brought forward from base to head and the commit it now describes,
+    recomputing only what changed: edits to existing files keep it as is, added/removed
+    paths or a new README are handed to Nova together with the previous analysis, and only
+    an unknown or large diff re-reads the whole layout (possibly at a commit other than
+    head, if it came from the checkout). None if the layout or Nova failed, in which case
+    the previous analysis and its commit stay.
+    """
+    changes = await _upstream_changes(repo_name, base, head) if base else None
+    layout_changes = None
+    if changes is not None:
+        layout_changes = [
+            (status, path) for status, path in changes
+            if status != "M" and not any(part in file_tree.TREE_IGNORE for part in path.split("/"))
+        ]
+        if len(layout_changes) > ANALYSIS_INCREMENTAL_MAX_PATHS:
+            layout_changes = None
+
+    try:
+        if layout_changes is None:
+            tree, readme, commit = await _fetch_layout(repo_name, head)
+            if not commit:
+                # Can't tell which commit this layout is from, so it can't be stamped
+                return None
+            return await _complete_analysis(repo_name, _layout_message(tree, readme)), commit
+
+        readme_changed = any(_is_readme(path) for _, path in changes)
+        if not layout_changes and not readme_changed:
+            return previous, head
+
+        listing = "\n".join(("+ " if status == "A" else "- ") + path for status, path in layout_changes)
+        user_msg = (
+            f"PREVIOUS ANALYSIS (at commit {base[:7]}):\n{previous}\n\n"
+            f"FILES ADDED (+) AND REMOVED (-) SINCE THEN:\n{listing or 'None'}\n\n"
+        )
+        if readme_changed:
+            user_msg += f"UPDATED README EXCERPT:\n{await _fetch_readme_from_api(repo_name, head)}\n\n"
+        user_msg += (
+            "Please revise the structural analysis for these changes. Keep everything that still holds "
+            "and output the complete revised analysis."
+        )
+        return await _complete_analysis(repo_name, user_msg), head
+    except Exception as e:
+        print(f"Could not refresh analysis of {repo_name}: {e}")
+        return None
+
+
+def _load_analysis(repo_name: str) -> Optional[models.RepoAnalysis]:
+    """The stored analysis row, detached from its (closed) session. Blocking: run it in a thread."""
+    db = SessionLocal()
+    try:
+        return db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == repo_name).first()
+    finally:
+        db.close()
+
+
+def _store_analysis(repo_name: str, analysis: str, commit: Optional[str], checked_at: float):
+    """Inserts or updates the stored analysis. Blocking: run it in a thread."""
     from sqlalchemy.exc import IntegrityError
-    new_analysis = models.RepoAnalysis(repo_name=repo_name, system_prompt_context=analysis_str)
+    db = SessionLocal()
+    try:
+        record = db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == repo_name).first()
+        if record is None:
+            record = models.RepoAnalysis(repo_name=repo_name)
+            db.add(record)
+        record.system_prompt_context = analysis
+        record.commit_sha = commit
+        record.checked_at = checked_at
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # Another worker inserted it concurrently, which is fine
+    finally:
+        db.close()
+
+
+def _delete_analysis(repo_name: str):
+    """Removes the stored analysis, if any. Blocking: run it in a thread."""
+    db = SessionLocal()
+    try:
+        db.query(models.RepoAnalysis).filter(models.RepoAnalysis.repo_name == repo_name).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _refresh_analysis(repo_name: str) -> str:
+    # Re-read inside the flight: another worker may have refreshed it while this one waited
+    record = await asyncio.to_thread(_load_analysis, repo_name)
+    if record is not None and time.time() - (record.checked_at or 0) < ANALYSIS_STALE_CHECK_INTERVAL:
+        return record.system_prompt_context
+
+    try:
+        head = await _upstream_head(repo_name)
+    except PrivateRepository:
+        # Made private since it was analyzed: stop serving its layout to everyone
+        if record is not None:
+            await asyncio.to_thread(_delete_analysis, repo_name)
+        raise
+    if record is None:
+        tree, readme, commit = await _fetch_layout(repo_name, head)
+        analysis = await _invoke_nova_for_analysis(repo_name, tree, readme)
+    else:
+        analysis, commit = record.system_prompt_context, record.commit_sha
+        if head and head != record.commit_sha:
+            revised = await _revise_analysis(repo_name, record.system_prompt_context, record.commit_sha, head)
+            if revised is not None:
+                analysis, commit = revised
+                if analysis != record.system_prompt_context:
+                    print(f"Refreshed analysis of {repo_name} to {commit[:7]}")
+    await asyncio.to_thread(_store_analysis, repo_name, analysis, commit, time.time())
+    return analysis
+
+
+async def analyze_and_cache_repo(repo_name: str) -> str:
+    """
+    Returns the cached analysis, or generates and stores one. A cached analysis is compared
+    with the upstream HEAD at most every ANALYSIS_STALE_CHECK_INTERVAL seconds and brought
+    forward when the default branch has moved. The stored analysis is served to every user,
+    so GitHub calls only use the server's GITHUB_TOKEN and private repositories raise
+    PrivateRepository instead of being analyzed. Database work runs in threads on sessions
+    of its own, so this is safe to call from background tasks.
+    """
+    cached = await asyncio.to_thread(_load_analysis, repo_name)
+    if cached and time.time() - (cached.checked_at or 0) < ANALYSIS_STALE_CHECK_INTERVAL:
+        return cached.system_prompt_context
+    return await single_flight(repo_name, "analysis", lambda: _refresh_analysis(repo_name))
+
+
+async def _branch_head_shas(pat: str, fork: str, branch_name: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns (issue branch head SHA, default branch head SHA) for the fork via the GitHub API,
+    or None if the issue branch doesn't exist. Responses go through the shared ETag cache.
+    """
+    client = get_github_client()
+    headers = github_auth_headers(pat)
+    repo_res = await client.get(f"/repos/{fork}", headers=headers)
+    repo_res.raise_for_status()
+    default_branch = repo_res.json().get("default_branch", "main")
+
+    # The sha media type returns just the commit id as plain text
+    sha_headers = dict(headers, Accept="application/vnd.github.sha")
+    head_res, base_res = await asyncio.gather(
+        client.get(f"/repos/{fork}/commits/{branch_name}", headers=sha_headers),
+        client.get(f"/repos/{fork}/commits/{default_branch}", headers=sha_headers),
+    )
+    if head_res.status_code in (404, 422):
+        return None
+    head_res.raise_for_status()
+    base_res.raise_for_status()
+    return head_res.text.strip(), base_res.text.strip()
+
+
+def _evaluation_key(fork: str, branch_name: str, head_sha: str, base_sha: str) -> str:
+    return hashlib.sha256(f"{fork}\0{branch_name}\0{head_sha}\0{base_sha}".encode()).hexdigest()
+
+
+def _progress_query(db: Session, repo_name: str, issue_number: int, user_email: str):
+    return db.query(models.ContributionProgress).filter(
+        models.ContributionProgress.user_email == user_email,
+        models.ContributionProgress.repo_name == repo_name,
+        models.ContributionProgress.issue_number == issue_number
+    )
+
+
+def _load_evaluation_memo(repo_name: str, issue_number: int, user_email: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """(eval_key, eval_result) of the issue's progress row, None if there's no row. Blocking: run it in a thread."""
+    db = SessionLocal()
+    try:
+        progress = _progress_query(db, repo_name, issue_number, user_email).first()
+        return (progress.eval_key, progress.eval_result) if progress else None
+    finally:
+        db.close()
+
+
+def _store_evaluation_memo(repo_name: str, issue_number: int, user_email: str, eval_key: str, evaluation: str):
+    """Records the evaluation on the issue's progress row, if it has one. Blocking: run it in a thread."""
+    db = SessionLocal()
     try:
-        db.add(new_analysis)
+        progress = _progress_query(db, repo_name, issue_number, user_email).first()
+        if progress is None:
+            return
+        progress.eval_key = eval_key
+        progress.eval_result = evaluation
         db.commit()
-    except IntegrityError:
+    except Exception:
         db.rollback()
-        # Another request inserted it concurrently, which is fine
-        pass
-    
-    return analysis_str
+        raise
+    finally:
+        db.close()
 
 
-async def evaluate_local_commits(repo_name: str, issue_number: int, user_email: str, db: Session) -> str:
-    """Checks the issue branch for commits on the user's fork, produces a diff, and attempts to run tests."""
+async def evaluate_local_commits(repo_name: str, issue_number: int, user_email: str) -> str:
+    """
+    Checks the issue branch for commits on the user's fork, produces a diff, and attempts to run tests.
+    Database work runs in threads on sessions of its own.
+    """
     repo_short_name = repo_name.split('/')[-1] if '/' in repo_name else repo_name
     
     # Securely retrieve PAT and GitHub Username
     github_username = None
-    pat = None
     decrypted_pat = None
     try:
-        import requests as req
-        from app.utils.encryption import decrypt_pat
-        user_record = db.query(models.User).filter(models.User.email == user_email).first()
-        if user_record and user_record.github_pat:
-            pat = user_record.github_pat
-            decrypted_pat = decrypt_pat(pat)
-            res = req.get("https://api.github.com/user", headers={"Authorization": f"Bearer {decrypted_pat}"})
-            if res.status_code == 200:
-                github_username = res.json().get("login")
+        github_username, decrypted_pat = await github_credentials(user_email)
     except Exception as e:
         print(f"Error fetching github username for evaluation route: {e}")
         
     if not github_username or not decrypted_pat:
         return ""
-        
-    repo_dir = os.path.join(WORKSPACES_DIR, f"{github_username}_{repo_short_name}")
-    
-    if not os.path.exists(repo_dir):
-        # User hasn't made a Vectr-synced clone of their fork yet, let's clone it now
-        if not os.path.exists(WORKSPACES_DIR):
-            os.makedirs(WORKSPACES_DIR)
-        clone_url = f"https://{decrypted_pat}@github.com/{github_username}/{repo_short_name}.git"
-        code, out, err = await run_cmd_async(f"git clone {clone_url} {os.path.basename(repo_dir)}", cwd=WORKSPACES_DIR)
-        if code != 0:
-             return ""
-             
+
+    fork = f"{github_username}/{repo_short_name}"
     branch_name = f"fix/issue-{issue_number}"
-    
-    # 1. Pull latest from remote
-    await run_cmd_async(f"git fetch origin", cwd=repo_dir)
-    
-    # Check if branch exists locally
-    code, out, err = await run_cmd_async(f"git branch --list {branch_name}", cwd=repo_dir)
-    if not out.strip():
-        # Try to checkout the remote branch if it exists, otherwise it might not exist at all yet
-        chk_code, chk_out, chk_err = await run_cmd_async(f"git checkout -b {branch_name} origin/{branch_name}", cwd=repo_dir)
-        if chk_code != 0:
-             # Branch doesn't exist on remote either
-             return ""
-    else:
-        # Branch exists locally, pull latest
-        await run_cmd_async(f"git checkout {branch_name}", cwd=repo_dir)
-        await run_cmd_async(f"git pull origin {branch_name}", cwd=repo_dir)
-         
-    # 2. Get git diff with whichever branch it branched from (usually main or master)
-    # Finding default branch:
-    code, def_branch_out, err = await run_cmd_async("git symbolic-ref refs/remotes/origin/HEAD", cwd=repo_dir)
-    if code != 0:
-         default_branch = "main" # Fallback
+    memo = await asyncio.to_thread(_load_evaluation_memo, repo_name, issue_number, user_email)
+
+    # Two cheap (usually 304) API calls tell us whether anything was pushed since the last
+    # evaluation; if not, skip git, the test suite and the LLM entirely
+    eval_key = None
+    base_sha = None
+    try:
+        shas = await _branch_head_shas(decrypted_pat, fork, branch_name)
+        if shas is None:
+            # Branch hasn't been pushed to the fork yet
+            return ""
+        eval_key = _evaluation_key(fork, branch_name, *shas)
+        base_sha = shas[1]
+        if memo and memo[0] == eval_key and memo[1] is not None:
+            return memo[1]
+    except Exception as e:
+        print(f"Could not resolve branch heads for {fork}, evaluating without memo: {e}")
+
+    try:
+        evaluation = await _evaluate_fork_branch(repo_name, github_username, repo_short_name, decrypted_pat, issue_number, base_sha)
+    except EvaluationFailed as e:
+        # Not memoized: the next turn tries again instead of replaying the failure
+        print(f"Could not evaluate {fork}@{branch_name}: {e}")
+        return ""
+
+    # Only issues the user has started have a progress row; the memo never creates one
+    if eval_key and memo is not None:
+        try:
+            await asyncio.to_thread(_store_evaluation_memo, repo_name, issue_number, user_email, eval_key, evaluation)
+        except Exception as e:
+            print(f"Failed to store evaluation for {fork}@{branch_name}: {e}")
+
+    return evaluation
+
+
+async def _evaluate_fork_branch(repo_name: str, github_username: str, repo_short_name: str,
+                                decrypted_pat: str, issue_number: int, base_sha: Optional[str] = None) -> str:
+    """
+    Syncs the issue branch worktree, diffs it, runs tests and summarizes the diff. Returns ""
+    if the branch has no commits of its own; raises EvaluationFailed if it can't be evaluated.
+    base_sha is the fork's default branch head that went into the memo key, if known.
+    """
+    fork_path = await ensure_fork_clone(repo_name, github_username, repo_short_name, decrypted_pat)
+    if not fork_path:
+        raise EvaluationFailed("Could not clone the fork")
+    branch_name = f"fix/issue-{issue_number}"
+
+    # 1. Pull latest from remote into the issue's own worktree. The head SHA just changed,
+    # so skip the freshness window and always ask the remote
+    await fetch_remote(fork_path, ("origin",), max_age=0)
+    # The worktree is written (reset, test runs) and the fork only read, so evaluations of
+    # different issues on the same fork run side by side
+    async with workspace_lock(issue_worktree_dir(github_username, repo_short_name, issue_number), write=True):
+        repo_dir = await ensure_issue_worktree(fork_path, github_username, repo_short_name, issue_number, branch_name)
+        if not repo_dir:
+            # Branch missing on the remote, or the worktree couldn't be reset to it
+            raise EvaluationFailed(f"Could not check out {branch_name}")
+        async with workspace_lock(fork_path):
+            return await _evaluate_worktree(repo_dir, branch_name, base_sha)
+
+
+async def _evaluate_worktree(repo_dir: str, branch_name: str, base_sha: Optional[str] = None) -> str:
+    # 2. Get git diff with whichever branch it branched from (usually main or master).
+    # Diff against the fetched remote branch, never the local one (nothing updates it), and
+    # preferably against the exact commit the memo key was computed from
+    if base_sha and await git_read.resolve(repo_dir, base_sha):
+        base = base_sha
     else:
-         default_branch = def_branch_out.strip().split('/')[-1]
+        base = f"origin/{await git_read.remote_head(repo_dir) or 'main'}"  # Fallback
+
+    diff_out = await git_read.diff_patch(repo_dir, base, branch_name, max_chars=3000)
+    if diff_out is None:
+        raise EvaluationFailed(f"Could not diff {branch_name} against {base}")
 
-    code, diff_out, err = await run_cmd_async(f"git diff {default_branch}...{branch_name}", cwd=repo_dir)
-    
     if not diff_out.strip():
         # Branch exists but no commits made
         return ""
@@ -268,22 +577,17 @@ async def evaluate_local_commits(repo_name: str, issue_number: int, user_email:
             try:
                 pkg = json.load(f)
                 if "test" in pkg.get("scripts", {}):
-                     code, t_out, t_err = await run_cmd_async("npm test --passWithNoTests", cwd=repo_dir)
+                     code, t_out, t_err = await run_cmd_async(["npm", "test", "--passWithNoTests"], cwd=repo_dir, timeout=TEST_TIMEOUT)
                      test_results = f"Test suite ran (exit code {code}):\nSTDOUT:\n{t_out[-1000:]}\nSTDERR:\n{t_err[-1000:]}"
             except Exception:
                 pass
     elif os.path.exists(os.path.join(repo_dir, "pytest.ini")) or os.path.exists(os.path.join(repo_dir, "tests")):
-         code, t_out, t_err = await run_cmd_async("pytest --maxfail=1", cwd=repo_dir)
+         code, t_out, t_err = await run_cmd_async(["pytest", "--maxfail=1"], cwd=repo_dir, timeout=TEST_TIMEOUT)
          test_results = f"Pytest suite ran (exit code {code}):\nSTDOUT:\n{t_out[-1000:]}\nSTDERR:\n{t_err[-1000:]}"
          
          
     # Generate an AI summary of the diff so we don't spam the chat context with 3000 chars of pure code
-    try:
-        from app.routers.ask_nova import get_bedrock_client
-        client = get_bedrock_client()
-        diff_summary = await _invoke_nova_for_diff_summary(client, diff_str)
-    except Exception as e:
-        diff_summary = f"Summary failed: {e}. Raw diff truncated length: {len(diff_str)}"
+    diff_summary = await _invoke_nova_for_diff_summary(diff_str)
 
     evaluation = (
         f"\n\n--- LOCAL COMMIT ANALYSIS ---\n"
@@ -296,84 +600,78 @@ async def evaluate_local_commits(repo_name: str, issue_number: int, user_email:
     )
     return evaluation
 
-async def get_local_diff_stat(repo_name: str, issue_number: int, user_email: str, db: Session) -> str:
-    """Gets the git diff --stat for the user's issue branch against the default branch."""
+async def _user_fork_checkout(repo_name: str, user_email: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (github_username, fork clone path) for the user, re-cloning the fork if its
+    workspace was evicted. The path is None if there's no usable checkout.
+    """
     repo_short_name = repo_name.split('/')[-1] if '/' in repo_name else repo_name
-    
+    github_username, decrypted_pat = await github_credentials(user_email)
+    if not github_username:
+        return None, None
+
+    repo_dir = fork_dir(github_username, repo_short_name)
+    if not os.path.exists(repo_dir):
+        repo_dir = await ensure_fork_clone(repo_name, github_username, repo_short_name, decrypted_pat)
+        if repo_dir:
+            await fetch_remote(repo_dir, ("origin",))
+    return github_username, repo_dir if repo_dir and os.path.exists(repo_dir) else None
+
+
+async def _issue_diff_range(repo_dir: str, issue_number: int) -> Tuple[str, str]:
+    """(base, head) revisions to diff the issue branch against the default branch."""
+    branch_name = f"fix/issue-{issue_number}"
+    # The remote-tracking default branch is the one fetches keep current
+    default_branch = f"origin/{await git_read.remote_head(repo_dir) or 'main'}"
+
+    # A freshly rehydrated clone only has the remote-tracking branch
+    if not await git_read.ref_exists(repo_dir, f"refs/heads/{branch_name}"):
+        branch_name = f"origin/{branch_name}"
+    return default_branch, branch_name
+
+
+async def get_local_diff_stat(repo_name: str, issue_number: int, user_email: str) -> str:
+    """Gets the git diff --stat for the user's issue branch against the default branch."""
     github_username = None
+    repo_dir = None
     try:
-        import requests as req
-        from app.utils.encryption import decrypt_pat
-        user_record = db.query(models.User).filter(models.User.email == user_email).first()
-        if user_record and user_record.github_pat:
-            decrypted_pat = decrypt_pat(user_record.github_pat)
-            res = req.get("https://api.github.com/user", headers={"Authorization": f"Bearer {decrypted_pat}"})
-            if res.status_code == 200:
-                github_username = res.json().get("login")
+        github_username, repo_dir = await _user_fork_checkout(repo_name, user_email)
     except Exception as e:
         print(f"Error fetching github username for diff stat route: {e}")
         
     if not github_username:
         return "Failed to authenticate with GitHub."
-        
-    repo_dir = os.path.join(WORKSPACES_DIR, f"{github_username}_{repo_short_name}")
     
-    if not os.path.exists(repo_dir):
+    if not repo_dir:
         return "No local checkout found. Make sure you have opened this issue in VS Code."
-             
-    branch_name = f"fix/issue-{issue_number}"
-    
-    code, def_branch_out, err = await run_cmd_async("git symbolic-ref refs/remotes/origin/HEAD", cwd=repo_dir)
-    if code != 0:
-         default_branch = "main"
-    else:
-         default_branch = def_branch_out.strip().split('/')[-1]
 
-    # Just run git diff --stat to get files and lines changed
-    code, diff_out, err = await run_cmd_async(f"git diff --stat {default_branch}...{branch_name}", cwd=repo_dir)
-    
-    if not diff_out.strip() or code != 0:
+    async with workspace_lock(repo_dir):
+        # Just the diff --stat: files and lines changed
+        base, head = await _issue_diff_range(repo_dir, issue_number)
+        diff_out = await git_read.diff_stat(repo_dir, base, head)
+
+    if not diff_out or not diff_out.strip():
         return "No code changes detected yet."
         
     return diff_out.strip()
 
 
-async def get_local_diff_patch(repo_name: str, issue_number: int, user_email: str, db: Session) -> str:
+async def get_local_diff_patch(repo_name: str, issue_number: int, user_email: str) -> str:
     """Gets the full git diff (patch) for the user's issue branch against the default branch."""
-    repo_short_name = repo_name.split('/')[-1] if '/' in repo_name else repo_name
-    
-    github_username = None
+    repo_dir = None
     try:
-        import requests as req
-        from app.utils.encryption import decrypt_pat
-        user_record = db.query(models.User).filter(models.User.email == user_email).first()
-        if user_record and user_record.github_pat:
-            decrypted_pat = decrypt_pat(user_record.github_pat)
-            res = req.get("https://api.github.com/user", headers={"Authorization": f"Bearer {decrypted_pat}"})
-            if res.status_code == 200:
-                github_username = res.json().get("login")
+        _, repo_dir = await _user_fork_checkout(repo_name, user_email)
     except Exception as e:
         print(f"Error fetching github username for diff patch: {e}")
         
-    if not github_username:
+    if not repo_dir:
         return ""
-        
-    repo_dir = os.path.join(WORKSPACES_DIR, f"{github_username}_{repo_short_name}")
-    
-    if not os.path.exists(repo_dir):
-        return ""
-             
-    branch_name = f"fix/issue-{issue_number}"
-    
-    code, def_branch_out, err = await run_cmd_async("git symbolic-ref refs/remotes/origin/HEAD", cwd=repo_dir)
-    if code != 0:
-         default_branch = "main"
-    else:
-         default_branch = def_branch_out.strip().split('/')[-1]
 
-    code, diff_out, err = await run_cmd_async(f"git diff {default_branch}...{branch_name}", cwd=repo_dir)
-    
-    if not diff_out.strip() or code != 0:
+    async with workspace_lock(repo_dir):
+        base, head = await _issue_diff_range(repo_dir, issue_number)
+        diff_out = await git_read.diff_patch(repo_dir, base, head, max_chars=8000)
+
+    if not diff_out or not diff_out.strip():
         return ""
     
     # Truncate to avoid overwhelming Nova's context
@@ -382,4 +680,3 @@ async def get_local_diff_patch(repo_name: str, issue_number: int, user_email: st
         full_diff = full_diff[:8000] + "\n\n... (diff truncated, showing first 8000 chars)"
         
     return full_diff
-
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import shutil
+import time
+from contextlib import AsyncExitStack
+from typing import List, Optional
+
+from app.utils import workspaces
+from app.utils.workspaces import ACCESS_DIR, FETCH_STATE_DIR, INDEX_DIR, LOCKS_DIR, MIRRORS_DIR, STAGING_DIR, WORKSPACES_DIR, WORKTREES_DIR
+
+# Disk budget for WORKSPACES_DIR (0 = unlimited). Least recently used idle workspaces are
+# evicted past it; they're cloned again the next time they're needed.
+WORKSPACES_MAX_BYTES = int(os.getenv("WORKSPACES_MAX_BYTES", str(20 * 1024 ** 3)))
+WORKSPACES_SWEEP_INTERVAL = float(os.getenv("WORKSPACES_SWEEP_INTERVAL", "600"))
+
+
+class Workspace:
+    __slots__ = ("path", "kind", "size", "last_access", "dependents")
+
+    def __init__(self, path: str, kind: str):
+        self.path = path
+        self.kind = kind  # checkout | worktree | mirror
+        self.size = 0
+        self.last_access = workspaces.last_access(path)
+        self.dependents = 0  # fork clones borrowing objects from a mirror
+
+def _dir_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _subdirs(path: str) -> List[str]:
+    try:
+        with os.scandir(path) as it:
+            return [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+
+
+def _alternates(checkout: str) -> List[str]:
+    try:
+        with open(os.path.join(checkout, ".git", "objects", "info", "alternates")) as f:
+            return [os.path.normpath(line.strip()) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def _scan() -> List[Workspace]:
+    reserved = {MIRRORS_DIR, WORKTREES_DIR, ACCESS_DIR, FETCH_STATE_DIR, INDEX_DIR, LOCKS_DIR, STAGING_DIR}
+    found: List[Workspace] = []
+    mirrors = {}
+
+    for path in _subdirs(MIRRORS_DIR):
+        ws = Workspace(path, "mirror")
+        mirrors[os.path.normpath(os.path.join(path, "objects"))] = ws
+        found.append(ws)
+
+    for group in _subdirs(WORKTREES_DIR):
+        found.extend(Workspace(path, "worktree") for path in _subdirs(group))
+
+    for path in _subdirs(WORKSPACES_DIR):
+        if path in reserved:
+            continue
+        found.append(Workspace(path, "checkout"))
+        for objects_dir in _alternates(path):
+            if objects_dir in mirrors:
+                mirrors[objects_dir].dependents += 1
+
+    for ws in found:
+        ws.size = _dir_size(ws.path)
+    return found
+
+
+def _remove(ws: Workspace):
+    shutil.rmtree(ws.path, ignore_errors=True)
+    workspaces.forget(ws.path)
+    if ws.kind == "checkout":
+        # Worktrees of a removed fork clone are unusable without it
+        group = os.path.join(WORKTREES_DIR, os.path.basename(ws.path))
+        for path in _subdirs(group):
+            workspaces.forget(path)
+        shutil.rmtree(group, ignore_errors=True)
+
+
+async def workspace_usage() -> dict:
+    """
+    Aggregate disk usage per workspace kind. Workspace paths carry GitHub usernames, so
+    individual workspaces aren't listed.
+    """
+    found = await asyncio.to_thread(_scan)
+    kinds = {}
+    for ws in found:
+        summary = kinds.setdefault(ws.kind, {"count": 0, "bytes": 0, "in_use": 0})
+        summary["count"] += 1
+        summary["bytes"] += ws.size
+        # Read on the loop, which the in-process locks belong to
+        summary["in_use"] += workspaces.in_use(ws.path)
+    accesses = [ws.last_access for ws in found if ws.last_access]
+    return {
+        "budget_bytes": WORKSPACES_MAX_BYTES,
+        "total_bytes": sum(ws.size for ws in found),
+        "kinds": kinds,
+        "oldest_access": min(accesses, default=None),
+        "newest_access": max(accesses, default=None),
+    }
+
+
+async def enforce_quota(max_bytes: Optional[int] = None) -> List[str]:
+    """
+    Evicts least recently used idle workspaces until WORKSPACES_DIR fits the budget.
+    Mirrors that fork clones still reference are kept. Returns the evicted paths.
+    """
+    budget = WORKSPACES_MAX_BYTES if max_bytes is None else max_bytes
+    if budget <= 0:
+        return []
+
+    found = await asyncio.to_thread(_scan)
+    total = sum(ws.size for ws in found)
+    evicted = []
+    for ws in sorted(found, key=lambda w: w.last_access):
+        if total <= budget:
+            break
+        if ws.dependents:
+            continue
+        paths = [ws.path]
+        if ws.kind == "checkout":
+            # Its worktrees go with it
+            paths += _subdirs(os.path.join(WORKTREES_DIR, os.path.basename(ws.path)))
+        async with AsyncExitStack() as stack:
+            # Exclusive locks that never wait: anything in use by any worker is skipped
+            idle = True
+            for path in paths:
+                if not await stack.enter_async_context(workspaces.try_evict_lock(path)):
+                    idle = False
+                    break
+            if not idle:
+                continue
+            await asyncio.to_thread(_remove, ws)
+        for path in paths:
+            workspaces.drop_lock(path)
+        total -= ws.size
+        evicted.append(ws.path)
+
+    if evicted:
+        print(f"Workspace quota: evicted {len(evicted)} workspace(s), {total} bytes in use")
+    return evicted
+
+
+class QuotaSweeper:
+    """Runs enforce_quota() periodically on the app's event loop."""
+
+    def __init__(self, interval: float = WORKSPACES_SWEEP_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[float] = None
+
+    def start(self):
+        if self._task is None and WORKSPACES_MAX_BYTES > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await enforce_quota()
+            except Exception as e:
+                print(f"Workspace quota sweep failed: {e}")
+            self.last_run = time.time()
+            await asyncio.sleep(self.interval)
+
+
+quota_sweeper = QuotaSweeper()
@@ -0,0 +1,498 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.utils import git_read
+from app.utils.process_runner import run_cmd_async
+
+WORKSPACES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "workspaces")
+# One bare clone per upstream repository; every fork clone borrows its objects
+MIRRORS_DIR = os.path.join(WORKSPACES_DIR, "mirrors")
+# Lightweight checkouts of a fork's issue branches, one per user and issue
+WORKTREES_DIR = os.path.join(WORKSPACES_DIR, "worktrees")
+
+# Last-access stamps, one empty file per workspace (mtime = last use), shared by all workers
+ACCESS_DIR = os.path.join(WORKSPACES_DIR, ".access")
+# flock() files backing the per-workspace locks, so multiple uvicorn workers coordinate too
+LOCKS_DIR = os.path.join(WORKSPACES_DIR, ".locks")
+# Per-workspace fetch bookkeeping: when each `git fetch` last ran and what the remote looked like
+FETCH_STATE_DIR = os.path.join(WORKSPACES_DIR, ".fetch")
+# Per-repository code search indexes (see code_index.py)
+INDEX_DIR = os.path.join(WORKSPACES_DIR, ".index")
+# Clones are built here and renamed into place, so a half-written clone is never visible
+STAGING_DIR = os.path.join(WORKSPACES_DIR, ".tmp")
+
+# Longest we wait for another request (or worker) to release a workspace
+WORKSPACE_LOCK_TIMEOUT = float(os.getenv("WORKSPACE_LOCK_TIMEOUT", "600"))
+# A workspace fetched this recently isn't fetched again (seconds, 0 = always check the remote)
+WORKSPACE_FETCH_FRESHNESS = float(os.getenv("WORKSPACE_FETCH_FRESHNESS", "30"))
+# Past the window, compare `git ls-remote` with the last fetch and skip the fetch if nothing moved
+WORKSPACE_FETCH_PROBE = os.getenv("WORKSPACE_FETCH_PROBE", "true").strip().lower() in ("1", "true", "yes")
+
+
+class AsyncRWLock:
+    """Many readers or one writer. Waiting writers block new readers so fetches aren't starved."""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_readers = 0
+        self.waiting_writers = 0
+
+    @property
+    def busy(self) -> bool:
+        return self.readers > 0 or self.writer or self.waiting_readers > 0 or self.waiting_writers > 0
+
+    async def acquire_read(self):
+        async with self._cond:
+            self.waiting_readers += 1
+            try:
+                await self._cond.wait_for(lambda: not self.writer and not self.waiting_writers)
+            finally:
+                self.waiting_readers -= 1
+            self.readers += 1
+
+    async def release_read(self):
+        async with self._cond:
+            self.readers -= 1
+            self._cond.notify_all()
+
+    async def acquire_write(self):
+        async with self._cond:
+            self.waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self.writer and not self.readers)
+            finally:
+                self.waiting_writers -= 1
+            self.writer = True
+
+    async def release_write(self):
+        async with self._cond:
+            self.writer = False
+            self._cond.notify_all()
+
+
+_rw_locks: Dict[str, AsyncRWLock] = {}
+_inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+def _rw_lock(path: str) -> AsyncRWLock:
+    lock = _rw_locks.get(path)
+    if lock is None:
+        lock = AsyncRWLock()
+        _rw_locks[path] = lock
+    return lock
+
+
+def _flat_name(path: str) -> str:
+    return os.path.relpath(path, WORKSPACES_DIR).replace(os.sep, "__")
+
+
+def _lock_file(path: str) -> str:
+    return os.path.join(LOCKS_DIR, _flat_name(path) + ".lock")
+
+
+async def _flock(path: str, mode: int, timeout: float) -> int:
+    # Non-blocking attempts with backoff, so waiting never ties up a thread
+    os.makedirs(LOCKS_DIR, exist_ok=True)
+    fd = os.open(_lock_file(path), os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, mode | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for workspace lock on {path}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.5)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def _funlock(fd: int):
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@asynccontextmanager
+async def workspace_lock(path: str, write: bool = False, timeout: float = WORKSPACE_LOCK_TIMEOUT):
+    """
+    Shared (read) or exclusive (write) lock on a workspace, held both in-process and across
+    worker processes. Reads: diff, log, ls-tree. Writes: fetch, checkout/reset, push, clone.
+    Holding either also keeps the quota sweeper away and marks the workspace as used.
+    """
+    lock = _rw_lock(path)
+    if write:
+        await lock.acquire_write()
+    else:
+        await lock.acquire_read()
+    fd = None
+    try:
+        fd = await _flock(path, fcntl.LOCK_EX if write else fcntl.LOCK_SH, timeout)
+        touch(path)
+        yield path
+    finally:
+        if fd is not None:
+            _funlock(fd)
+        if write:
+            await lock.release_write()
+        else:
+            await lock.release_read()
+
+
+@asynccontextmanager
+async def try_evict_lock(path: str):
+    """
+    Exclusive lock for eviction that never waits: yields True if the workspace is idle in
+    every worker (and now locked), False if anyone is using it.
+    """
+    lock = _rw_lock(path)
+    if lock.busy:
+        yield False
+        return
+    await lock.acquire_write()
+    fd = None
+    try:
+        try:
+            fd = await _flock(path, fcntl.LOCK_EX, 0)
+        except TimeoutError:
+            yield False
+            return
+        yield True
+    finally:
+        if fd is not None:
+            _funlock(fd)
+        await lock.release_write()
+
+
+async def single_flight(path: str, op: str, make_coro: Callable[[], Awaitable]):
+    """
+    Runs make_coro() once for concurrent callers with the same (path, op); late arrivals
+    await the in-flight result instead of repeating the work.
+    """
+    key = (path, op)
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(make_coro())
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield() so one cancelled caller doesn't cancel the shared work
+    return await asyncio.shield(future)
+
+
+def _fetch_state_file(path: str) -> str:
+    return os.path.join(FETCH_STATE_DIR, _flat_name(path) + ".json")
+
+
+def _load_fetch_state(path: str) -> dict:
+    try:
+        with open(_fetch_state_file(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_fetch_state(path: str, state: dict):
+    try:
+        os.makedirs(FETCH_STATE_DIR, exist_ok=True)
+        tmp = _fetch_state_file(path) + f".{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, _fetch_state_file(path))
+    except OSError as e:
+        print(f"Could not record fetch state for {path}: {e}")
+
+
+async def _remote_snapshot(repo_path: str, args: Sequence[str]) -> Optional[Dict[str, str]]:
+    """
+    Digest of `git ls-remote` for each remote the fetch would contact: one round trip that
+    lists ref tips without negotiating or downloading a pack. None if any probe fails.
+    """
+    if "--all" in args:
+        code, out, err = await run_cmd_async(["git", "remote"], cwd=repo_path)
+        remotes = out.split() if code == 0 else []
+    else:
+        remotes = [arg for arg in args if not arg.startswith("-")][:1] or ["origin"]
+    if not remotes:
+        return None
+
+    results = await asyncio.gather(*(
+        run_cmd_async(["git", "ls-remote", "--heads", "--tags", remote], cwd=repo_path, timeout=30)
+        for remote in remotes
+    ))
+    snapshot = {}
+    for remote, (code, out, err) in zip(remotes, results):
+        if code != 0:
+            return None
+        snapshot[remote] = hashlib.sha256(out.encode()).hexdigest()
+    return snapshot
+
+
+async def fetch_remote(repo_path: str, args: Sequence[str] = ("origin",),
+                       max_age: float = WORKSPACE_FETCH_FRESHNESS) -> bool:
+    """
+    `git fetch <args>` under the workspace write lock, skipped if the same fetch ran less
+    than max_age seconds ago or the remote refs haven't moved since it last ran. Concurrent
+    identical fetches collapse into one. Returns True if a fetch actually ran.
+    """
+    op = " ".join(args)
+
+    async def run():
+        async with workspace_lock(repo_path, write=True):
+            state = _load_fetch_state(repo_path)
+            last = state.get(op) or {}
+            if time.time() - last.get("fetched_at", 0) < max_age:
+                return False
+
+            snapshot = await _remote_snapshot(repo_path, args) if WORKSPACE_FETCH_PROBE else None
+            if snapshot is not None and snapshot == last.get("refs"):
+                state[op] = {"fetched_at": time.time(), "refs": snapshot}
+                _save_fetch_state(repo_path, state)
+                return False
+
+            code, out, err = await run_cmd_async(["git", "fetch", *args], cwd=repo_path)
+            if code != 0:
+                print(f"git fetch {op} failed in {repo_path}: {err.strip()}")
+                return False
+            # The snapshot predates the fetch, so a push racing with it only causes one extra fetch later
+            state[op] = {"fetched_at": time.time(), "refs": snapshot}
+            _save_fetch_state(repo_path, state)
+            return True
+    return await single_flight(repo_path, f"fetch {op} max_age={max_age}", run)
+
+
+def _access_stamp(path: str) -> str:
+    return os.path.join(ACCESS_DIR, _flat_name(path))
+
+
+def touch(path: str):
+    """Records that a workspace was just used."""
+    stamp = _access_stamp(path)
+    try:
+        os.makedirs(ACCESS_DIR, exist_ok=True)
+        with open(stamp, "a"):
+            os.utime(stamp, None)
+    except OSError as e:
+        print(f"Could not record workspace access for {path}: {e}")
+
+
+def last_access(path: str) -> float:
+    try:
+        return os.path.getmtime(_access_stamp(path))
+    except OSError:
+        # Never stamped (created before access tracking); fall back to the directory itself
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+
+def forget(path: str):
+    git_read.drop_repo(path)
+    for stale in (_access_stamp(path), _fetch_state_file(path)):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def in_use(path: str) -> bool:
+    """
+    True if this process holds or waits for the workspace (see try_evict_lock for all workers).
+    Call it on the event loop: the locks belong to it.
+    """
+    lock = _rw_locks.get(path)
+    return lock is not None and lock.busy
+
+
+def drop_lock(path: str):
+    """Forgets an evicted workspace's in-process lock, unless someone has started waiting on it."""
+    lock = _rw_locks.get(path)
+    if lock is not None and not lock.busy:
+        del _rw_locks[path]
+
+
+def mirror_dir(upstream: str) -> str:
+    return os.path.join(MIRRORS_DIR, upstream.replace("/", "_") + ".git")
+
+
+def analysis_dir(upstream: str) -> str:
+    return os.path.join(WORKSPACES_DIR, upstream.replace("/", "_"))
+
+
+def snapshot_dir(upstream: str) -> str:
+    return os.path.join(WORKSPACES_DIR, upstream.replace("/", "_") + ".snapshot.git")
+
+
+def fork_dir(github_username: str, repo_short_name: str) -> str:
+    return os.path.join(WORKSPACES_DIR, f"{github_username}_{repo_short_name}")
+
+
+def issue_worktree_dir(github_username: str, repo_short_name: str, issue_number: int) -> str:
+    return os.path.join(WORKTREES_DIR, f"{github_username}_{repo_short_name}", f"issue-{issue_number}")
+
+
+def _staging_path(path: str) -> str:
+    # Only the holder of the workspace's write lock clones into it, so one per workspace is enough
+    staging = os.path.join(STAGING_DIR, _flat_name(path))
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    return staging
+
+
+async def _clone_into(path: str, clone_argv: List[str]) -> Tuple[int, str]:
+    """Runs `<clone_argv> <staging>` and renames the result to path. Call under path's write lock."""
+    staging = _staging_path(path)
+    code, out, err = await run_cmd_async([*clone_argv, staging])
+    if code != 0:
+        shutil.rmtree(staging, ignore_errors=True)
+        return code, err
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.rename(staging, path)
+    return 0, ""
+
+
+async def ensure_mirror(upstream: str, refresh: bool = False) -> Optional[str]:
+    """
+    Returns the bare mirror of a public upstream repo, cloning it on first use.
+    Returns None if it can't be cloned (e.g. the upstream is private).
+    """
+    path = mirror_dir(upstream)
+    if not os.path.exists(path):
+        async with workspace_lock(path, write=True):
+            if not os.path.exists(path):
+                # --bare (not --mirror) keeps GitHub's refs/pull/* out of the object store
+                code, err = await _clone_into(path, ["git", "clone", "--bare", f"https://github.com/{upstream}.git"])
+                if code != 0:
+                    print(f"Mirror clone failed for {upstream}: {err.strip()}")
+                    return None
+                # Fork clones reference these objects through alternates, so they must never be pruned
+                await run_cmd_async(["git", "config", "gc.auto", "0"], cwd=path)
+                return path
+    if refresh:
+        await fetch_remote(path, ("--prune", "origin", "+refs/heads/*:refs/heads/*"))
+    touch(path)
+    return path
+
+
+async def ensure_analysis_checkout(upstream: str, refresh: bool = False) -> Optional[str]:
+    """
+    Returns a checkout of the upstream default branch for analysis. It's a depth-1, blobless,
+    sparse clone: full tree metadata, but only root-level files (README, manifests, configs)
+    are downloaded and written to disk. With refresh, an existing checkout is first moved
+    to the current tip of the default branch.
+    """
+    path = analysis_dir(upstream)
+    if os.path.exists(path):
+        touch(path)
+        if refresh:
+            await fetch_remote(path, ("--depth=1", "--filter=blob:none", "origin"))
+            async with workspace_lock(path, write=True):
+                code, out, err = await run_cmd_async(["git", "reset", "--hard", "origin/HEAD"], cwd=path)
+            if code != 0:
+                print(f"Could not update analysis checkout of {upstream}: {err.strip()}")
+        return path
+    async with workspace_lock(path, write=True):
+        if not os.path.exists(path):
+            code, err = await _clone_into(path, [
+                "git", "clone", "--depth", "1", "--filter=blob:none", "--sparse", f"https://github.com/{upstream}.git"
+            ])
+            if code != 0:
+                print(f"Analysis clone failed for {upstream}: {err.strip()}")
+                return None
+    return path
+
+
+async def ensure_snapshot(upstream: str, refresh: bool = False) -> Optional[str]:
+    """
+    Returns a depth-1 bare clone of the upstream default branch: every file at the tip, no
+    history. Reading the tip (e.g. for the code index) doesn't need a full mirror. With
+    refresh, an existing snapshot is first moved to the current tip of the default branch.
+    """
+    path = snapshot_dir(upstream)
+    if os.path.exists(path):
+        touch(path)
+        if refresh:
+            code, branch, err = await run_cmd_async(["git", "symbolic-ref", "HEAD"], cwd=path)
+            if code == 0:
+                await fetch_remote(path, ("--depth=1", "origin", f"+HEAD:{branch.strip()}"))
+        return path
+    async with workspace_lock(path, write=True):
+        if not os.path.exists(path):
+            code, err = await _clone_into(path, [
+                "git", "clone", "--bare", "--depth", "1", "--single-branch", f"https://github.com/{upstream}.git"
+            ])
+            if code != 0:
+                print(f"Snapshot clone failed for {upstream}: {err.strip()}")
+                return None
+    touch(path)
+    return path
+
+
+async def ensure_fork_clone(upstream: str, github_username: str, repo_short_name: str, pat: str) -> Optional[str]:
+    """
+    Returns the local clone of the user's fork, cloning it on first use (or again after the
+    quota sweeper evicted it). New clones use the upstream mirror as a --reference, so only
+    objects unique to the fork are downloaded.
+    """
+    path = fork_dir(github_username, repo_short_name)
+    if os.path.exists(path):
+        touch(path)
+        return path
+    async with workspace_lock(path, write=True):
+        if os.path.exists(path):
+            return path
+        mirror = await ensure_mirror(upstream)
+        clone_url = f"https://{pat}@github.com/{github_username}/{repo_short_name}.git"
+        if mirror:
+            # The read lock keeps the quota sweeper from evicting the mirror mid-clone
+            async with workspace_lock(mirror):
+                code, err = await _clone_into(path, ["git", "clone", "--reference", mirror, clone_url])
+        else:
+            code, err = await _clone_into(path, ["git", "clone", clone_url])
+        print(f"User Fork Clone result: code={code}")
+        if code != 0:
+            return None
+    return path
+
+
+async def ensure_issue_worktree(fork_path: str, github_username: str, repo_short_name: str,
+                                issue_number: int, branch_name: str) -> Optional[str]:
+    """
+    Returns a worktree of the fork clone with the issue branch checked out at origin's tip.
+    Call after fetching origin, while holding the write lock on issue_worktree_dir(...).
+    Returns None if the branch doesn't exist on the fork.
+    """
+    path = issue_worktree_dir(github_username, repo_short_name, issue_number)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Adding a worktree writes the fork's shared refs and .git/worktrees metadata
+        async with workspace_lock(fork_path, write=True):
+            # Forget worktrees whose directories were removed by hand
+            await run_cmd_async(["git", "worktree", "prune"], cwd=fork_path)
+            # -f: older workspaces may still have the branch checked out in the main clone
+            code, out, err = await run_cmd_async(
+                ["git", "worktree", "add", "-f", "-B", branch_name, path, f"origin/{branch_name}"], cwd=fork_path
+            )
+        if code != 0:
+            return None
+    else:
+        # Vectr never commits here, so tracking the pushed tip is the same as pulling
+        code, out, err = await run_cmd_async(["git", "reset", "--hard", f"origin/{branch_name}"], cwd=path)
+        if code != 0:
+            return None
+    touch(path)
+    return path
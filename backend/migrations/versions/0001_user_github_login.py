@@ -0,0 +1,27 @@
+"""UserInfo.github_login: cached GitHub login for the stored PAT
+
+Skipped if the column already exists (e.g. the table was created by create_all()).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "UserInfo" not in inspector.get_table_names():
+        return
+    if "github_login" not in {column["name"] for column in inspector.get_columns("UserInfo")}:
+        op.add_column("UserInfo", sa.Column("github_login", sa.String(100), nullable=True))
+
+
+def downgrade():
+    op.drop_column("UserInfo", "github_login")
@@ -0,0 +1,34 @@
+"""LLMResponseCache: content-addressed LLM responses
+
+Skipped if the table already exists (e.g. it was created by create_all()).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "LLMResponseCache" not in inspector.get_table_names():
+        op.create_table(
+            "LLMResponseCache",
+            sa.Column("key", sa.String(64), primary_key=True),
+            sa.Column("label", sa.String(50), nullable=False),
+            sa.Column("response", sa.String(), nullable=False),
+            sa.Column("expires_at", sa.Float(), nullable=False),
+        )
+        inspector = sa.inspect(op.get_bind())
+    if "ix_LLMResponseCache_expires_at" not in {index["name"] for index in inspector.get_indexes("LLMResponseCache")}:
+        op.create_index("ix_LLMResponseCache_expires_at", "LLMResponseCache", ["expires_at"])
+
+
+def downgrade():
+    op.drop_table("LLMResponseCache")
@@ -0,0 +1,36 @@
+"""ContributionProgress.eval_key/eval_result: memoized local commit evaluation
+
+Skipped for columns that already exist (e.g. the table was created by create_all()).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+TABLE = "ContributionProgress"
+COLUMNS = [
+    sa.Column("eval_key", sa.String(64), nullable=True),
+    sa.Column("eval_result", sa.String(), nullable=True),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE not in inspector.get_table_names():
+        return
+    existing = {column["name"] for column in inspector.get_columns(TABLE)}
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column(TABLE, column)
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.drop_column(TABLE, column.name)
@@ -0,0 +1,36 @@
+"""RepoAnalysis.commit_sha/checked_at: the upstream commit an analysis describes
+
+Skipped for columns that already exist (e.g. the table was created by create_all()).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLE = "RepoAnalysis"
+COLUMNS = [
+    sa.Column("commit_sha", sa.String(40), nullable=True),
+    sa.Column("checked_at", sa.Float(), nullable=True),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if TABLE not in inspector.get_table_names():
+        return
+    existing = {column["name"] for column in inspector.get_columns(TABLE)}
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column(TABLE, column)
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.drop_column(TABLE, column.name)
@@ -0,0 +1,89 @@
+"""Composite unique and covering indexes on the hot (user_email, repo_name, issue_number) lookups
+
+Removes duplicate (user_email, repo_name, issue_number) rows, then creates the composite
+unique and covering indexes. Every step checks the live schema first, so it is safe on
+databases that already have some or all of it (e.g. fresh ones created by create_all()).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+HOT_KEY = ["user_email", "repo_name", "issue_number"]
+CONTRIBUTIONS_INCLUDE = ["id", "repo_name", "issue_title", "language", "issue_number", "status", "pr_sent"]
+
+# Which duplicate survives: Contributions keeps a row whose PR was sent, then the newest
+DEDUP_ORDER = {
+    "ContributionProgress": "id DESC",
+    "Contributions": "pr_sent DESC NULLS LAST, id DESC",
+}
+
+
+def _indexes(inspector, table):
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def _has_unique(inspector, table, columns):
+    if any(c["column_names"] == columns for c in inspector.get_unique_constraints(table)):
+        return True
+    return any(i["unique"] and i["column_names"] == columns for i in inspector.get_indexes(table))
+
+
+def _dedup(table, columns, order):
+    # NULL keys never collide in a unique index, so those rows are left alone
+    key = ", ".join(f'"{column}"' for column in columns)
+    not_null = " AND ".join(f'"{column}" IS NOT NULL' for column in columns)
+    op.execute(
+        f'DELETE FROM "{table}" t USING ('
+        f'  SELECT id, ROW_NUMBER() OVER (PARTITION BY {key} ORDER BY {order}) AS rn'
+        f'  FROM "{table}" WHERE {not_null}'
+        f') d WHERE t.id = d.id AND d.rn > 1'
+    )
+
+
+def _create_index(name, table, columns, **kw):
+    # Built without blocking writes to these tables on Postgres
+    with op.get_context().autocommit_block():
+        op.create_index(name, table, columns, postgresql_concurrently=True, **kw)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    for table, order in DEDUP_ORDER.items():
+        if table in tables and f"uq_{table}_user_repo_issue" not in _indexes(inspector, table):
+            _dedup(table, HOT_KEY, order)
+    if "RepoAnalysis" in tables and not _has_unique(inspector, "RepoAnalysis", ["repo_name"]):
+        _dedup("RepoAnalysis", ["repo_name"], "id DESC")
+
+    for table in DEDUP_ORDER:
+        if table in tables and f"uq_{table}_user_repo_issue" not in _indexes(inspector, table):
+            _create_index(f"uq_{table}_user_repo_issue", table, HOT_KEY, unique=True)
+    if "Contributions" in tables and "ix_Contributions_user_email_covering" not in _indexes(inspector, "Contributions"):
+        _create_index(
+            "ix_Contributions_user_email_covering", "Contributions", ["user_email"],
+            postgresql_include=CONTRIBUTIONS_INCLUDE,
+        )
+    if "RepoAnalysis" in tables and not _has_unique(inspector, "RepoAnalysis", ["repo_name"]):
+        _create_index("ix_RepoAnalysis_repo_name", "RepoAnalysis", ["repo_name"], unique=True)
+
+
+def downgrade():
+    # The RepoAnalysis.repo_name unique index is left in place: the model declares it
+    inspector = sa.inspect(op.get_bind())
+    for table, name in [
+        ("Contributions", "ix_Contributions_user_email_covering"),
+        ("Contributions", "uq_Contributions_user_repo_issue"),
+        ("ContributionProgress", "uq_ContributionProgress_user_repo_issue"),
+    ]:
+        if name in _indexes(inspector, table):
+            op.drop_index(name, table_name=table)
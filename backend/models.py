@@ -1,12 +1,13 @@
 #this is a blueprint file for SQL ALCHEMY
 
-from sqlalchemy import Column,String,Integer,ForeignKey,Boolean
+from sqlalchemy import Column,String,Integer,ForeignKey,Boolean,Float,Index
 from database import Base
 
 class User(Base):
     __tablename__ = "UserInfo"
     email = Column(String(100), primary_key=True, nullable=False) 
     github_pat = Column(String(255), nullable=True)  
+    github_login = Column(String(100), nullable=True)  # Cached GitHub login for the current PAT
     password = Column(String(100), nullable=False)   
     experience_lvl = Column(String(20), nullable=False) 
 
@@ -29,11 +30,23 @@ class Contributions(Base):
     status = Column(String)
     pr_sent = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # One row per user and issue; also serves every (user_email, repo_name, issue_number) lookup
+        Index("uq_Contributions_user_repo_issue", "user_email", "repo_name", "issue_number", unique=True),
+        # Dashboard lists a user's contributions from the index alone (Postgres index-only scan)
+        Index(
+            "ix_Contributions_user_email_covering", "user_email",
+            postgresql_include=["id", "repo_name", "issue_title", "language", "issue_number", "status", "pr_sent"],
+        ),
+    )
+
 class RepoAnalysis(Base):
     __tablename__ = "RepoAnalysis"
     id = Column(Integer, primary_key=True, index=True)
-    repo_name = Column(String, unique=True, nullable=False)
+    repo_name = Column(String, unique=True, nullable=False)  # The unique constraint is the lookup index
     system_prompt_context = Column(String, nullable=False)
+    commit_sha = Column(String(40), nullable=True)  # Upstream default-branch commit the analysis describes
+    checked_at = Column(Float, nullable=True)  # Last comparison against the upstream HEAD (unix time)
 
 class ContributionProgress(Base):
     __tablename__ = "ContributionProgress"
@@ -50,5 +63,16 @@ class ContributionProgress(Base):
     fork_vscode_url = Column(String, nullable=True)
     pr_title = Column(String, nullable=True)
     pr_body = Column(String, nullable=True)
+    eval_key = Column(String(64), nullable=True)  # sha256 of fork, branch, branch head SHA and default branch SHA
+    eval_result = Column(String, nullable=True)  # Local commit evaluation for eval_key
 
+    __table_args__ = (
+        Index("uq_ContributionProgress_user_repo_issue", "user_email", "repo_name", "issue_number", unique=True),
+    )
 
+class LLMResponseCache(Base):
+    __tablename__ = "LLMResponseCache"
+    key = Column(String(64), primary_key=True)  # sha256 of provider, model, prompt and inference config
+    label = Column(String(50), nullable=False)
+    response = Column(String, nullable=False)  # JSON-encoded LLMResponse
+    expires_at = Column(Float, nullable=False, index=True)  # Unix timestamp
@@ -0,0 +1,185 @@
+import asyncio
+
+from app.utils import cache
+from app.utils.cache import AsyncTTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def _with_clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_concurrent_misses_share_one_load():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        store = AsyncTTLCache(ttl=60)
+        results = await asyncio.gather(*(store.get_or_load("k", loader) for _ in range(5)))
+        return store, results
+
+    store, results = asyncio.run(main())
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert store.stats()["misses"] == 5
+    assert store.stats()["inflight"] == 0
+
+
+def test_fresh_entries_are_served_without_loading(monkeypatch):
+    clock = _with_clock(monkeypatch)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        store = AsyncTTLCache(ttl=60)
+        first = await store.get_or_load("k", loader)
+        clock.now += 59
+        second = await store.get_or_load("k", loader)
+        return first, second
+
+    assert asyncio.run(main()) == (1, 1)
+    assert len(calls) == 1
+
+
+def test_stale_entry_is_served_while_it_refreshes(monkeypatch):
+    clock = _with_clock(monkeypatch)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        store = AsyncTTLCache(ttl=60, stale_ttl=60)
+        await store.get_or_load("k", loader)
+        clock.now += 90
+        stale = await store.get_or_load("k", loader)
+        # Let the background refresh finish
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        refreshed = await store.get_or_load("k", loader)
+        return store, stale, refreshed
+
+    store, stale, refreshed = asyncio.run(main())
+    assert stale == 1
+    assert refreshed == 2
+    assert store.stats()["stale_hits"] == 1
+
+
+def test_expired_entry_is_loaded_again(monkeypatch):
+    clock = _with_clock(monkeypatch)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        store = AsyncTTLCache(ttl=60, stale_ttl=60)
+        await store.get_or_load("k", loader)
+        clock.now += 121
+        return await store.get_or_load("k", loader)
+
+    assert asyncio.run(main()) == 2
+
+
+def test_failed_load_is_not_cached():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return "value"
+
+    async def main():
+        store = AsyncTTLCache(ttl=60)
+        try:
+            await store.get_or_load("k", loader)
+        except RuntimeError:
+            pass
+        return await store.get_or_load("k", loader)
+
+    assert asyncio.run(main()) == "value"
+
+
+def test_negative_results_expire_quickly_and_never_replace_good_entries(monkeypatch):
+    clock = _with_clock(monkeypatch)
+    results = [("partial", False), ("full", True), ("partial", False)]
+
+    async def loader():
+        return results.pop(0)
+
+    async def main():
+        store = AsyncTTLCache(ttl=60, stale_ttl=600, negative_ttl=5, is_negative=lambda v: not v[1])
+        seen = [await store.get_or_load("k", loader)]
+        clock.now += 6
+        seen.append(await store.get_or_load("k", loader))
+        clock.now += 61
+        # Stale: served while a refresh runs, and the refresh comes back partial
+        seen.append(await store.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        seen.append(await store.get_or_load("k", loader))
+        return seen
+
+    seen = asyncio.run(main())
+    assert [value for value, _ in seen] == ["partial", "full", "full", "full"]
+
+
+def test_lru_eviction_by_entry_count():
+    async def main():
+        store = AsyncTTLCache(ttl=60, max_entries=2)
+
+        async def load(value):
+            return value
+
+        for key in ("a", "b"):
+            await store.get_or_load(key, lambda key=key: load(key))
+        await store.get_or_load("a", lambda: load("a"))
+        await store.get_or_load("c", lambda: load("c"))
+        return list(store._entries)
+
+    assert asyncio.run(main()) == ["a", "c"]
+
+
+def test_negative_result_replaces_an_expired_good_entry(monkeypatch):
+    clock = _with_clock(monkeypatch)
+    results = [("full", True), ("partial", False), ("full", True)]
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return results.pop(0)
+
+    async def main():
+        store = AsyncTTLCache(ttl=60, stale_ttl=60, negative_ttl=5, is_negative=lambda v: not v[1])
+        seen = [await store.get_or_load("k", loader)]
+        clock.now += 121
+        # The good entry has expired outright: the partial result is cached for negative_ttl
+        seen.append(await store.get_or_load("k", loader))
+        clock.now += 4
+        seen.append(await store.get_or_load("k", loader))
+        clock.now += 2
+        seen.append(await store.get_or_load("k", loader))
+        return seen
+
+    seen = asyncio.run(main())
+    assert [value for value, _ in seen] == ["full", "partial", "partial", "full"]
+    assert len(calls) == 3
@@ -0,0 +1,67 @@
+from app.utils.code_index import CodeIndex, build_index, extract_symbols, tokenize, update_index
+
+FILES = [
+    ("src/auth/token_refresh.py", b"def refresh_access_token(session):\n    return session.renew()\n"),
+    ("src/http/client.py", b"class HttpClient:\n    def send(self, request):\n        return self.transport.send(request)\n"),
+    ("src/http/retry.py", b"def retry_request(send, attempts):\n    for _ in range(attempts):\n        send()\n"),
+    ("docs/usage.md", b"Call the client to send a request. The token is refreshed automatically.\n"),
+    ("assets/logo.png", b"\x89PNG\r\n\x1a\n\0\0\0"),
+]
+
+
+def _search(tmp_path, query, files=FILES):
+    build_index("octo/repo", "abc123", files, str(tmp_path))
+    index = CodeIndex(str(tmp_path))
+    try:
+        return index.search(query)
+    finally:
+        index.close()
+
+
+def test_tokenize_splits_identifiers_and_drops_stopwords():
+    assert tokenize("parseHTTPResponse") == ["parsehttpresponse", "parse", "http", "response"]
+    assert tokenize("parse_http_response") == ["parse", "http", "response"]
+    assert tokenize("get the value of x") == ["value", "of"]
+
+
+def test_extract_symbols_per_language():
+    python = "class Cache:\n    async def get_or_load(self):\n        pass\n"
+    assert extract_symbols("python", python) == ["get_or_load", "Cache"]
+    go = "func (c *Client) Do(req *Request) error {\n}\ntype Client struct {\n}\n"
+    assert extract_symbols("go", go) == ["Do", "Client"]
+    assert extract_symbols("markdown", "# Title") == []
+
+
+def test_search_ranks_path_and_symbol_matches_first(tmp_path):
+    results = _search(tmp_path, "where do we refresh the access token?")
+    assert results[0]["path"] == "src/auth/token_refresh.py"
+    assert results[0]["symbols"] == ["refresh_access_token"]
+
+    results = _search(tmp_path, "retry a failed request")
+    assert results[0]["path"] == "src/http/retry.py"
+    assert {r["path"] for r in results} >= {"src/http/client.py", "docs/usage.md"}
+
+
+def test_binary_files_and_unknown_terms_are_ignored(tmp_path):
+    assert _search(tmp_path, "png logo") == []
+    assert _search(tmp_path, "kubernetes") == []
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    base_dir, updated_dir, rebuilt_dir = tmp_path / "base", tmp_path / "updated", tmp_path / "rebuilt"
+    build_index("octo/repo", "abc123", FILES, str(base_dir))
+    changed = [("src/http/retry.py", b"def backoff_delay(attempt):\n    return 2 ** attempt\n")]
+    current = [f for f in FILES if f[0] not in ("src/http/retry.py", "docs/usage.md")] + changed
+
+    base = CodeIndex(str(base_dir))
+    update_index("octo/repo", base, "def456", {"src/http/retry.py", "docs/usage.md"}, changed, str(updated_dir))
+    base.close()
+    build_index("octo/repo", "def456", current, str(rebuilt_dir))
+
+    for query in ("backoff delay", "retry request", "send request", "access token"):
+        updated, rebuilt = CodeIndex(str(updated_dir)), CodeIndex(str(rebuilt_dir))
+        assert updated.commit == "def456"
+        assert sorted((r["path"], r["score"]) for r in updated.search(query)) == \
+            sorted((r["path"], r["score"]) for r in rebuilt.search(query))
+        updated.close()
+        rebuilt.close()
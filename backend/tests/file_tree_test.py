@@ -0,0 +1,112 @@
+import os
+
+from app.utils.file_tree import TreeNode, _GitIgnore, render_tree, scan_directory, tree_from_paths
+
+
+def _rules(tmp_path, text: str, base: str = "") -> _GitIgnore:
+    path = tmp_path / ".gitignore"
+    path.write_text(text)
+    rules = _GitIgnore()
+    rules.load(base, str(path))
+    return rules
+
+
+def test_unanchored_pattern_matches_at_any_depth(tmp_path):
+    rules = _rules(tmp_path, "*.log\nbuild/\n")
+    assert rules.ignored("debug.log", False)
+    assert rules.ignored("src/app/debug.log", False)
+    assert rules.ignored("build", True)
+    assert rules.ignored("src/build", True)
+
+
+def test_leading_slash_anchors_to_the_gitignore_directory(tmp_path):
+    rules = _rules(tmp_path, "/build/\n/TODO\n")
+    assert rules.ignored("build", True)
+    assert not rules.ignored("src/build", True)
+    assert rules.ignored("TODO", False)
+    assert not rules.ignored("docs/TODO", False)
+
+
+def test_middle_slash_anchors_the_pattern(tmp_path):
+    rules = _rules(tmp_path, "docs/*.md\n")
+    assert rules.ignored("docs/guide.md", False)
+    assert not rules.ignored("src/docs/guide.md", False)
+    assert not rules.ignored("docs/api/guide.md", False)
+
+
+def test_dir_only_pattern_skips_files(tmp_path):
+    rules = _rules(tmp_path, "cache/\n")
+    assert rules.ignored("cache", True)
+    assert not rules.ignored("cache", False)
+
+
+def test_double_star_and_negation(tmp_path):
+    rules = _rules(tmp_path, "**/generated/**\n*.min.js\n!keep.min.js\n")
+    assert rules.ignored("a/b/generated/x.py", False)
+    assert rules.ignored("generated/x.py", False)
+    assert rules.ignored("static/app.min.js", False)
+    assert not rules.ignored("static/keep.min.js", False)
+
+
+def test_nested_gitignore_applies_below_its_directory(tmp_path):
+    rules = _rules(tmp_path, "/out/\n", base="pkg")
+    assert rules.ignored("pkg/out", True)
+    assert not rules.ignored("out", True)
+    assert not rules.ignored("pkg/sub/out", True)
+
+
+def test_scan_directory_honors_gitignore_and_ignore_set(tmp_path):
+    for rel in ["README.md", "out/a.o", "src/out/keep.py", "src/main.py", "node_modules/x.js", "app.log"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+    (tmp_path / ".gitignore").write_text("/out/\n*.log\n")
+
+    tree = scan_directory(str(tmp_path))
+    assert sorted(tree.children) == [".gitignore", "README.md", "src"]
+    assert sorted(tree.children["src"].children) == ["main.py", "out"]
+    assert tree.files == 4
+
+
+def _big_tree() -> TreeNode:
+    paths = ["README.md", "setup.py"]
+    paths += [f"src/pkg{i}/module{j}.py" for i in range(10) for j in range(20)]
+    paths += [f"tests/test_{j}.py" for j in range(30)]
+    paths += [f"docs/page{j}.md" for j in range(5)]
+    return tree_from_paths(paths)
+
+
+def test_render_tree_stays_within_budget():
+    tree = _big_tree()
+    for budget in (80, 200, 600, 2000):
+        rendered = render_tree(tree, max_chars=budget)
+        # The root listing is always shown, even if it alone is over budget
+        root_listing = render_tree(tree, max_chars=0)
+        assert len(rendered) <= max(budget, len(root_listing))
+
+
+def test_render_tree_collapses_directories_it_cannot_expand():
+    rendered = render_tree(_big_tree(), max_chars=0)
+    assert rendered.splitlines() == [
+        "- docs/ (5 files, 100% .md)",
+        "- src/ (200 files, 100% .py)",
+        "- tests/ (30 files, 100% .py)",
+        "- README.md",
+        "- setup.py",
+    ]
+
+
+def test_render_tree_expands_shallow_and_large_directories_first():
+    rendered = render_tree(_big_tree(), max_chars=400)
+    # src/ (the largest top-level directory) opens before docs/, and before any of its own children
+    assert "- src/\n" in rendered
+    assert "  - pkg0/ (20 files, 100% .py)\n" in rendered
+    assert "- docs/ (5 files, 100% .md)\n" in rendered
+    assert "module0.py" not in rendered
+
+
+def test_render_tree_caps_children_per_directory():
+    rendered = render_tree(_big_tree(), max_chars=100000, max_children=3)
+    assert "  - ... 27 more entries (27 files)\n" in rendered
+    assert "  - test_0.py\n" in rendered
+    assert "    - ... 17 more entries (17 files)\n" in rendered
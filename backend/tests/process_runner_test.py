@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import time
+
+from app.utils.process_runner import _Capture, process_stats, run_cmd_async, run_process
+
+
+def test_capture_keeps_head_and_tail():
+    capture = _Capture(10)
+    for chunk in (b"abc", b"defgh", b"ijklmnop", b"qrstuvwxyz"):
+        capture.feed(chunk)
+    assert capture.total == 26
+    assert capture.truncated
+    assert capture.data() == b"abcde" + b"vwxyz"
+    assert capture.text() == "abcde\n... [16 bytes truncated] ...\nvwxyz"
+
+
+def test_capture_under_cap_is_returned_whole():
+    capture = _Capture(10)
+    capture.feed(b"abc")
+    capture.feed(b"def")
+    assert not capture.truncated
+    assert capture.text() == "abcdef"
+
+
+def test_large_output_is_bounded():
+    script = "import sys; sys.stdout.write('H' * 1000 + 'x' * 100000 + 'T' * 1000)"
+    result = asyncio.run(run_process([sys.executable, "-c", script], output_cap=2000))
+    assert result.returncode == 0
+    assert result.truncated
+    assert result.stdout.startswith("H" * 1000 + "\n... [100000 bytes truncated] ...\n")
+    assert result.stdout.endswith("T" * 1000)
+
+
+def test_stdin_and_exit_status():
+    script = "import sys; data = sys.stdin.read(); print(data.upper()); sys.stderr.write('warn'); sys.exit(3)"
+    result = asyncio.run(run_process([sys.executable, "-c", script], input=b"hello"))
+    assert (result.returncode, result.stdout, result.stderr) == (3, "HELLO\n", "warn")
+    assert not result.timed_out and not result.truncated
+
+
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    # The child outlives its parent unless the group is killed
+    script = (
+        "import subprocess, sys, time;"
+        "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']);"
+        f"open({str(pid_file)!r}, 'w').write(str(child.pid));"
+        "print('started', flush=True);"
+        "time.sleep(30)"
+    )
+    start = time.monotonic()
+    result = asyncio.run(run_process([sys.executable, "-c", script], timeout=1))
+    assert time.monotonic() - start < 10
+    assert result.timed_out
+    assert result.returncode == -1
+    assert result.stdout == "started\n"
+    assert "timed out after 1s" in result.stderr
+
+    child = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        # Reaped by init once killed; wait for that
+        time.sleep(0.1)
+    else:
+        raise AssertionError("grandchild survived the timeout")
+
+
+def test_missing_program_and_stats():
+    code, out, err = asyncio.run(run_cmd_async(["definitely-not-a-real-program-xyz"]))
+    assert code == 127 and out == ""
+    assert err
+    assert process_stats()["definitely-not-a-real-program-xyz"]["failures"] >= 1
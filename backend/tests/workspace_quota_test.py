@@ -0,0 +1,124 @@
+import asyncio
+import os
+
+import pytest
+
+from app.utils import workspace_quota, workspaces
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    dirs = {
+        "WORKSPACES_DIR": tmp_path,
+        "MIRRORS_DIR": tmp_path / "mirrors",
+        "WORKTREES_DIR": tmp_path / "worktrees",
+        "ACCESS_DIR": tmp_path / ".access",
+        "LOCKS_DIR": tmp_path / ".locks",
+        "FETCH_STATE_DIR": tmp_path / ".fetch",
+        "INDEX_DIR": tmp_path / ".index",
+        "STAGING_DIR": tmp_path / ".tmp",
+    }
+    for name, path in dirs.items():
+        path.mkdir(exist_ok=True)
+        monkeypatch.setattr(workspaces, name, str(path))
+        monkeypatch.setattr(workspace_quota, name, str(path), raising=False)
+    return tmp_path
+
+
+def _workspace(path, size: int, accessed: float) -> str:
+    path.mkdir(parents=True)
+    (path / "data").write_bytes(b"x" * size)
+    workspaces.touch(str(path))
+    os.utime(workspaces._access_stamp(str(path)), (accessed, accessed))
+    return str(path)
+
+
+def test_evicts_least_recently_used_until_within_budget(root):
+    oldest = _workspace(root / "alice__repo", 100, 1000)
+    middle = _workspace(root / "bob__repo", 100, 2000)
+    newest = _workspace(root / "carol__repo", 100, 3000)
+
+    evicted = asyncio.run(workspace_quota.enforce_quota(max_bytes=150))
+
+    assert evicted == [oldest, middle]
+    assert not os.path.exists(oldest) and not os.path.exists(middle)
+    assert os.path.exists(newest)
+    assert not os.path.exists(workspaces._access_stamp(oldest))
+
+
+def test_nothing_is_evicted_within_budget(root):
+    _workspace(root / "alice__repo", 100, 1000)
+    assert asyncio.run(workspace_quota.enforce_quota(max_bytes=1000)) == []
+    assert asyncio.run(workspace_quota.enforce_quota(max_bytes=0)) == []
+
+
+def test_checkout_takes_its_worktrees_along(root):
+    fork = _workspace(root / "alice__repo", 100, 1000)
+    worktree = _workspace(root / "worktrees" / "alice__repo" / "issue-1", 10, 5000)
+
+    evicted = asyncio.run(workspace_quota.enforce_quota(max_bytes=20))
+
+    assert evicted == [fork]
+    assert not os.path.exists(worktree)
+    assert not os.path.exists(workspaces._access_stamp(worktree))
+
+
+def test_mirror_with_dependent_forks_is_kept(root):
+    mirror = _workspace(root / "mirrors" / "octo__repo.git", 100, 1000)
+    (root / "mirrors" / "octo__repo.git" / "objects").mkdir()
+    fork = _workspace(root / "alice__repo", 100, 2000)
+    info = root / "alice__repo" / ".git" / "objects" / "info"
+    info.mkdir(parents=True)
+    (info / "alternates").write_text(os.path.join(mirror, "objects") + "\n")
+
+    found = {ws.path: ws for ws in workspace_quota._scan()}
+    assert found[mirror].dependents == 1
+
+    evicted = asyncio.run(workspace_quota.enforce_quota(max_bytes=50))
+
+    # The older mirror is skipped; the fork goes, freeing the mirror for a later sweep
+    assert evicted == [fork]
+    assert os.path.exists(mirror)
+    assert asyncio.run(workspace_quota.enforce_quota(max_bytes=50)) == [mirror]
+
+
+def test_workspace_in_use_is_skipped(root):
+    busy = _workspace(root / "alice__repo", 100, 1000)
+    idle = _workspace(root / "bob__repo", 100, 2000)
+
+    async def main():
+        async with workspaces.workspace_lock(busy):
+            # Holding the lock stamps an access; put it back so it's still the oldest
+            os.utime(workspaces._access_stamp(busy), (1000, 1000))
+            return await workspace_quota.enforce_quota(max_bytes=150)
+
+    assert asyncio.run(main()) == [idle]
+    assert os.path.exists(busy)
+
+
+def test_evicted_workspace_locks_are_dropped(root):
+    stale = _workspace(root / "alice__repo", 100, 1000)
+
+    async def main():
+        async with workspaces.workspace_lock(stale):
+            pass
+        assert stale in workspaces._rw_locks
+        return await workspace_quota.enforce_quota(max_bytes=50)
+
+    assert asyncio.run(main()) == [stale]
+    assert stale not in workspaces._rw_locks
+
+
+def test_usage_reports_aggregates_only(root):
+    _workspace(root / "alice__repo", 100, 1000)
+    _workspace(root / "mirrors" / "octo__repo.git", 50, 2000)
+
+    usage = asyncio.run(workspace_quota.workspace_usage())
+
+    assert usage["kinds"] == {
+        "checkout": {"count": 1, "bytes": 100, "in_use": 0},
+        "mirror": {"count": 1, "bytes": 50, "in_use": 0},
+    }
+    assert usage["total_bytes"] == 150
+    assert (usage["oldest_access"], usage["newest_access"]) == (1000, 2000)
+    assert "alice" not in repr(usage)
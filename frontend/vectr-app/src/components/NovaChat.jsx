@@ -15,11 +15,13 @@ export default function NovaChat({ repoName = '', issuesContext = [], activeIssu
     
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    // Reply text streamed so far; shown until the final (cleaned) reply replaces it
+    const [streamingReply, setStreamingReply] = useState('');
     const chatEndRef = useRef(null);
 
     useEffect(() => {
         chatEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-    }, [messages]);
+    }, [messages, streamingReply]);
 
     const isNovaEnabled = import.meta.env.VITE_USE_NOVA !== 'false';
 
@@ -45,9 +47,14 @@ export default function NovaChat({ repoName = '', issuesContext = [], activeIssu
         setMessages(newMessages);
         setInput('');
         setLoading(true);
+        setStreamingReply('');
 
         try {
-            const res = await novaAPI.ask(repoName, issuesContext, newMessages, activeIssueNumber, userEmail, prContext);
+            const res = await novaAPI.askStream(
+                repoName, issuesContext, newMessages,
+                (text) => setStreamingReply(prev => prev + text),
+                activeIssueNumber, userEmail, prContext
+            );
             
             let chatReply = res.reply;
             
@@ -74,6 +81,7 @@ export default function NovaChat({ repoName = '', issuesContext = [], activeIssu
                 content: `Sorry, I couldn't process that request. ${err.message || 'Please try again.'}`
             }]);
         } finally {
+            setStreamingReply('');
             setLoading(false);
         }
     };
@@ -150,7 +158,17 @@ export default function NovaChat({ repoName = '', issuesContext = [], activeIssu
                         )}
                     </div>
                 ))}
-                {loading && (
+                {loading && streamingReply && (
+                    <div
+                        className="rounded-lg p-3 text-sm fade-in whitespace-pre-wrap mr-6 text-text-secondary"
+                        style={{ background: 'rgba(19,29,47,0.8)' }}
+                    >
+                        <div className="markdown-body">
+                            <ReactMarkdown remarkPlugins={[remarkGfm]}>{streamingReply}</ReactMarkdown>
+                        </div>
+                    </div>
+                )}
+                {loading && !streamingReply && (
                     <div className="flex items-center gap-2 text-text-muted text-sm p-3">
                         <div className="flex gap-1">
                             <span className="w-2 h-2 bg-accent-cyan rounded-full animate-bounce" style={{ animationDelay: '0ms' }} />
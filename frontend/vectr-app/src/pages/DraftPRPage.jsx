@@ -155,7 +155,8 @@ export default function DraftPRPage() {
                         commits: formattedCommits 
                     };
                     
-                    const res = await novaAPI.ask(repoName, issuesContext, [{role: 'user', content: prompt}], issueNumber, user?.email, currentPrContext);
+                    // Only the final event matters here: the PR fields arrive with it, not in the deltas
+                    const res = await novaAPI.askStream(repoName, issuesContext, [{role: 'user', content: prompt}], null, issueNumber, user?.email, currentPrContext);
                     
                     if (mounted && res.updated_pr) {
                         const newTitle = res.updated_pr.pr_title || prTitle;
@@ -153,6 +153,52 @@ export const novaAPI = {
             pr_context: prContext
         }).then(r => r.data),
 
+    /**
+     * Streaming variant of ask(). Calls onDelta(text) as tokens arrive and
+     * resolves with the final { reply, updated_approach, updated_pr } event.
+     */
+    askStream: async (repoName, issuesContext, messages, onDelta, activeIssueNumber = null, userEmail = null, prContext = null) => {
+        const headers = { 'Content-Type': 'application/json' };
+        const stored = localStorage.getItem(STORAGE_KEYS.USER);
+        if (stored) {
+            const user = JSON.parse(stored);
+            if (user.token) headers.Authorization = `Bearer ${user.token}`;
+        }
+
+        const res = await fetch(`${api.defaults.baseURL}/nova/ask/stream`, {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({
+                repo_name: repoName,
+                issues_context: issuesContext,
+                messages,
+                active_issue_number: activeIssueNumber ? parseInt(activeIssueNumber) : null,
+                user_email: userEmail,
+                pr_context: prContext
+            }),
+        });
+        if (!res.ok) throw new Error(`Ask Nova failed (${res.status})`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+                if (event.type === 'delta') onDelta?.(event.text);
+                else if (event.type === 'final') return event;
+                else if (event.type === 'error') throw new Error(event.detail);
+            }
+        }
+        throw new Error('Ask Nova stream ended unexpectedly');
+    },
+
     summarize: (repoName, issueNumber, issueTitle, issueBody, comments = [], userEmail = null) =>
         api.post('/nova/summarize', {
             repo_name: repoName,
@@ -172,7 +218,19 @@ export const novaAPI = {
             comments,
             user_email: userEmail
         }).then(r => r.data),
-        
+
+    queueEvaluation: (repoName, issueNumber, userEmail) =>
+        api.post('/nova/evaluation', {
+            repo_name: repoName,
+            issue_number: parseInt(issueNumber),
+            user_email: userEmail
+        }).then(r => r.data),
+
+    getEvaluationStatus: (repoName, issueNumber, userEmail) =>
+        api.get('/nova/evaluation', {
+            params: { repo_name: repoName, issue_number: issueNumber, user_email: userEmail }
+        }).then(r => r.data),
+
     fetchCommits: (repoName, activeIssueNumber, userEmail = null) =>
         api.post('/nova/commits', {
             repo_name: repoName,